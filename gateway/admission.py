@@ -0,0 +1,127 @@
+"""
+Admission control for webhook-triggered jobs
+
+Limits (all configurable through the environment, 0 disables a limit):
+- MAX_CONCURRENT_JOBS        jobs running at once (in-process backend; Redis workers use WORKER_CONCURRENCY)
+- MAX_PENDING_JOBS           admitted jobs waiting for a free slot
+- MAX_JOBS_PER_REPO          in-flight jobs per repository
+- MAX_JOBS_PER_INSTALLATION  in-flight jobs per GitHub App installation
+
+A full pending queue answers 503, a per-repo/per-installation limit answers 429.
+Both carry Retry-After (ADMISSION_RETRY_AFTER seconds).
+"""
+
+import os
+import asyncio
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# HTTP status per rejection reason
+REJECTION_STATUS = {
+    'queue_full': 503,
+    'repo_limit': 429,
+    'installation_limit': 429
+}
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot be accepted right now"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = REJECTION_STATUS.get(reason, 503)
+
+class AdmissionController:
+    """Tracks in-flight jobs and decides whether a new job may be accepted"""
+
+    def __init__(self):
+        self.max_running = int(os.getenv('MAX_CONCURRENT_JOBS', '4'))
+        self.max_pending = int(os.getenv('MAX_PENDING_JOBS', '50'))
+        self.max_per_repo = int(os.getenv('MAX_JOBS_PER_REPO', '2'))
+        self.max_per_installation = int(os.getenv('MAX_JOBS_PER_INSTALLATION', '10'))
+        self.retry_after = int(os.getenv('ADMISSION_RETRY_AFTER', '60'))
+
+        self._inflight: Counter = Counter()
+        self._admitted = 0
+        self._running = 0
+        self._slots = None
+        self.rejections: Counter = Counter()
+
+    def limits_for(self, job: Dict[str, Any]) -> Dict[str, int]:
+        """Admission key -> in-flight limit for this job"""
+        limits = {f"repo:{job['owner']}/{job['repo']}".lower(): self.max_per_repo}
+        if job.get('installation_id'):
+            limits[f"installation:{job['installation_id']}"] = self.max_per_installation
+        return limits
+
+    def reject(self, reason: str):
+        """Count a rejection and raise it"""
+        self.rejections[reason] += 1
+        logger.warning(f"Admission rejected: {reason}")
+        raise AdmissionRejected(reason, self.retry_after)
+
+    def admit(self, job: Dict[str, Any]):
+        """Admit a job into the in-process queue or raise AdmissionRejected"""
+        pending = self._admitted - self._running
+        if self.max_pending and pending >= self.max_pending:
+            self.reject('queue_full')
+
+        limits = self.limits_for(job)
+        for key, limit in limits.items():
+            if limit and self._inflight[key] >= limit:
+                self.reject(f"{key.split(':', 1)[0]}_limit")
+
+        for key in limits:
+            self._inflight[key] += 1
+        self._admitted += 1
+
+    def release(self, job: Dict[str, Any]):
+        """Forget a finished in-process job"""
+        for key in self.limits_for(job):
+            self._inflight[key] -= 1
+            if self._inflight[key] <= 0:
+                del self._inflight[key]
+        self._admitted -= 1
+
+    @asynccontextmanager
+    async def slot(self, job: Dict[str, Any]):
+        """Hold one of MAX_CONCURRENT_JOBS run slots for an admitted job"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running) if self.max_running else None
+
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+            self._running += 1
+            try:
+                yield
+            finally:
+                self._running -= 1
+                if self._slots is not None:
+                    self._slots.release()
+        finally:
+            self.release(job)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current in-process queue depth and rejection counts"""
+        return {
+            'running': self._running,
+            'pending': self._admitted - self._running,
+            'max_running': self.max_running,
+            'max_pending': self.max_pending,
+            'rejections': dict(self.rejections)
+        }
+
+_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """Get the process-wide admission controller"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
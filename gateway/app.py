@@ -1,5 +1,6 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import hashlib
 import hmac
 import json
@@ -7,19 +8,50 @@ import os
 import logging
 from typing import Optional
 import re
+import time
 
 from handlers.gitcode import GitCodeEventHandler
-from security import verify_webhook_signature
-from task_queue import enqueue_task
+from security import new_signature_hasher, get_received_signature, verify_signature_digest, get_acl_index, install_acl_reload_handler
+from task_queue import enqueue_task, close_task_queue, get_queue_stats
+from admission import AdmissionRejected
+from dedup import DeliveryDeduplicator
+from outbox import Outbox
+from webhook_recorder import WebhookRecorder
+from github_api import get_github_api, close_github_api
+import paths  # noqa: F401 - worker package on sys.path
+from worker.metrics import WEBHOOK_DURATION, QUEUE_DEPTH, render_latest
+from worker.job_store import get_job_store, close_job_store, TERMINAL_EVENTS
 
 # Setup logging
 logging.basicConfig(level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')))
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Bug Fix Agent Gateway", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_acl_index()
+    install_acl_reload_handler()
+    await get_github_api().start()
+    yield
+    await outbox.close()
+    await close_github_api()
+    await close_task_queue()
+    await deduplicator.close()
+    await close_job_store()
+
+app = FastAPI(title="Bug Fix Agent Gateway", version="1.0.0", lifespan=lifespan)
+
+# Idle SSE streams send a comment line this often so proxies keep them open
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+
+# Largest accepted webhook body; GitHub caps deliveries at 25 MB but ours are far smaller
+MAX_WEBHOOK_BODY_BYTES = int(os.getenv('MAX_WEBHOOK_BODY_BYTES', str(2 * 1024 * 1024)))
+ACTION_PREFIX = re.compile(rb'\s*\{\s*"action"\s*:\s*"([a-z_]{1,64})"')
 
 # Initialize handlers
 gitcode_handler = GitCodeEventHandler()
+deduplicator = DeliveryDeduplicator()
+outbox = Outbox()
+recorder = WebhookRecorder()
 
 @app.get("/")
 async def root():
@@ -29,28 +61,116 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "agent-gateway"}
 
+async def read_webhook_body(request: Request, headers: dict, secret: Optional[str]):
+    """
+    Read the request body chunk by chunk, enforcing MAX_WEBHOOK_BODY_BYTES while
+    streaming and feeding each chunk to an incremental HMAC.
+    
+    Returns (body, hex digest or None)
+    """
+    declared = headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > MAX_WEBHOOK_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Webhook payload too large")
+    
+    hasher = new_signature_hasher(secret) if secret else None
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_WEBHOOK_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Webhook payload too large")
+        if hasher:
+            hasher.update(chunk)
+        chunks.append(chunk)
+    
+    return b''.join(chunks), (hasher.hexdigest() if hasher else None)
+
+def peek_action(body: bytes) -> Optional[str]:
+    """Read a leading "action" field without parsing the whole payload"""
+    match = ACTION_PREFIX.match(body, 0, 256)
+    return match.group(1).decode() if match else None
+
+def get_event_type(platform: str, headers: dict) -> str:
+    """Event type header for the configured platform"""
+    if platform == 'github':
+        return headers.get('x-github-event', '')
+    return headers.get('x-gitcode-event', '')  # gitcode
+
 @app.post("/api/webhook")
 async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
     """
     Handle webhook events from GitHub or GitCode
     """
+    started = time.monotonic()
+    outcome = 'error'
     try:
-        # Get headers and body
+        result = await _handle_webhook(request)
+        outcome = result.get('status', 'ok')
+        return result
+    except HTTPException as e:
+        outcome = str(e.status_code)
+        raise
+    finally:
+        # Unknown event types share one label to keep cardinality bounded
+        event_type = get_event_type(os.getenv('PLATFORM', 'github').lower(), request.headers)
+        known = gitcode_handler.accepts_event(event_type) or gitcode_handler.is_installation_event(event_type)
+        event_label = event_type if known else 'other'
+        WEBHOOK_DURATION.labels(event_label, outcome).observe(time.monotonic() - started)
+
+async def _handle_webhook(request: Request) -> dict:
+    try:
+        # Headers first - most deliveries (push, pull_request, check_run, ...) stop here
         headers = dict(request.headers)
-        body = await request.body()
         
         # 确定平台类型
         platform = os.getenv('PLATFORM', 'github').lower()
         
+        # 获取事件类型
+        event_type = get_event_type(platform, headers)
+        
+        # App installation changes only refresh the installation cache
+        installation_event = gitcode_handler.is_installation_event(event_type)
+        
+        # While recording for load tests, ignored events are read too so the replay mix is realistic
+        relevant = installation_event or gitcode_handler.accepts_event(event_type)
+        if not relevant and not recorder.enabled:
+            logger.debug(f"Ignoring {platform} event from headers: {event_type}")
+            return {"status": "ignored", "reason": "Not a triggering event"}
+        
         # Verify webhook signature (skip in test mode)
         webhook_secret = os.getenv('WEBHOOK_SECRET')
         test_mode = os.getenv('TEST_MODE', 'false').lower() == 'true'
-        
-        if webhook_secret and not test_mode:
-            if not verify_webhook_signature(headers, body, webhook_secret):
-                raise HTTPException(status_code=401, detail="Invalid webhook signature")
-        elif test_mode:
+        verify_signature = bool(webhook_secret) and not test_mode
+        if test_mode:
             logger.info("TEST_MODE enabled - skipping webhook signature verification")
+        elif verify_signature and not get_received_signature(headers):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+        
+        # Stream the body with a size cap, hashing chunks as they arrive
+        body, digest = await read_webhook_body(request, headers, webhook_secret if verify_signature else None)
+        
+        if verify_signature and not verify_signature_digest(headers, digest):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+        
+        if recorder.enabled:
+            await recorder.record(event_type, headers, body)
+            if not relevant:
+                return {"status": "ignored", "reason": "Not a triggering event"}
+        
+        if installation_event:
+            try:
+                payload = json.loads(body)
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail="Invalid JSON payload")
+            if gitcode_handler.handle_installation_event(event_type, payload, get_github_api().github_app_auth):
+                return {"status": "processed", "reason": f"{event_type}.{payload.get('action')} applied"}
+            return {"status": "ignored", "reason": "Not a tracked installation change"}
+        
+        # GitHub serializes "action" first - filter edits/deletes before a full parse
+        action = peek_action(body)
+        if action is not None and not gitcode_handler.accepts_event(event_type, action):
+            logger.debug(f"Ignoring {event_type}.{action} before parsing")
+            return {"status": "ignored", "reason": "Not a triggering event"}
         
         # Parse event
         try:
@@ -58,24 +178,39 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid JSON payload")
         
-        # 获取事件类型
-        if platform == 'github':
-            event_type = headers.get('x-github-event', '')
-        else:  # gitcode
-            event_type = headers.get('x-gitcode-event', '')
-            
         logger.info(f"Received {platform} event: {event_type}")
         
         # Check if this is a triggering event
-        if gitcode_handler.should_process_event(event_type, payload):
-            job = gitcode_handler.create_job(event_type, payload)
+        trigger = gitcode_handler.match_trigger(event_type, payload)
+        if trigger:
+            job = gitcode_handler.create_job(event_type, payload, trigger)
             
             if job:
-                # Send immediate response to issue
-                await gitcode_handler.send_initial_response(job)
+                # Drop redeliveries of webhooks we already accepted
+                dedup_key = deduplicator.key_for(headers, job)
+                if not await deduplicator.claim(dedup_key):
+                    return {"status": "duplicate", "reason": "Delivery already accepted"}
+                
+                # Queue the actual work - the gateway only enqueues, workers run it
+                try:
+                    queued = await enqueue_task(job)
+                except AdmissionRejected as e:
+                    await deduplicator.release(dedup_key)
+                    raise HTTPException(status_code=e.status_code, detail=f"Job rejected: {e.reason}",
+                                        headers={"Retry-After": str(e.retry_after)})
+                if not queued:
+                    await deduplicator.release(dedup_key)
+                    raise HTTPException(status_code=503, detail="Job queue unavailable",
+                                        headers={"Retry-After": "30"})
                 
-                # Queue the actual work
-                background_tasks.add_task(enqueue_task, job)
+                await get_job_store().emit(job, 'queued')
+                
+                # Acknowledge on the issue via the outbox - off the response path
+                outbox.submit(
+                    f"{job['owner']}/{job['repo']}#{job['issue_number']}",
+                    'initial_response',
+                    lambda: gitcode_handler.send_initial_response(job)
+                )
                 
                 logger.info(f"Job queued for repo {job.get('owner')}/{job.get('repo')}, issue #{job.get('issue_number')}")
                 return {"status": "accepted", "job_id": job.get("job_id")}
@@ -100,13 +235,80 @@ async def handle_github_webhook(request: Request, background_tasks: BackgroundTa
     """Handle GitHub webhook events"""
     return await handle_webhook(request, background_tasks)
 
+@app.get("/api/queue")
+async def get_queue_status():
+    """Queue depth, running jobs and admission rejection counts"""
+    stats = await get_queue_stats()
+    stats['duplicates'] = deduplicator.duplicates
+    stats['outbox'] = outbox.stats()
+    return stats
+
+@app.get("/api/jobs")
+async def list_jobs(repo: Optional[str] = None, limit: int = 50):
+    """Recent jobs, newest first; ?repo=owner/repo narrows to one repository"""
+    jobs = await get_job_store().list(repo, max(1, min(limit, 200)))
+    return {"jobs": jobs}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status, stage timings and PR of a job"""
+    record = await get_job_store().get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of a job's lifecycle events. Replays past events,
+    then follows live ones until the job completes or fails. Reconnecting
+    clients resume from the Last-Event-ID header.
+    """
+    store = get_job_store()
+    if await store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        last_id = request.headers.get('last-event-id')
+        while not await request.is_disconnected():
+            events = await store.read_events(job_id, last_id, block=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event_id, event in events:
+                last_id = event_id
+                yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event['type'] in TERMINAL_EVENTS:
+                    return
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    try:
+        stats = await get_queue_stats()
+        for state in ('pending', 'processing', 'delayed', 'dead', 'running'):
+            if state in stats:
+                QUEUE_DEPTH.labels(state).set(stats[state])
+    except Exception as e:
+        logger.error(f"Failed to refresh queue depth metrics: {e}")
+    
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/api/status")
 async def get_status():
     """Get service status"""
     return {
         "service": "agent-gateway",
         "status": "running",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "queue": await get_queue_stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+"""
+Webhook delivery deduplication
+
+GitHub redelivers webhooks (manually or after a timeout), and every duplicate
+would otherwise cost a clone, several LLM calls and a new draft PR. Accepted
+deliveries are remembered for DEDUP_TTL seconds:
+- GitHub: keyed on the X-GitHub-Delivery header
+- GitCode: keyed on (repo, issue, comment_id)
+
+DEDUP_BACKEND=memory (default) keeps a TTL-bounded LRU per process;
+DEDUP_BACKEND=redis shares the cache between gateway replicas.
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class MemoryDedupBackend:
+    """In-process LRU with per-entry TTL"""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+
+    async def claim(self, key: str) -> bool:
+        now = time.monotonic()
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            self._entries.move_to_end(key)
+            return False
+
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+
+        # Evict least recently used entries beyond the bound
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    async def release(self, key: str):
+        self._entries.pop(key, None)
+
+    async def close(self):
+        pass
+
+class RedisDedupBackend:
+    """Shared cache using SET NX EX so all gateway replicas agree"""
+
+    def __init__(self, ttl: int, redis_url: Optional[str] = None, prefix: Optional[str] = None):
+        self.ttl = ttl
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self._redis = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def claim(self, key: str) -> bool:
+        return bool(await self._client().set(f"{self.prefix}:dedup:{key}", '1', nx=True, ex=self.ttl))
+
+    async def release(self, key: str):
+        await self._client().delete(f"{self.prefix}:dedup:{key}")
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+class DeliveryDeduplicator:
+    """Front for the configured backend; failures fail open so webhooks are never lost"""
+
+    def __init__(self, backend=None):
+        if backend is None:
+            ttl = int(os.getenv('DEDUP_TTL', '86400'))
+            if os.getenv('DEDUP_BACKEND', 'memory').lower() == 'redis':
+                backend = RedisDedupBackend(ttl)
+            else:
+                backend = MemoryDedupBackend(ttl, int(os.getenv('DEDUP_MAX_ENTRIES', '10000')))
+        self.backend = backend
+        self.duplicates = 0
+
+    @staticmethod
+    def key_for(headers: Dict[str, str], job: Dict[str, Any]) -> Optional[str]:
+        """Dedup key for an accepted webhook"""
+        delivery_id = headers.get('x-github-delivery')
+        if delivery_id:
+            return f"delivery:{delivery_id}"
+
+        repo = f"{job['owner']}/{job['repo']}".lower()
+        if job.get('comment_id'):
+            return f"comment:{repo}#{job['issue_number']}:{job['comment_id']}"
+        if job.get('event_type') == 'issues':
+            return f"issue:{repo}#{job['issue_number']}"
+        return None
+
+    async def claim(self, key: Optional[str]) -> bool:
+        """Return True if this delivery has not been accepted before"""
+        if not key:
+            return True
+        try:
+            claimed = await self.backend.claim(key)
+        except Exception as e:
+            logger.error(f"Dedup backend error, accepting delivery {key}: {e}")
+            return True
+        if not claimed:
+            self.duplicates += 1
+            logger.info(f"Duplicate delivery ignored: {key}")
+        return claimed
+
+    async def release(self, key: Optional[str]):
+        """Forget a claim so a redelivery can be accepted (e.g. after a rejected enqueue)"""
+        if not key:
+            return
+        try:
+            await self.backend.release(key)
+        except Exception as e:
+            logger.error(f"Failed to release dedup key {key}: {e}")
+
+    async def close(self):
+        await self.backend.close()
@@ -0,0 +1,13 @@
+"""
+Deployment environment
+
+Shared by the launchers (gateway/run.py, start_local.py); keep it free of
+heavy imports so it can be loaded before anything else.
+"""
+
+import os
+
+def is_production() -> bool:
+    """APP_ENV=production (or ENVIRONMENT=production) marks a production deployment"""
+    env = os.getenv('APP_ENV') or os.getenv('ENVIRONMENT') or 'development'
+    return env.lower() in ('production', 'prod')
@@ -4,33 +4,103 @@ GitHub API client for handling GitHub App authentication and API calls
 
 import os
 import sys
+import copy
+import time
 import asyncio
 import aiohttp
 import logging
 from typing import Dict, Any, Optional
 
-# Add worker directory to path to import github_app_auth
-sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'worker'))
+import paths  # noqa: F401 - worker package on sys.path
 
 try:
-    from github_app_auth import GitHubAppAuth
+    from worker.github_app_auth import get_github_app_auth
 except ImportError:
     # Fallback if github_app_auth is not available
     class GitHubAppAuth:
         def get_installation_token(self, *args, **kwargs):
             return None
+        
+        def peek_installation_token(self, *args, **kwargs):
+            return None
+        
+        def remember_installation_id(self, *args, **kwargs):
+            pass
+        
+        def forget_installation(self, *args, **kwargs):
+            pass
+    
+    def get_github_app_auth():
+        return GitHubAppAuth()
+
+from worker.metrics import observe_api_call
 
 logger = logging.getLogger(__name__)
 
+def _api_trace_config() -> aiohttp.TraceConfig:
+    """Record every request made through the pool in agent_api_request_duration_seconds"""
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.monotonic()
+    
+    async def on_request_end(session, ctx, params):
+        observe_api_call('gateway', params.method, params.url.path, params.response.status,
+                         time.monotonic() - ctx.started)
+    
+    async def on_request_exception(session, ctx, params):
+        observe_api_call('gateway', params.method, params.url.path, 'error',
+                         time.monotonic() - ctx.started)
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
 class GitHubAPI:
-    """GitHub API client with GitHub App authentication support"""
+    """
+    GitHub API client with GitHub App authentication support
+    
+    One instance is shared by the whole gateway process (see get_github_api):
+    it owns a single keep-alive connection pool with DNS caching, and uses the
+    process-wide GitHubAppAuth (shared with the worker when jobs run in-process).
+    """
     
     def __init__(self):
         self.base_url = "https://api.github.com"
         self.github_token = os.getenv('GITHUB_TOKEN')
-        self.github_app_auth = GitHubAppAuth()
+        self.github_app_auth = get_github_app_auth()
+        
+        self.pool_size = int(os.getenv('GITHUB_HTTP_POOL_SIZE', '100'))
+        self.keepalive_timeout = float(os.getenv('GITHUB_HTTP_KEEPALIVE', '30'))
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def start(self):
+        """Open the shared connection pool"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30),
+                trace_configs=[_api_trace_config()]
+            )
+            logger.info(f"GitHub API connection pool started (limit={self.pool_size})")
+    
+    async def close(self):
+        """Close the shared connection pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
-    def _get_headers(self, installation_id: Optional[int] = None) -> Dict[str, str]:
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    async def _get_headers(self, installation_id: Optional[int] = None) -> Dict[str, str]:
         """Get headers for GitHub API requests"""
         headers = {
             'Accept': 'application/vnd.github.v3+json',
@@ -39,7 +109,10 @@ class GitHubAPI:
         
         # Try to use GitHub App authentication first
         if installation_id:
-            token = self.github_app_auth.get_installation_token(installation_id)
+            # Cached tokens are free; minting one is a blocking HTTP call, keep it off the loop
+            token = self.github_app_auth.peek_installation_token(installation_id)
+            if not token:
+                token = await asyncio.to_thread(self.github_app_auth.get_installation_token, installation_id)
             if token:
                 headers['Authorization'] = f'token {token}'
                 return headers
@@ -53,30 +126,38 @@ class GitHubAPI:
     async def comment_issue(self, owner: str, repo: str, issue_number: int, comment: str, installation_id: Optional[int] = None) -> bool:
         """Post a comment on an issue"""
         url = f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}/comments"
-        headers = self._get_headers(installation_id)
+        headers = await self._get_headers(installation_id)
         data = {"body": comment}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, headers=headers) as response:
-                    if response.status == 201:
-                        logger.info(f"Successfully posted comment to issue #{issue_number}")
-                        return True
-                    else:
-                        logger.error(f"Failed to post comment: {response.status}")
-                        return False
+            session = await self._get_session()
+            async with session.post(url, json=data, headers=headers) as response:
+                if response.status == 201:
+                    logger.info(f"Successfully posted comment to issue #{issue_number}")
+                    return True
+                else:
+                    logger.error(f"Failed to post comment: {response.status}")
+                    return False
         except Exception as e:
             logger.error(f"Error posting comment: {e}")
             return False
     
     def comment_issue_sync(self, owner: str, repo: str, issue_number: int, comment: str, installation_id: Optional[int] = None) -> bool:
-        """Synchronous version of comment_issue"""
-        return asyncio.run(self.comment_issue(owner, repo, issue_number, comment, installation_id))
+        """Synchronous version of comment_issue (uses a short-lived pool - the shared one belongs to the gateway loop)"""
+        async def _run() -> bool:
+            # Shallow copy shares the app auth (key + token cache) but not the pool
+            api = copy.copy(self)
+            api._session = None
+            try:
+                return await api.comment_issue(owner, repo, issue_number, comment, installation_id)
+            finally:
+                await api.close()
+        return asyncio.run(_run())
     
     async def create_pull_request(self, owner: str, repo: str, title: str, body: str, head: str, base: str = "main", installation_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Create a pull request"""
         url = f"{self.base_url}/repos/{owner}/{repo}/pulls"
-        headers = self._get_headers(installation_id)
+        headers = await self._get_headers(installation_id)
         data = {
             "title": title,
             "body": body,
@@ -86,15 +167,15 @@ class GitHubAPI:
         }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, headers=headers) as response:
-                    if response.status == 201:
-                        pr_data = await response.json()
-                        logger.info(f"Successfully created PR #{pr_data['number']}")
-                        return pr_data
-                    else:
-                        logger.error(f"Failed to create PR: {response.status}")
-                        return None
+            session = await self._get_session()
+            async with session.post(url, json=data, headers=headers) as response:
+                if response.status == 201:
+                    pr_data = await response.json()
+                    logger.info(f"Successfully created PR #{pr_data['number']}")
+                    return pr_data
+                else:
+                    logger.error(f"Failed to create PR: {response.status}")
+                    return None
         except Exception as e:
             logger.error(f"Error creating PR: {e}")
             return None
@@ -102,7 +183,7 @@ class GitHubAPI:
     async def update_pull_request(self, owner: str, repo: str, pr_number: int, title: Optional[str] = None, body: Optional[str] = None, installation_id: Optional[int] = None) -> bool:
         """Update a pull request"""
         url = f"{self.base_url}/repos/{owner}/{repo}/pulls/{pr_number}"
-        headers = self._get_headers(installation_id)
+        headers = await self._get_headers(installation_id)
         data = {}
         
         if title:
@@ -114,14 +195,14 @@ class GitHubAPI:
             return True  # Nothing to update
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.patch(url, json=data, headers=headers) as response:
-                    if response.status == 200:
-                        logger.info(f"Successfully updated PR #{pr_number}")
-                        return True
-                    else:
-                        logger.error(f"Failed to update PR: {response.status}")
-                        return False
+            session = await self._get_session()
+            async with session.patch(url, json=data, headers=headers) as response:
+                if response.status == 200:
+                    logger.info(f"Successfully updated PR #{pr_number}")
+                    return True
+                else:
+                    logger.error(f"Failed to update PR: {response.status}")
+                    return False
         except Exception as e:
             logger.error(f"Error updating PR: {e}")
             return False
@@ -129,18 +210,18 @@ class GitHubAPI:
     async def comment_pr(self, owner: str, repo: str, pr_number: int, comment: str, installation_id: Optional[int] = None) -> bool:
         """Post a comment on a pull request"""
         url = f"{self.base_url}/repos/{owner}/{repo}/issues/{pr_number}/comments"
-        headers = self._get_headers(installation_id)
+        headers = await self._get_headers(installation_id)
         data = {"body": comment}
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, headers=headers) as response:
-                    if response.status == 201:
-                        logger.info(f"Successfully posted comment to PR #{pr_number}")
-                        return True
-                    else:
-                        logger.error(f"Failed to post PR comment: {response.status}")
-                        return False
+            session = await self._get_session()
+            async with session.post(url, json=data, headers=headers) as response:
+                if response.status == 201:
+                    logger.info(f"Successfully posted comment to PR #{pr_number}")
+                    return True
+                else:
+                    logger.error(f"Failed to post PR comment: {response.status}")
+                    return False
         except Exception as e:
             logger.error(f"Error posting PR comment: {e}")
             return False
@@ -150,3 +231,18 @@ class GitHubAPI:
         # This would require GitHub App JWT to get installation info
         # For now, return None and use personal token
         return None
+
+# 进程级共享客户端（由 FastAPI lifespan 启动和关闭）
+_github_api: Optional[GitHubAPI] = None
+
+def get_github_api() -> GitHubAPI:
+    """Get the process-wide GitHub API client"""
+    global _github_api
+    if _github_api is None:
+        _github_api = GitHubAPI()
+    return _github_api
+
+async def close_github_api():
+    """Close the shared client's connection pool"""
+    if _github_api is not None:
+        await _github_api.close()
@@ -1,14 +1,26 @@
-import re
 import os
 import logging
 import uuid
 from typing import Dict, Any, Optional
 from datetime import datetime
 
-from security import is_authorized_user, is_authorized_repo
+from security import get_acl_index
+from triggers import TriggerMatcher, TriggerMatch
 
 logger = logging.getLogger(__name__)
 
+# 会触发 Agent 的事件类型及其 action：issues 只处理新建，issue_comment 只处理新评论
+RELEVANT_EVENTS = {
+    'issues': {'opened'},
+    'issue_comment': {'created'},
+}
+
+# GitHub App 安装变更事件：只用于维护 installation 缓存，不会触发 Agent
+INSTALLATION_EVENTS = {
+    'installation': {'created', 'deleted', 'suspend', 'unsuspend'},
+    'installation_repositories': {'added', 'removed'},
+}
+
 class GitPlatformEventHandler:
     """Handle Git Platform webhook events (GitHub/GitCode)"""
     
@@ -16,75 +28,114 @@ class GitPlatformEventHandler:
         self.platform = os.getenv('PLATFORM', 'github').lower()
         # GitHub App 的 @mention 模式
         # 用户需要配置 GITHUB_APP_NAME 环境变量
-        app_name = os.getenv('GITHUB_APP_NAME', 'agent')
-        self.trigger_patterns = [
-            # GitHub App @mention 模式
-            rf'@{re.escape(app_name)}\s+fix',
-            rf'@{re.escape(app_name)}\s+help',
-            rf'@{re.escape(app_name)}\b',  # 简单的 @app-name 提及
-            # 传统模式（向后兼容）
-            r'@agent\s+fix',
-            r'/agent\s+fix',
-            r'@agent fix',
-            r'/agent fix'
-        ]
+        self.app_name = os.getenv('GITHUB_APP_NAME', 'agent')
+        # 所有触发模式和状态标记在启动时编译为一个匹配器
+        self.trigger_matcher = TriggerMatcher(self.app_name)
+    
+    def accepts_event(self, event_type: str, action: Optional[str] = None) -> bool:
+        """
+        Cheap pre-check on the event type (from headers) and, if already known, the action
+        """
+        actions = RELEVANT_EVENTS.get(event_type)
+        if actions is None:
+            return False
+        return action is None or action in actions
+    
+    def is_installation_event(self, event_type: str, action: Optional[str] = None) -> bool:
+        """
+        installation / installation_repositories events that change the repo -> installation mapping
+        """
+        actions = INSTALLATION_EVENTS.get(event_type)
+        if actions is None or self.platform != 'github':
+            return False
+        return action is None or action in actions
+    
+    def handle_installation_event(self, event_type: str, payload: Dict[str, Any], app_auth) -> bool:
+        """
+        Keep the GitHub App installation cache in step with installs, uninstalls and repo selection changes
+        """
+        try:
+            action = payload.get('action', '')
+            installation_id = payload.get('installation', {}).get('id')
+            if not installation_id or not self.is_installation_event(event_type, action):
+                return False
+            
+            def repos(key: str):
+                result = []
+                for repository in payload.get(key) or []:
+                    owner, _, name = repository.get('full_name', '').partition('/')
+                    if owner and name:
+                        result.append((owner, name))
+                return result
+            
+            if event_type == 'installation':
+                if action in ('deleted', 'suspend'):
+                    app_auth.forget_installation(installation_id)
+                else:
+                    for owner, name in repos('repositories'):
+                        app_auth.remember_installation_id(owner, name, installation_id)
+            else:
+                for owner, name in repos('repositories_added'):
+                    app_auth.remember_installation_id(owner, name, installation_id)
+                removed = repos('repositories_removed')
+                if removed:
+                    app_auth.forget_installation(installation_id, removed)
+            
+            logger.info(f"Applied {event_type}.{action} for installation {installation_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error handling {event_type} event: {e}")
+            return False
     
     def should_process_event(self, event_type: str, payload: Dict[str, Any]) -> bool:
         """
         Determine if this event should trigger the agent
         """
+        return self.match_trigger(event_type, payload) is not None
+    
+    def match_trigger(self, event_type: str, payload: Dict[str, Any]) -> Optional[TriggerMatch]:
+        """
+        Return the trigger command (fix/help/mention) if this event should trigger the agent
+        """
         try:
-            # 支持的事件类型
-            valid_events = ['issues', 'issue_comment']
-            
-            if event_type not in valid_events:
-                return False
+            # 支持的事件类型和 action（issues 只处理新建，issue_comment 只处理新评论）
+            if not self.accepts_event(event_type, payload.get('action', '')):
+                return None
             
             # Get the comment content
             comment_body = self._get_comment_body(event_type, payload)
             if not comment_body:
-                return False
-            
-            # 对于 GitHub issues 事件，只处理新建的 issue（不是编辑）
-            if event_type == 'issues':
-                action = payload.get('action', '')
-                if action != 'opened':
-                    return False
+                return None
             
-            # 对于 issue_comment 事件，只处理新建的评论
-            elif event_type == 'issue_comment':
-                action = payload.get('action', '')
-                if action != 'created':
-                    return False
-                
+            if event_type == 'issue_comment':
                 # 过滤掉 Agent 自己的评论，避免递归触发
                 comment_author = payload.get('comment', {}).get('user', {}).get('login', '')
-                app_name = os.getenv('GITHUB_APP_NAME', 'agent')
-                if comment_author == app_name or comment_author.endswith('[bot]'):
+                if comment_author == self.app_name or comment_author.endswith('[bot]'):
                     logger.info(f"Skipping comment from bot user: {comment_author}")
-                    return False
-                
-                # 过滤掉包含 Agent 状态报告的评论（避免处理自己的回复）
-                if ('Bug Fix Agent 已接单' in comment_body or 
-                    '任务ID:' in comment_body or
-                    '分支: `agent/' in comment_body or
-                    '🤖 Agent 正在分析问题' in comment_body):
-                    logger.info("Skipping Agent status comment to avoid recursion")
-                    return False
-            
-            # Check for trigger patterns
-            logger.info(f"Checking comment body: {comment_body[:100]}...")
-            for pattern in self.trigger_patterns:
-                if re.search(pattern, comment_body, re.IGNORECASE):
-                    logger.info(f"Trigger pattern matched: {pattern}")
-                    return True
+                    return None
+            
+            # Check for trigger patterns (and, for comments, Agent status markers) in one pass
+            logger.debug(f"Checking comment body: {comment_body[:100]}...")
+            trigger, marker = self.trigger_matcher.scan(
+                comment_body, check_markers=(event_type == 'issue_comment')
+            )
+            
+            # 过滤掉包含 Agent 状态报告的评论（避免处理自己的回复）
+            if marker:
+                logger.info("Skipping Agent status comment to avoid recursion")
+                return None
+            
+            if trigger:
+                logger.info(f"Trigger matched: {trigger.command} ({trigger.text})")
+                return trigger
             
             logger.info("No trigger pattern matched")
-            return False
+            return None
             
         except Exception as e:
             logger.error(f"Error checking event trigger: {e}")
-            return False
+            return None
     
     def _get_comment_body(self, event_type: str, payload: Dict[str, Any]) -> str:
         """Extract comment body from payload"""
@@ -99,7 +150,8 @@ class GitPlatformEventHandler:
         except Exception:
             return ''
     
-    def create_job(self, event_type: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def create_job(self, event_type: str, payload: Dict[str, Any],
+                   trigger: Optional[TriggerMatch] = None) -> Optional[Dict[str, Any]]:
         """
         Create a job from the webhook payload
         """
@@ -125,14 +177,14 @@ class GitPlatformEventHandler:
                 return None
             
             # Check authorization
-            allowed_users = os.getenv('ALLOWED_USERS', '')
-            allowed_repos = os.getenv('ALLOWED_REPOS', '')
+            installation_id = payload.get('installation', {}).get('id')
+            acl = get_acl_index()
             
-            if not is_authorized_user(actor, allowed_users):
+            if not acl.allows_user(actor):
                 logger.warning(f"Unauthorized user: {actor}")
                 return None
             
-            if not is_authorized_repo(owner, repo_name, allowed_repos):
+            if not acl.allows_repo(owner, repo_name, installation_id):
                 logger.warning(f"Unauthorized repo: {owner}/{repo_name}")
                 return None
             
@@ -150,10 +202,14 @@ class GitPlatformEventHandler:
                 'issue_number': issue_number,
                 'issue_title': issue.get('title', ''),
                 'issue_body': issue.get('body', ''),
+                'issue_node_id': issue.get('node_id'),
                 'actor': actor,
                 'branch': branch_name,
                 'default_branch': repository.get('default_branch', 'main'),
                 'comment_id': payload.get('comment', {}).get('id') if event_type == 'issue_comment' else None,
+                'installation_id': installation_id,
+                'command': trigger.command if trigger else 'fix',
+                'command_args': trigger.args if trigger else '',
                 'platform': self.platform
             }
             
@@ -174,15 +230,12 @@ class GitPlatformEventHandler:
         Send immediate response to the issue
         """
         try:
-            # Import GitHub API client
-            import sys
-            import os
-            sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-            from github_api import GitHubAPI
+            # Shared GitHub API client (pooled connections, cached app credentials)
+            from github_api import get_github_api
             
-            api = GitHubAPI()
+            api = get_github_api()
             
-            app_name = os.getenv('GITHUB_APP_NAME', 'agent')
+            app_name = self.app_name
             
             response_message = f"""✅ **Bug Fix Agent 已接单**
 
@@ -200,7 +253,8 @@ class GitPlatformEventHandler:
                 job['owner'], 
                 job['repo'], 
                 job['issue_number'], 
-                response_message
+                response_message,
+                installation_id=job.get('installation_id')
             )
             
             if success:
@@ -0,0 +1,126 @@
+"""
+In-process outbox for webhook side effects
+
+Side effects such as the "已接单" acknowledgement comment are taken off the
+webhook response path: the handler submits them here and returns as soon as
+the job is enqueued. The outbox delivers them in the background with
+- ordering per lane (one lane per issue), so comments on an issue stay in order
+- its own concurrency cap (OUTBOX_CONCURRENCY)
+- bounded retries with exponential backoff (OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY)
+- a bounded backlog (OUTBOX_MAX_PENDING); submissions beyond it are dropped
+
+OUTBOX_DRY_RUN=true marks side effects delivered without sending them, for
+load tests that must not post comments on real issues.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+class Outbox:
+    """Ordered, retrying background delivery of side effects"""
+
+    def __init__(self):
+        self.concurrency = int(os.getenv('OUTBOX_CONCURRENCY', '4'))
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+        self.max_pending = int(os.getenv('OUTBOX_MAX_PENDING', '1000'))
+        self.retry_delay = float(os.getenv('OUTBOX_RETRY_DELAY', '1.0'))
+        self.dry_run = os.getenv('OUTBOX_DRY_RUN', 'false').lower() == 'true'
+
+        self._lanes: Dict[str, Deque[Tuple[str, Callable[[], Awaitable[bool]], float]]] = {}
+        self._lane_tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore = None
+        self._pending = 0
+
+        self.counters = {'submitted': 0, 'delivered': 0, 'failed': 0, 'dropped': 0, 'retries': 0}
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def submit(self, lane: str, name: str, send: Callable[[], Awaitable[bool]]) -> bool:
+        """
+        Queue a side effect. send() returns True on success; False or an
+        exception triggers a retry. Returns False if the backlog is full.
+        """
+        if self._pending >= self.max_pending:
+            self.counters['dropped'] += 1
+            logger.error(f"Outbox full, dropping {name} for {lane}")
+            return False
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        self._lanes.setdefault(lane, deque()).append((name, send, time.monotonic()))
+        self._pending += 1
+        self.counters['submitted'] += 1
+
+        if lane not in self._lane_tasks:
+            self._lane_tasks[lane] = asyncio.create_task(self._drain_lane(lane))
+        return True
+
+    async def _drain_lane(self, lane: str):
+        try:
+            queue = self._lanes[lane]
+            while queue:
+                name, send, submitted_at = queue[0]
+                await self._deliver(lane, name, send, submitted_at)
+                queue.popleft()
+                self._pending -= 1
+        finally:
+            self._lanes.pop(lane, None)
+            self._lane_tasks.pop(lane, None)
+
+    async def _deliver(self, lane: str, name: str, send: Callable[[], Awaitable[bool]], submitted_at: float):
+        for attempt in range(1, self.max_attempts + 1):
+            async with self._semaphore:
+                try:
+                    ok = True if self.dry_run else await send()
+                except Exception as e:
+                    logger.warning(f"Outbox {name} for {lane} raised: {e}")
+                    ok = False
+
+            if ok:
+                latency = time.monotonic() - submitted_at
+                self._latencies.append(latency)
+                self.counters['delivered'] += 1
+                logger.info(f"Outbox delivered {name} for {lane} in {latency:.2f}s (attempt {attempt})")
+                return
+
+            if attempt < self.max_attempts:
+                self.counters['retries'] += 1
+                await asyncio.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+        self.counters['failed'] += 1
+        logger.error(f"Outbox gave up on {name} for {lane} after {self.max_attempts} attempts")
+
+    async def close(self, timeout: float = 10.0):
+        """Give queued side effects a chance to go out, then cancel the rest"""
+        tasks = list(self._lane_tasks.values())
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Outbox shutdown cancelled {len(pending)} lane(s) with undelivered side effects")
+
+    def stats(self) -> Dict[str, Any]:
+        """Backlog, counters and delivery latency (submit -> delivered)"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            'pending': self._pending,
+            'lanes': len(self._lanes),
+            **self.counters,
+            'latency_p50': percentile(0.50),
+            'latency_p95': percentile(0.95),
+            'latency_max': round(latencies[-1], 3) if latencies else 0.0
+        }
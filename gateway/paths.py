@@ -0,0 +1,17 @@
+"""
+Import path for the worker package
+
+Gateway modules are imported flat (uvicorn loads `app:app` from gateway/).
+Worker modules are imported as the `worker` package from the project root -
+the names the worker uses for itself - so each of them (metrics registry, job
+store, installation cache) is loaded once per process. Import this module
+before any `worker.*` import.
+"""
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
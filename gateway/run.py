@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Bug Fix Agent Gateway - production launcher
+
+A pre-fork master binds the port once and runs N uvicorn worker processes that
+accept from the shared socket (or, with --reuse-port, each bind their own
+SO_REUSEPORT socket and let the kernel balance connections).
+
+Signals sent to the master:
+- SIGTERM / SIGINT  graceful drain: workers stop accepting and finish in-flight
+                    webhooks (up to --graceful-timeout seconds), then exit
+- SIGHUP            zero-downtime reload: workers are replaced one at a time,
+                    each new worker is ready before the old one drains
+                    (this also picks up a changed ACL_FILE and code)
+Workers that die unexpectedly are respawned.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import List, Optional
+
+GATEWAY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+import paths  # noqa: F401 - worker package on sys.path
+from environment import is_production
+from worker.metrics import mark_process_dead
+
+logging.basicConfig(
+    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+    format='%(asctime)s [master %(process)d] %(levelname)s %(message)s'
+)
+logger = logging.getLogger('gateway.run')
+
+def create_socket(host: str, port: int, reuse_port: bool = False, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def serve_worker(sock: Optional[socket.socket], host: str, port: int, graceful_timeout: int,
+                 ready: "multiprocessing.synchronize.Event"):
+    """Worker process: run one uvicorn server on the shared (or own SO_REUSEPORT) socket"""
+    import uvicorn
+
+    os.chdir(GATEWAY_DIR)
+    if GATEWAY_DIR not in sys.path:
+        sys.path.insert(0, GATEWAY_DIR)
+
+    if sock is None:
+        sock = create_socket(host, port, reuse_port=True)
+
+    config = uvicorn.Config(
+        'app:app',
+        host=host,
+        port=port,
+        log_level=os.getenv('LOG_LEVEL', 'INFO').lower(),
+        timeout_graceful_shutdown=graceful_timeout,
+        proxy_headers=True
+    )
+    server = uvicorn.Server(config)
+
+    async def run():
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            ready.set()
+        await task
+
+    asyncio.run(run())
+
+class Master:
+    """Pre-fork process supervisor"""
+
+    def __init__(self, host: str, port: int, workers: int, graceful_timeout: int, reuse_port: bool):
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.reuse_port = reuse_port
+
+        self.ctx = multiprocessing.get_context('spawn')
+        self.sock = None if reuse_port else create_socket(host, port)
+        self.workers: List[multiprocessing.Process] = []
+        self._shutdown = False
+        self._reload = False
+
+    def spawn(self, wait_ready: bool = False) -> multiprocessing.Process:
+        ready = self.ctx.Event()
+        process = self.ctx.Process(
+            target=serve_worker,
+            args=(self.sock, self.host, self.port, self.graceful_timeout, ready),
+            daemon=False
+        )
+        process.start()
+        self.workers.append(process)
+        logger.info(f"Started worker {process.pid}")
+
+        if wait_ready and not ready.wait(timeout=60):
+            logger.warning(f"Worker {process.pid} did not report ready within 60s")
+        return process
+
+    def stop_worker(self, process: multiprocessing.Process):
+        """SIGTERM lets uvicorn stop accepting and drain in-flight requests"""
+        if process.is_alive():
+            process.terminate()
+        process.join(self.graceful_timeout + 5)
+        if process.is_alive():
+            logger.warning(f"Worker {process.pid} did not drain in time, killing")
+            process.kill()
+            process.join()
+        if process in self.workers:
+            self.workers.remove(process)
+        mark_process_dead(process.pid)
+
+    def rolling_restart(self):
+        logger.info("SIGHUP received - rolling restart")
+        for old in list(self.workers):
+            if self._shutdown:
+                return
+            self.spawn(wait_ready=True)
+            self.stop_worker(old)
+            logger.info(f"Replaced worker {old.pid}")
+
+    def _on_terminate(self, signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, draining workers...")
+        self._shutdown = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def prepare_metrics_dir(self):
+        """Workers write metric files here; stale files from a previous run would be summed in"""
+        metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+        if not metrics_dir:
+            return
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.db'):
+                os.remove(os.path.join(metrics_dir, name))
+
+    def run(self):
+        self.prepare_metrics_dir()
+        signal.signal(signal.SIGTERM, self._on_terminate)
+        signal.signal(signal.SIGINT, self._on_terminate)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        mode = 'SO_REUSEPORT' if self.reuse_port else 'shared socket'
+        logger.info(f"Gateway master {os.getpid()} on {self.host}:{self.port} with {self.num_workers} workers ({mode})")
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        while not self._shutdown:
+            if self._reload:
+                self._reload = False
+                self.rolling_restart()
+                continue
+
+            for process in list(self.workers):
+                if not process.is_alive() and not self._shutdown:
+                    logger.error(f"Worker {process.pid} exited with code {process.exitcode}, respawning")
+                    self.workers.remove(process)
+                    mark_process_dead(process.pid)
+                    self.spawn()
+            time.sleep(0.5)
+
+        for process in list(self.workers):
+            if process.is_alive():
+                process.terminate()
+        deadline = time.time() + self.graceful_timeout + 5
+        for process in list(self.workers):
+            process.join(max(0, deadline - time.time()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not drain in time, killing")
+                process.kill()
+                process.join()
+        if self.sock:
+            self.sock.close()
+        logger.info("Gateway stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description='Bug Fix Agent Gateway (production launcher)')
+    parser.add_argument('--host', default=os.getenv('GATEWAY_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('GATEWAY_PORT', '8080')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('GATEWAY_WORKERS', str(os.cpu_count() or 1))),
+                        help='Worker processes (default: GATEWAY_WORKERS or CPU count)')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('GATEWAY_GRACEFUL_TIMEOUT', '30')),
+                        help='Seconds a worker may spend draining in-flight requests')
+    parser.add_argument('--reuse-port', action='store_true',
+                        default=os.getenv('GATEWAY_REUSE_PORT', 'false').lower() == 'true',
+                        help='Each worker binds its own SO_REUSEPORT socket instead of sharing one')
+    parser.add_argument('--reload', action='store_true', help='Development auto-reload (refused in production)')
+    args = parser.parse_args()
+
+    if args.reload:
+        if is_production():
+            logger.error("--reload is not allowed when APP_ENV=production; use SIGHUP for zero-downtime reloads")
+            sys.exit(1)
+        import uvicorn
+        os.chdir(GATEWAY_DIR)
+        sys.path.insert(0, GATEWAY_DIR)
+        uvicorn.run('app:app', host=args.host, port=args.port, reload=True)
+        return
+
+    Master(args.host, args.port, max(1, args.workers), args.graceful_timeout, args.reuse_port).run()
+
+if __name__ == '__main__':
+    main()
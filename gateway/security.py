@@ -7,55 +7,56 @@ logger = logging.getLogger(__name__)
 
 import hmac
 import hashlib
+import json
 import logging
 import os
-from typing import Dict, Union
+import signal
+import asyncio
+from typing import Dict, Iterable, Optional, Union
 
 logger = logging.getLogger(__name__)
 
-def verify_webhook_signature(headers: Dict[str, str], body: bytes, secret: str) -> bool:
+def new_signature_hasher(secret: str) -> "hmac.HMAC":
     """
-    Verify webhook signature for GitHub or GitCode
+    Create an incremental HMAC-SHA256 hasher - feed it body chunks as they stream in
     """
-    try:
-        platform = os.getenv('PLATFORM', 'github').lower()
+    return hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+
+def get_received_signature(headers: Dict[str, str]) -> str:
+    """
+    Extract the hex signature sent by GitHub (X-Hub-Signature-256) or GitCode (X-Gitcode-Token)
+    """
+    platform = os.getenv('PLATFORM', 'github').lower()
+    
+    if platform == 'github':
+        # GitHub uses X-Hub-Signature-256 header
+        received_signature = headers.get('x-hub-signature-256', '')
         
-        if platform == 'github':
-            # GitHub uses X-Hub-Signature-256 header
-            received_signature = headers.get('x-hub-signature-256', '')
-            
-            if not received_signature:
-                logger.warning("No GitHub webhook signature found in headers")
-                return False
-            
-            # GitHub signature format: sha256=<signature>
-            if not received_signature.startswith('sha256='):
-                logger.warning("Invalid GitHub signature format")
-                return False
-            
-            received_signature = received_signature[7:]  # Remove 'sha256=' prefix
-            
-            # Create expected signature
-            expected_signature = hmac.new(
-                secret.encode('utf-8'),
-                body,
-                hashlib.sha256
-            ).hexdigest()
-            
-        else:  # gitcode
-            # GitCode uses X-Gitcode-Token header
-            received_signature = headers.get('x-gitcode-token', '')
-            
-            if not received_signature:
-                logger.warning("No GitCode webhook signature found in headers")
-                return False
-            
-            # Create expected signature
-            expected_signature = hmac.new(
-                secret.encode('utf-8'),
-                body,
-                hashlib.sha256
-            ).hexdigest()
+        if not received_signature:
+            logger.warning("No GitHub webhook signature found in headers")
+            return ''
+        
+        # GitHub signature format: sha256=<signature>
+        if not received_signature.startswith('sha256='):
+            logger.warning("Invalid GitHub signature format")
+            return ''
+        
+        return received_signature[7:]  # Remove 'sha256=' prefix
+    
+    # GitCode uses X-Gitcode-Token header
+    received_signature = headers.get('x-gitcode-token', '')
+    if not received_signature:
+        logger.warning("No GitCode webhook signature found in headers")
+    return received_signature
+
+def verify_signature_digest(headers: Dict[str, str], expected_signature: str) -> bool:
+    """
+    Compare the received signature against an already computed hex digest
+    """
+    try:
+        received_signature = get_received_signature(headers)
+        if not received_signature:
+            return False
         
         # Compare signatures securely
         return hmac.compare_digest(received_signature, expected_signature)
@@ -64,23 +65,135 @@ def verify_webhook_signature(headers: Dict[str, str], body: bytes, secret: str)
         logger.error(f"Signature verification error: {e}")
         return False
 
-def is_authorized_user(username: str, allowed_users: str = "") -> bool:
+def verify_webhook_signature(headers: Dict[str, str], body: bytes, secret: str) -> bool:
     """
-    Check if user is authorized to trigger the agent
+    Verify webhook signature for GitHub or GitCode
     """
-    if not allowed_users:
-        return True  # Allow all users if no restriction set
-    
-    allowed_list = [user.strip() for user in allowed_users.split(',') if user.strip()]
-    return username in allowed_list
+    try:
+        hasher = new_signature_hasher(secret)
+        hasher.update(body)
+        return verify_signature_digest(headers, hasher.hexdigest())
+        
+    except Exception as e:
+        logger.error(f"Signature verification error: {e}")
+        return False
 
-def is_authorized_repo(owner: str, repo: str, allowed_repos: str = "") -> bool:
+class ACLIndex:
     """
-    Check if repository is authorized for agent usage
+    Prebuilt allow lists for users and repositories
+    
+    Everything is normalized and hashed once at load time, so each check is a
+    constant number of set lookups:
+    - users: exact logins (empty = everyone)
+    - repos: "owner/repo" entries or "owner/*" org wildcards (empty = every repo)
+    - installations: per-installation repo allow lists in the same format;
+      an installation listed here may only trigger on its own entries
     """
-    if not allowed_repos:
-        return True  # Allow all repos if no restriction set
     
-    repo_full_name = f"{owner}/{repo}"
-    allowed_list = [repo.strip() for repo in allowed_repos.split(',') if repo.strip()]
-    return repo_full_name in allowed_list
+    def __init__(self, users: Iterable[str] = (), repos: Iterable[str] = (),
+                 installations: Optional[Dict[Union[int, str], Iterable[str]]] = None):
+        self.users = frozenset(u.strip().lower() for u in users if u.strip())
+        self.repos, self.orgs = self._index_repos(repos)
+        self.installations = {
+            int(installation_id): self._index_repos(entries)
+            for installation_id, entries in (installations or {}).items()
+        }
+    
+    @staticmethod
+    def _index_repos(entries: Iterable[str]):
+        repos, orgs = set(), set()
+        for entry in entries:
+            entry = entry.strip().lower()
+            if not entry:
+                continue
+            if entry.endswith('/*'):
+                orgs.add(entry[:-2])
+            else:
+                repos.add(entry)
+        return frozenset(repos), frozenset(orgs)
+    
+    @classmethod
+    def from_env(cls) -> "ACLIndex":
+        """Build from the comma-separated ALLOWED_USERS / ALLOWED_REPOS variables"""
+        return cls(
+            users=os.getenv('ALLOWED_USERS', '').split(','),
+            repos=os.getenv('ALLOWED_REPOS', '').split(',')
+        )
+    
+    @classmethod
+    def from_file(cls, path: str) -> "ACLIndex":
+        """
+        Build from a JSON file:
+        {"users": [...], "repos": ["org/repo", "org/*"], "installations": {"123": ["org/*"]}}
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(
+            users=data.get('users', []),
+            repos=data.get('repos', []),
+            installations=data.get('installations', {})
+        )
+    
+    @staticmethod
+    def _matches(index, owner: str, full_name: str) -> bool:
+        repos, orgs = index
+        return full_name in repos or owner in orgs
+    
+    def allows_user(self, username: str) -> bool:
+        if not self.users:
+            return True  # Allow all users if no restriction set
+        return username.lower() in self.users
+    
+    def allows_repo(self, owner: str, repo: str, installation_id: Optional[int] = None) -> bool:
+        owner = owner.lower()
+        full_name = f"{owner}/{repo.lower()}"
+        
+        if (self.repos or self.orgs) and not self._matches((self.repos, self.orgs), owner, full_name):
+            return False
+        
+        if installation_id is not None:
+            index = self.installations.get(int(installation_id))
+            if index is not None and not self._matches(index, owner, full_name):
+                return False
+        
+        return True
+    
+    def summary(self) -> str:
+        return (f"{len(self.users)} users, {len(self.repos)} repos, {len(self.orgs)} org wildcards, "
+                f"{len(self.installations)} installation lists")
+
+_acl_index: Optional[ACLIndex] = None
+
+def load_acl_index() -> ACLIndex:
+    """Build the ACL from ACL_FILE if set, otherwise from ALLOWED_USERS / ALLOWED_REPOS"""
+    acl_file = os.getenv('ACL_FILE')
+    if acl_file:
+        return ACLIndex.from_file(acl_file)
+    return ACLIndex.from_env()
+
+def get_acl_index() -> ACLIndex:
+    """Get the current ACL index (built on first use)"""
+    global _acl_index
+    if _acl_index is None:
+        _acl_index = load_acl_index()
+        logger.info(f"ACL loaded: {_acl_index.summary()}")
+    return _acl_index
+
+def reload_acl_index() -> bool:
+    """Rebuild the ACL and swap it in atomically; keeps the old one if loading fails"""
+    global _acl_index
+    try:
+        index = load_acl_index()
+    except Exception as e:
+        logger.error(f"ACL reload failed, keeping previous ACL: {e}")
+        return False
+    _acl_index = index
+    logger.info(f"ACL reloaded: {index.summary()}")
+    return True
+
+def install_acl_reload_handler():
+    """Reload the ACL on SIGHUP without restarting the process"""
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_acl_index)
+    except (NotImplementedError, RuntimeError, AttributeError) as e:
+        logger.warning(f"SIGHUP ACL reload not available: {e}")
@@ -1,60 +1,121 @@
 import os
 import logging
+import time
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from admission import get_admission_controller
+import paths  # noqa: F401 - worker package on sys.path
+from worker.metrics import QUEUE_WAIT
 
 logger = logging.getLogger(__name__)
 
+_redis_queue = None
+
+def get_queue_backend() -> str:
+    """
+    Configured queue backend: 'redis' (durable), 'local' (in-process demo mode)
+    or 'stub' (load testing - admission runs as usual, jobs just sleep STUB_JOB_SECONDS)
+    """
+    return os.getenv('QUEUE_BACKEND', 'local').lower()
+
+def get_redis_queue():
+    """Shared RedisJobQueue instance for this gateway process"""
+    global _redis_queue
+    if _redis_queue is None:
+        from worker.job_queue import RedisJobQueue
+        _redis_queue = RedisJobQueue()
+    return _redis_queue
+
+async def close_task_queue():
+    """Release queue connections on shutdown"""
+    global _redis_queue
+    if _redis_queue is not None:
+        await _redis_queue.close()
+        _redis_queue = None
+
 async def enqueue_task(job: Dict[str, Any]) -> bool:
     """
     Enqueue a job for processing.
-    For demo purposes, we'll directly call the worker instead of using a real queue.
-    In production, this would use Redis + RQ or similar.
+    With QUEUE_BACKEND=redis the job is pushed to Redis and picked up by
+    `python -m worker.main serve`; otherwise it runs inside the gateway (demo mode).
+
+    Raises AdmissionRejected when a queue or concurrency limit is reached.
+    Returns False if the queue backend itself is unavailable.
     """
+    controller = get_admission_controller()
+
+    if get_queue_backend() == 'redis':
+        try:
+            # Huge repositories go to the workers with a warm mirror (REPO_LARGE_QUEUE)
+            from worker.repo_profiles import plan_for
+            plan = await asyncio.to_thread(plan_for, job['owner'], job['repo'])
+            reason = await get_redis_queue().try_enqueue(
+                job,
+                queue_name=plan['queue'],
+                max_pending=controller.max_pending,
+                limits=controller.limits_for(job)
+            )
+        except Exception as e:
+            logger.error(f"Error enqueueing job {job.get('job_id')}: {e}")
+            return False
+        if reason:
+            controller.reject(reason)
+        return True
+
+    controller.admit(job)
+    if get_queue_backend() == 'stub':
+        asyncio.create_task(run_stub_job(job, time.monotonic()))
+        return True
+
     try:
-        # For demo, we'll run the worker directly
-        # In production, this would be: redis_queue.enqueue('worker.main.process_job', job)
-        
         logger.info(f"Processing job {job['job_id']} directly (demo mode)")
-        
-        # Import and run worker
-        import sys
-        sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-        
-        # Run in background
-        asyncio.create_task(run_worker_job(job))
-        
+
+        # Run in background, bounded by MAX_CONCURRENT_JOBS
+        asyncio.create_task(run_worker_job(job, time.monotonic()))
+
         return True
-        
+
     except Exception as e:
+        controller.release(job)
         logger.error(f"Error enqueueing job {job.get('job_id')}: {e}")
         return False
 
-async def run_worker_job(job: Dict[str, Any]):
-    """Run worker job in background"""
+async def get_queue_stats() -> Dict[str, Any]:
+    """Queue depth and admission counters"""
+    stats = get_admission_controller().stats()
+    stats['backend'] = get_queue_backend()
+    if stats['backend'] == 'redis':
+        try:
+            depth = await get_redis_queue().depth()
+            stats.update(depth)
+            stats['running'] = depth['processing']
+        except Exception as e:
+            logger.error(f"Failed to read queue depth: {e}")
+    return stats
+
+async def run_worker_job(job: Dict[str, Any], enqueued_at: Optional[float] = None):
+    """Run worker job in background, holding one of MAX_CONCURRENT_JOBS run slots"""
+    async with get_admission_controller().slot(job):
+        if enqueued_at is not None:
+            QUEUE_WAIT.observe(time.monotonic() - enqueued_at)
+        await _run_worker_job(job)
+
+async def run_stub_job(job: Dict[str, Any], enqueued_at: float):
+    """Stand-in for the worker when load testing the gateway"""
+    async with get_admission_controller().slot(job):
+        QUEUE_WAIT.observe(time.monotonic() - enqueued_at)
+        await asyncio.sleep(float(os.getenv('STUB_JOB_SECONDS', '0')))
+
+async def _run_worker_job(job: Dict[str, Any]):
     try:
-        # 确保正确的 Python 路径设置
-        import sys
-        import os
-        
-        # 获取项目根路径
-        current_dir = os.path.dirname(__file__)
-        project_root = os.path.dirname(current_dir)
-        worker_dir = os.path.join(project_root, 'worker')
-        
-        # 添加到 Python 路径
-        if project_root not in sys.path:
-            sys.path.insert(0, project_root)
-        if worker_dir not in sys.path:
-            sys.path.insert(0, worker_dir)
-        
-        # 动态导入 worker 模块
+        # 动态导入 worker 模块（项目根目录已由 paths 加入 sys.path）
         import importlib
         worker_main = importlib.import_module('worker.main')
-        
+
         # 运行处理任务
         await worker_main.process_job(job)
-        
+
     except Exception as e:
         logger.error(f"Worker job failed {job.get('job_id')}: {e}")
         import traceback
@@ -0,0 +1,126 @@
+"""
+Compiled trigger matcher for issue and comment bodies
+
+Every trigger pattern is compiled at startup into one alternation plus a table
+of literal anchors (the fixed prefix each alternative must start with). A body
+is scanned only up to TRIGGER_SCAN_LIMIT characters, chunk by chunk: the
+anchors are located with C-speed substring search, the compiled alternation is
+only tried at those positions, and the scan stops at the first trigger, so a
+trigger at the top of a pasted log is found without reading the rest.
+
+Bot-status markers are the agent's own fixed text - plain substring checks,
+not part of the alternation.
+"""
+
+import os
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+# Substrings found in the agent's own comments - seeing one means the comment
+# is a status report and must not re-trigger the agent
+BOT_STATUS_MARKERS = [
+    'Bug Fix Agent 已接单',
+    '任务ID:',
+    '分支: `agent/',
+    '🤖 Agent 正在分析问题',
+]
+
+# Triggers are searched in chunks growing from SCAN_CHUNK characters, so only
+# about the part of the window before the first trigger is lowercased and searched
+SCAN_CHUNK = 256
+
+class TriggerMatch(NamedTuple):
+    """A matched trigger: command is 'fix', 'help' or 'mention'"""
+    command: str
+    args: str
+    text: str
+
+class TriggerMatcher:
+    """Single-pass matcher for @mention / slash-command triggers"""
+
+    def __init__(self, app_name: Optional[str] = None, scan_limit: Optional[int] = None):
+        self.app_name = app_name or os.getenv('GITHUB_APP_NAME', 'agent')
+        self.scan_limit = scan_limit or int(os.getenv('TRIGGER_SCAN_LIMIT', '8192'))
+
+        app = f'@{self.app_name}'
+        # (command, literal prefix, regex suffix), ordered by priority:
+        # at the same position the first alternative wins
+        triggers = [
+            # GitHub App @mention 模式
+            ('fix', app, r'\s+fix'),
+            ('help', app, r'\s+help'),
+            ('mention', app, r'\b'),  # 简单的 @app-name 提及
+            # 传统模式（向后兼容）
+            ('fix', '@agent', r'\s+fix'),
+            ('fix', '/agent', r'\s+fix'),
+        ]
+
+        self._groups = {}
+        alternatives = []
+        anchors = set()
+        for command, prefix, suffix in triggers:
+            pattern = re.escape(prefix) + suffix
+            if pattern in alternatives:
+                continue
+            name = f"g{len(alternatives)}"
+            self._groups[name] = command
+            alternatives.append(pattern)
+            anchors.add(prefix.lower())
+
+        self.patterns: List[str] = alternatives
+        self._anchors = sorted(anchors)
+        self._overlap = max(len(anchor) for anchor in anchors) - 1
+        self._regex = re.compile(
+            '|'.join(f"(?P<g{i}>{pattern})" for i, pattern in enumerate(alternatives)),
+            re.IGNORECASE
+        )
+
+    def _search(self, window: str) -> Optional["re.Match"]:
+        """First trigger in window, trying the alternation only at anchor occurrences"""
+        start, size, end = 0, SCAN_CHUNK, len(window)
+        while start < end:
+            stop = min(start + size, end)
+            # Read a little past the chunk for anchors that start in it and end in the next one
+            chunk = window[start:stop + self._overlap]
+            lowered = chunk.lower()
+            if len(lowered) != len(chunk):
+                # Some characters change length when lowercased - positions would not line up
+                return self._regex.search(window, start)
+
+            limit = stop - start
+            positions = [lowered.find(anchor) for anchor in self._anchors]
+            while True:
+                pos = min([p for p in positions if p != -1], default=limit)
+                if pos >= limit:
+                    break
+                m = self._regex.match(window, start + pos)
+                if m:
+                    return m
+                positions = [lowered.find(anchor, pos + 1) if p == pos else p
+                             for anchor, p in zip(self._anchors, positions)]
+            start, size = stop, size * 2
+        return None
+
+    def scan(self, text: str, check_markers: bool = False) -> Tuple[Optional[TriggerMatch], Optional[str]]:
+        """
+        Scan the first scan_limit characters of text.
+
+        Returns (trigger, marker): the first trigger found, and with
+        check_markers a bot-status marker found in the window. A marker wins -
+        when one is found the trigger is not looked for and comes back None.
+        """
+        if not text:
+            return None, None
+
+        window = text[:self.scan_limit]
+        if check_markers:
+            for marker in BOT_STATUS_MARKERS:
+                if marker in window:
+                    return None, marker
+
+        m = self._search(window)
+        if m is None:
+            return None, None
+        line_end = window.find('\n', m.end())
+        args = window[m.end():line_end if line_end != -1 else len(window)].strip()
+        return TriggerMatch(self._groups[m.lastgroup], args, m.group()), None
@@ -0,0 +1,57 @@
+"""
+Webhook recorder for load testing
+
+With WEBHOOK_RECORD_DIR set, every delivery that reaches the gateway is saved
+as one JSON file ({"headers": ..., "body": ...}) for scripts/webhook_loadgen.py
+to replay. Signature headers are dropped - the load generator re-signs each
+payload with the test secret. At most WEBHOOK_RECORD_MAX files are written.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Headers that identify a single delivery or authenticate it - regenerated on replay
+SKIPPED_HEADERS = {'x-hub-signature', 'x-hub-signature-256', 'x-gitcode-token', 'content-length', 'host'}
+
+class WebhookRecorder:
+    """Append-only recorder of raw webhook deliveries"""
+
+    def __init__(self, directory: Optional[str] = None, max_files: Optional[int] = None):
+        self.directory = directory if directory is not None else os.getenv('WEBHOOK_RECORD_DIR', '')
+        self.max_files = max_files or int(os.getenv('WEBHOOK_RECORD_MAX', '1000'))
+        self.recorded = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            logger.info(f"Recording webhook deliveries to {self.directory}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.recorded < self.max_files
+
+    async def record(self, event_type: str, headers: Dict[str, str], body: bytes):
+        if not self.enabled:
+            return
+        self.recorded += 1
+
+        entry = {
+            'headers': {k: v for k, v in headers.items() if k.lower() not in SKIPPED_HEADERS},
+            'body': body.decode('utf-8', errors='replace')
+        }
+        name = f"{int(time.time() * 1000)}-{event_type or 'unknown'}-{uuid.uuid4().hex[:8]}.json"
+        path = os.path.join(self.directory, name)
+
+        def write():
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+
+        try:
+            await asyncio.to_thread(write)
+        except Exception as e:
+            logger.error(f"Failed to record webhook to {path}: {e}")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+GitHub App auth cost per job
+
+Replays a simulated stream of jobs and counts what each job costs in App
+authentication: GitHub API calls (installation lookups and token mints), JWT
+signatures and private key parses. Like the worker, every job builds its own
+AgentWorker (and so its own GitPlatformAPI and GitHubAppAuth), and each of
+its authenticated platform API calls resolves auth through that API client.
+
+Two variants are compared:
+- legacy: the old behaviour - a GitHubAppAuth (and token cache) per job, the
+  key parsed per GitHubAppAuth, a fresh JWT per App call, an installation
+  lookup per authenticated request
+- cached: the current GitHubAppAuth - one per process, key and JWT shared,
+  installation ids cached and seeded from the job's webhook payload
+
+Network calls are replaced inside this script by counters (nothing is sent),
+and time runs on a simulated clock so token and JWT expiry are exercised.
+Requires PyJWT and cryptography (see requirements.txt).
+
+Usage:
+    python scripts/bench_installation_auth.py --jobs 500 --repos 20 --calls 12
+    python scripts/bench_installation_auth.py --job-interval 30 --no-seed --json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from worker import github_app_auth
+from worker.github_app_auth import AppJWTCache, GitHubAppAuth, InstallationCache
+from worker.main import AgentWorker
+
+class SimulatedClock:
+    """Stands in for the time module inside github_app_auth"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+class FakeResponse:
+    def __init__(self, data: Dict):
+        self._data = data
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> Dict:
+        return self._data
+
+class FakeGitHub:
+    """Answers the two App endpoints and counts the calls"""
+
+    def __init__(self, clock: SimulatedClock, installations: Dict[str, int]):
+        self.clock = clock
+        self.installations = installations
+        self.calls = Counter()
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        self.calls['installation_lookup'] += 1
+        owner, repo = url.rstrip('/').split('/')[-3:-1]
+        return FakeResponse({'id': self.installations[f"{owner}/{repo}"]})
+
+    def post(self, url: str, **kwargs) -> FakeResponse:
+        self.calls['token_mint'] += 1
+        expires = datetime.fromtimestamp(self.clock.now + 3600, tz=timezone.utc)
+        return FakeResponse({'token': f"ghs_{self.calls['token_mint']}",
+                             'expires_at': expires.strftime('%Y-%m-%dT%H:%M:%SZ')})
+
+class LegacyGitHubAppAuth(GitHubAppAuth):
+    """GitHubAppAuth without key or JWT reuse or installation caching"""
+
+    def _load_private_key(self):
+        with open(self.private_key_path, 'r') as key_file:
+            self._private_key = github_app_auth._parse_private_key(key_file.read())
+
+    def _generate_jwt(self) -> Optional[str]:
+        now = int(github_app_auth.time.time())
+        payload = {'iat': now - 60, 'exp': now + github_app_auth.JWT_LIFETIME, 'iss': str(self.app_id)}
+        return jwt.encode(payload, self._private_key, algorithm='RS256')
+
+    def get_installation_id(self, owner: str, repo: str) -> Optional[int]:
+        return self._fetch_installation_id(owner, repo)
+
+def generate_key_file(path: str):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+
+def run_variant(auth_class, args, key_path: str) -> Dict:
+    random.seed(args.seed)
+    clock = SimulatedClock()
+    repos = [f"org{i % 3}/repo{i}" for i in range(args.repos)]
+    installations = {repo: 1000 + i % 3 for i, repo in enumerate(repos)}
+    github = FakeGitHub(clock, installations)
+
+    signatures = Counter()
+    real_encode, real_parse = jwt.encode, github_app_auth._parse_private_key
+    real_get_auth = github_app_auth.get_github_app_auth
+
+    def counting_encode(*a, **kw):
+        signatures['jwt'] += 1
+        return real_encode(*a, **kw)
+
+    def counting_parse(pem):
+        signatures['key'] += 1
+        return real_parse(pem)
+
+    github_app_auth.time = clock
+    github_app_auth.requests.get, github_app_auth.requests.post = github.get, github.post
+    github_app_auth.jwt.encode = counting_encode
+    github_app_auth._parse_private_key = counting_parse
+    github_app_auth._installation_cache = InstallationCache()
+    github_app_auth._app_jwt_cache = AppJWTCache()
+    github_app_auth.close_github_app_auth()
+    # GitPlatformAPI looks the auth up in the module when it is built: legacy
+    # gets a new GitHubAppAuth per API client, the current code the shared one
+    if auth_class is not GitHubAppAuth:
+        github_app_auth.get_github_app_auth = auth_class
+
+    os.environ.update({'PLATFORM': 'github', 'GITHUB_APP_ID': '1', 'GITHUB_APP_PRIVATE_KEY_PATH': key_path,
+                       'TOKEN_STORE_BACKEND': 'memory'})
+    started = time.perf_counter()
+    try:
+        for _ in range(args.jobs):
+            full_name = random.choice(repos)
+            owner, repo = full_name.split('/')
+            # One AgentWorker per job, as process_job does
+            api = AgentWorker().api
+            if args.seed_from_webhook and auth_class is GitHubAppAuth:
+                api.remember_installation(owner, repo, installations[full_name])
+            for _ in range(args.calls):
+                api._resolve_auth(owner, repo)
+                clock.now += args.call_interval
+            clock.now += args.job_interval
+    finally:
+        github_app_auth.get_github_app_auth = real_get_auth
+        github_app_auth.close_github_app_auth()
+        github_app_auth.jwt.encode, github_app_auth._parse_private_key = real_encode, real_parse
+    elapsed = time.perf_counter() - started
+
+    api_calls = sum(github.calls.values())
+    return {
+        'jobs': args.jobs,
+        'api_calls': dict(github.calls),
+        'api_calls_per_job': round(api_calls / args.jobs, 3),
+        'jwt_signatures': signatures['jwt'],
+        'jwt_signatures_per_job': round(signatures['jwt'] / args.jobs, 3),
+        'key_parses': signatures['key'],
+        'auth_cpu_ms_per_job': round(elapsed * 1000 / args.jobs, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='GitHub App auth cost per job')
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--repos', type=int, default=10, help='Distinct repositories jobs are spread over')
+    parser.add_argument('--calls', type=int, default=12, help='Authenticated API calls per job')
+    parser.add_argument('--call-interval', type=float, default=5.0, help='Simulated seconds between calls in a job')
+    parser.add_argument('--job-interval', type=float, default=60.0, help='Simulated seconds between jobs')
+    parser.add_argument('--no-seed', dest='seed_from_webhook', action='store_false',
+                        help="Don't seed installation ids from the webhook payload")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    key_path = os.path.join(os.getenv('TMPDIR', '/tmp'), f'bench-app-key-{os.getpid()}.pem')
+    generate_key_file(key_path)
+    try:
+        report = {
+            'legacy': run_variant(LegacyGitHubAppAuth, args, key_path),
+            'cached': run_variant(GitHubAppAuth, args, key_path)
+        }
+    finally:
+        os.remove(key_path)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, result in report.items():
+        print(f"{name:7} api calls/job {result['api_calls_per_job']:8}  "
+              f"jwt signatures/job {result['jwt_signatures_per_job']:8}  key parses {result['key_parses']:5}  "
+              f"auth cpu/job {result['auth_cpu_ms_per_job']}ms  {result['api_calls']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Trigger matcher microbenchmark
+
+Compares the per-event cost of the legacy per-pattern re.search loop with the
+compiled single-pass TriggerMatcher on small and large (pasted-log) bodies.
+
+Pass criteria (exit status 1 otherwise): on every body - including a 64KB log
+with the trigger in its first line, where the legacy loop stops early - the
+compiled matcher is at most --tolerance times the legacy cost. Timings are
+the best of --repeat runs, to keep scheduler noise out.
+
+Usage:
+    python scripts/bench_triggers.py [--iterations 2000] [--repeat 5] [--tolerance 1.25] [--app-name agent]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gateway'))
+
+from triggers import TriggerMatcher, BOT_STATUS_MARKERS
+
+def legacy_match(app_name: str, body: str) -> bool:
+    """The pre-TriggerMatcher logic from GitPlatformEventHandler.should_process_event"""
+    patterns = [
+        rf'@{re.escape(app_name)}\s+fix',
+        rf'@{re.escape(app_name)}\s+help',
+        rf'@{re.escape(app_name)}\b',
+        r'@agent\s+fix',
+        r'/agent\s+fix',
+        r'@agent fix',
+        r'/agent fix'
+    ]
+    if any(marker in body for marker in BOT_STATUS_MARKERS):
+        return False
+    for pattern in patterns:
+        if re.search(pattern, body, re.IGNORECASE):
+            return True
+    return False
+
+def build_bodies():
+    log_line = "2024-01-01T12:00:00.123Z ERROR [worker-3] request failed: ConnectionResetError(104, 'Connection reset by peer') at /srv/app/handlers.py:218\n"
+    logs = log_line * (65536 // len(log_line))
+    return {
+        'short comment, trigger': "@agent fix the login redirect please",
+        'short comment, no trigger': "Looks good to me, thanks for the quick turnaround!",
+        '64KB log, trigger first': "@agent fix this crash\n\n```\n" + logs + "```",
+        '64KB log, trigger last': "```\n" + logs + "```\n@agent fix",
+        '64KB log, no trigger': "```\n" + logs + "```",
+    }
+
+def bench(func, body: str, iterations: int, repeat: int) -> float:
+    """Best per-call time in µs over repeat runs of iterations calls"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(body)
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Trigger matcher microbenchmark')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Largest allowed compiled/legacy cost ratio on any body')
+    parser.add_argument('--app-name', default='agent')
+    args = parser.parse_args()
+
+    matcher = TriggerMatcher(args.app_name)
+
+    def compiled(body: str):
+        return matcher.scan(body, check_markers=True)
+
+    print(f"scan limit: {matcher.scan_limit} chars, iterations: {args.iterations}")
+    print(f"{'body':<28} {'legacy µs':>12} {'compiled µs':>12} {'speedup':>9}")
+    failed = []
+    for name, body in build_bodies().items():
+        legacy_us = bench(lambda b: legacy_match(args.app_name, b), body, args.iterations, args.repeat)
+        compiled_us = bench(compiled, body, args.iterations, args.repeat)
+        ok = compiled_us <= legacy_us * args.tolerance
+        if not ok:
+            failed.append(name)
+        print(f"{name:<28} {legacy_us:>12.2f} {compiled_us:>12.2f} {legacy_us / compiled_us:>8.1f}x"
+              f"{'' if ok else '  FAIL'}")
+
+    if failed:
+        print(f"FAIL: compiled matcher slower than {args.tolerance}x legacy on: {', '.join(failed)}")
+        sys.exit(1)
+    print("PASS")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Webhook replay load generator
+
+Replays recorded webhook deliveries (see WEBHOOK_RECORD_DIR) against a running
+gateway, open-loop: requests are sent on schedule whether or not earlier ones
+have completed, and latency is measured from the scheduled send time, so a
+slow gateway shows up as latency instead of a lower send rate.
+
+Every request gets a fresh X-GitHub-Delivery id and a unique comment id (so
+deduplication does not swallow replays) and is re-signed with --secret.
+Without --dir a small built-in mix of events is used.
+
+Run the gateway with the worker side stubbed out:
+    QUEUE_BACKEND=stub OUTBOX_DRY_RUN=true WEBHOOK_SECRET=loadtest python gateway/run.py
+
+Usage:
+    python scripts/webhook_loadgen.py --rate 200 --duration 30
+    python scripts/webhook_loadgen.py --ramp 50:1000 --duration 60 --dir recordings/
+    python scripts/webhook_loadgen.py --rate 500 --json > after.json
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import hmac
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import itertools
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import httpx
+
+def builtin_samples(app_name: str) -> List[Dict]:
+    """A representative mix: mostly noise, some triggers"""
+    repository = {'name': 'demo', 'owner': {'login': 'octo'}, 'default_branch': 'main'}
+    issue = {'number': 42, 'title': 'Crash on login', 'body': 'Stack trace attached', 'user': {'login': 'alice'}}
+
+    def delivery(event: str, payload: Dict) -> Dict:
+        return {'headers': {'x-github-event': event, 'x-gitcode-event': event, 'content-type': 'application/json'},
+                'body': json.dumps(payload)}
+
+    return [
+        delivery('issue_comment', {'action': 'created', 'issue': issue, 'repository': repository,
+                                   'comment': {'id': 1, 'body': f'@{app_name} fix please', 'user': {'login': 'alice'}},
+                                   'installation': {'id': 1}}),
+        delivery('issue_comment', {'action': 'created', 'issue': issue, 'repository': repository,
+                                   'comment': {'id': 2, 'body': 'Thanks, looks good!', 'user': {'login': 'bob'}}}),
+        delivery('issue_comment', {'action': 'edited', 'issue': issue, 'repository': repository,
+                                   'comment': {'id': 3, 'body': 'edited text', 'user': {'login': 'bob'}}}),
+        delivery('issues', {'action': 'labeled', 'issue': issue, 'repository': repository}),
+        delivery('push', {'ref': 'refs/heads/main', 'repository': repository, 'commits': []}),
+        delivery('pull_request', {'action': 'synchronize', 'repository': repository, 'number': 7}),
+    ]
+
+def load_recordings(directory: str) -> List[Dict]:
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            samples.append(json.load(f))
+    return samples
+
+class Replayer:
+    """Turns a recorded delivery into a unique, correctly signed request"""
+
+    def __init__(self, samples: List[Dict], secret: str):
+        self.samples = samples
+        self.secret = secret.encode() if secret else None
+        self._ids = itertools.count(int(time.time() * 1000))
+
+    def build(self, sample: Dict) -> Tuple[Dict[str, str], bytes]:
+        headers = dict(sample['headers'])
+        body = sample['body']
+
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            payload = None
+        if isinstance(payload, dict) and isinstance(payload.get('comment'), dict):
+            payload['comment']['id'] = next(self._ids)
+            body = json.dumps(payload)
+
+        raw = body.encode('utf-8')
+        headers['x-github-delivery'] = str(uuid.uuid4())
+        if self.secret:
+            digest = hmac.new(self.secret, raw, hashlib.sha256).hexdigest()
+            headers['x-hub-signature-256'] = f'sha256={digest}'
+            headers['x-gitcode-token'] = digest
+        return headers, raw
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+def rate_at(elapsed: float, args) -> float:
+    if args.ramp:
+        start, end = args.ramp
+        return start + (end - start) * min(elapsed / args.duration, 1.0)
+    return args.rate
+
+async def run(args, samples: List[Dict]) -> Dict:
+    replayer = Replayer(samples, args.secret)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    outcomes: Counter = Counter()
+    in_flight = 0
+    skipped = 0
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+
+        async def fire(scheduled: float, headers: Dict[str, str], body: bytes):
+            nonlocal in_flight
+            try:
+                response = await client.post(args.url, content=body, headers=headers)
+                statuses[str(response.status_code)] += 1
+                if response.status_code == 200:
+                    try:
+                        outcomes[response.json().get('status', 'unknown')] += 1
+                    except ValueError:
+                        outcomes['unknown'] += 1
+            except httpx.TimeoutException:
+                statuses['timeout'] += 1
+            except httpx.HTTPError:
+                statuses['error'] += 1
+            finally:
+                latencies.append(time.perf_counter() - scheduled)
+                in_flight -= 1
+
+        tasks = []
+        start = time.perf_counter()
+        next_send = start
+        while True:
+            elapsed = next_send - start
+            if elapsed >= args.duration:
+                break
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if in_flight >= args.max_in_flight:
+                # Client-side saturation - count it rather than silently slowing down
+                skipped += 1
+            else:
+                headers, body = replayer.build(random.choice(samples))
+                in_flight += 1
+                tasks.append(asyncio.create_task(fire(next_send, headers, body)))
+
+            next_send += 1.0 / max(rate_at(elapsed, args), 0.001)
+
+        send_window = time.perf_counter() - start
+        await asyncio.gather(*tasks)
+        total_time = time.perf_counter() - start
+
+    latencies.sort()
+    sent = len(tasks)
+    completed = sum(statuses.values())
+    ok = statuses.get('200', 0)
+    return {
+        'url': args.url,
+        'mode': f"ramp {args.ramp[0]:g}->{args.ramp[1]:g}/s" if args.ramp else f"constant {args.rate:g}/s",
+        'duration': round(total_time, 2),
+        'sent': sent,
+        'skipped_client_saturated': skipped,
+        'offered_rps': round(sent / send_window, 1) if send_window else 0.0,
+        'throughput_rps': round(completed / total_time, 1) if total_time else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p90': round(percentile(latencies, 0.90) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        },
+        'status_counts': dict(statuses),
+        'rate_429': round(statuses.get('429', 0) / completed, 4) if completed else 0.0,
+        'error_rate': round(sum(n for s, n in statuses.items() if s != '200' and s != '429') / completed, 4) if completed else 0.0,
+        'outcomes': dict(outcomes),
+        'accepted_ratio': round(outcomes.get('accepted', 0) / ok, 4) if ok else 0.0,
+        'ignored_ratio': round(outcomes.get('ignored', 0) / ok, 4) if ok else 0.0
+    }
+
+def print_report(report: Dict):
+    print(f"target:      {report['url']} ({report['mode']})")
+    print(f"sent:        {report['sent']} in {report['duration']}s "
+          f"(offered {report['offered_rps']}/s, skipped {report['skipped_client_saturated']})")
+    print(f"throughput:  {report['throughput_rps']} req/s")
+    lat = report['latency_ms']
+    print(f"latency:     p50 {lat['p50']}ms  p90 {lat['p90']}ms  p99 {lat['p99']}ms  max {lat['max']}ms")
+    print(f"statuses:    {report['status_counts']}")
+    print(f"429 rate:    {report['rate_429']:.2%}   error rate: {report['error_rate']:.2%}")
+    print(f"outcomes:    {report['outcomes']} (accepted {report['accepted_ratio']:.2%}, ignored {report['ignored_ratio']:.2%})")
+
+def parse_ramp(value: str) -> Tuple[float, float]:
+    start, _, end = value.partition(':')
+    return float(start), float(end)
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook replay load generator')
+    parser.add_argument('--url', default='http://localhost:8080/api/webhook')
+    parser.add_argument('--dir', help='Directory of recorded deliveries (WEBHOOK_RECORD_DIR); default: built-in mix')
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET', ''), help='Secret to re-sign payloads with')
+    parser.add_argument('--app-name', default=os.getenv('GITHUB_APP_NAME', 'agent'), help='App name used by the built-in mix')
+    parser.add_argument('--rate', type=float, default=100.0, help='Constant request rate (req/s)')
+    parser.add_argument('--ramp', type=parse_ramp, help='Open-loop linear ramp START:END req/s over --duration')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to send for')
+    parser.add_argument('--connections', type=int, default=200, help='HTTP connection pool size')
+    parser.add_argument('--max-in-flight', type=int, default=5000, help='Requests outstanding before sends are skipped')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    samples = load_recordings(args.dir) if args.dir else builtin_samples(args.app_name)
+    if not samples:
+        print(f"No recordings found in {args.dir}", file=sys.stderr)
+        sys.exit(1)
+
+    report = asyncio.run(run(args, samples))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ import sys
 import signal
 from pathlib import Path
 
+from gateway.environment import is_production
+
 def load_env_file():
     """Load environment variables from .env file"""
     env_file = Path(__file__).parent / '.env'
@@ -51,6 +53,12 @@ def check_config():
 
 def start_server():
     """Start the FastAPI server"""
+    if is_production():
+        # --reload 会启动文件监听且只有单进程，生产环境必须使用多进程启动器
+        print("\n❌ 生产环境 (APP_ENV=production) 不允许使用 --reload 启动")
+        print("💡 请使用: python gateway/run.py --workers N")
+        sys.exit(1)
+
     print("\n🚀 启动 Bug Fix Agent 服务...")
     print("   地址: http://localhost:8080")
     print("   健康检查: http://localhost:8080/health")
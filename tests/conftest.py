@@ -0,0 +1,13 @@
+"""
+Test setup: the gateway's modules are imported flat (as uvicorn loads them
+from gateway/), the worker as the `worker` package from the project root.
+"""
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, 'gateway')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,126 @@
+import os
+import json
+import signal
+import asyncio
+
+import pytest
+
+import security
+from security import ACLIndex
+
+@pytest.fixture(autouse=True)
+def fresh_acl(monkeypatch):
+    for name in ('ACL_FILE', 'ALLOWED_USERS', 'ALLOWED_REPOS'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(security, '_acl_index', None)
+
+def write_acl(path, data):
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return str(path)
+
+def test_empty_acl_allows_everything():
+    acl = ACLIndex()
+    assert acl.allows_user('anyone')
+    assert acl.allows_repo('octo', 'hello')
+    assert acl.allows_repo('octo', 'hello', installation_id=7)
+
+def test_users_are_exact_and_case_insensitive():
+    acl = ACLIndex(users=[' Alice ', '', 'bob'])
+    assert acl.allows_user('alice') and acl.allows_user('ALICE') and acl.allows_user('bob')
+    assert not acl.allows_user('alice2')
+    assert not acl.allows_user('mallory')
+
+def test_repos_and_org_wildcards():
+    acl = ACLIndex(repos=['octo/hello', 'Acme/*'])
+    assert acl.allows_repo('octo', 'hello')
+    assert acl.allows_repo('OCTO', 'Hello')
+    assert not acl.allows_repo('octo', 'other')
+    assert acl.allows_repo('acme', 'anything')
+    assert acl.allows_repo('ACME', 'Widgets')
+    # A wildcard covers the org itself, not orgs that merely share a prefix
+    assert not acl.allows_repo('acme-labs', 'anything')
+    assert not acl.allows_repo('someone', 'acme')
+
+def test_installation_lists_only_restrict_their_installation():
+    acl = ACLIndex(installations={'7': ['octo/hello'], 8: ['acme/*']})
+    assert acl.allows_repo('octo', 'hello', installation_id=7)
+    assert not acl.allows_repo('acme', 'widgets', installation_id=7)
+    assert acl.allows_repo('acme', 'widgets', installation_id=8)
+    assert not acl.allows_repo('octo', 'hello', installation_id=8)
+    # Installations without a list, and events without an installation, fall back to the global lists
+    assert acl.allows_repo('acme', 'widgets', installation_id=9)
+    assert acl.allows_repo('acme', 'widgets')
+
+def test_installation_list_cannot_widen_global_repos():
+    acl = ACLIndex(repos=['octo/*'], installations={7: ['acme/*', 'octo/hello']})
+    assert acl.allows_repo('octo', 'hello', installation_id=7)
+    assert not acl.allows_repo('octo', 'other', installation_id=7)
+    assert not acl.allows_repo('acme', 'widgets', installation_id=7)
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('ALLOWED_USERS', 'alice, bob,')
+    monkeypatch.setenv('ALLOWED_REPOS', 'octo/hello,acme/*')
+    acl = security.load_acl_index()
+    assert acl.users == {'alice', 'bob'}
+    assert (acl.repos, acl.orgs, acl.installations) == ({'octo/hello'}, {'acme'}, {})
+    assert acl.allows_repo('acme', 'widgets')
+    assert not acl.allows_repo('octo', 'other')
+
+def test_file_takes_precedence_over_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('ALLOWED_USERS', 'alice')
+    monkeypatch.setenv('ALLOWED_REPOS', 'octo/hello')
+    monkeypatch.setenv('ACL_FILE', write_acl(tmp_path / 'acl.json', {
+        'users': ['carol'], 'repos': ['acme/*'], 'installations': {'7': ['acme/widgets']}}))
+    acl = security.load_acl_index()
+    assert acl.allows_user('carol') and not acl.allows_user('alice')
+    assert acl.allows_repo('acme', 'gadgets') and not acl.allows_repo('octo', 'hello')
+    assert acl.allows_repo('acme', 'widgets', installation_id=7)
+    assert not acl.allows_repo('acme', 'gadgets', installation_id=7)
+    assert acl.summary() == '1 users, 0 repos, 1 org wildcards, 1 installation lists'
+
+def test_reload_swaps_index_and_keeps_old_one_on_error(tmp_path, monkeypatch):
+    path = tmp_path / 'acl.json'
+    monkeypatch.setenv('ACL_FILE', write_acl(path, {'users': ['alice']}))
+    first = security.get_acl_index()
+    assert security.get_acl_index() is first
+    assert first.allows_user('alice') and not first.allows_user('bob')
+
+    write_acl(path, {'users': ['bob']})
+    assert security.get_acl_index() is first  # not re-read until reloaded
+    assert security.reload_acl_index()
+    reloaded = security.get_acl_index()
+    assert reloaded.allows_user('bob') and not reloaded.allows_user('alice')
+
+    path.write_text('{not json', encoding='utf-8')
+    assert not security.reload_acl_index()
+    assert security.get_acl_index() is reloaded
+
+    os.remove(path)
+    assert not security.reload_acl_index()
+    assert security.get_acl_index() is reloaded
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGHUP'), reason='SIGHUP not available')
+def test_sighup_reloads_acl(tmp_path, monkeypatch):
+    path = tmp_path / 'acl.json'
+    monkeypatch.setenv('ACL_FILE', write_acl(path, {'repos': ['octo/hello']}))
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        assert not security.get_acl_index().allows_repo('acme', 'widgets')
+        security.install_acl_reload_handler()
+        try:
+            write_acl(path, {'repos': ['acme/*']})
+            os.kill(os.getpid(), signal.SIGHUP)
+            for _ in range(100):
+                if security.get_acl_index().allows_repo('acme', 'widgets'):
+                    break
+                await asyncio.sleep(0.01)
+            assert security.get_acl_index().allows_repo('acme', 'widgets')
+        finally:
+            loop.remove_signal_handler(signal.SIGHUP)
+
+    asyncio.run(scenario())
+
+def test_reload_handler_needs_running_loop(caplog):
+    security.install_acl_reload_handler()
+    assert 'SIGHUP ACL reload not available' in caplog.text
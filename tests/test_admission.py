@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setenv('MAX_CONCURRENT_JOBS', '1')
+    monkeypatch.setenv('MAX_PENDING_JOBS', '2')
+    monkeypatch.setenv('MAX_JOBS_PER_REPO', '2')
+    monkeypatch.setenv('MAX_JOBS_PER_INSTALLATION', '3')
+    monkeypatch.setenv('ADMISSION_RETRY_AFTER', '17')
+    return AdmissionController()
+
+def job(repo, installation_id=1):
+    return {'owner': 'octo', 'repo': repo, 'installation_id': installation_id}
+
+def rejection(controller, job):
+    with pytest.raises(AdmissionRejected) as info:
+        controller.admit(job)
+    return info.value
+
+def test_per_repo_limit_is_case_insensitive(controller):
+    controller.max_pending = 10
+    controller.admit(job('hello'))
+    controller.admit(job('Hello'))
+    error = rejection(controller, job('HELLO'))
+    assert (error.reason, error.status_code, error.retry_after) == ('repo_limit', 429, 17)
+    controller.release(job('hello'))
+    controller.admit(job('HELLO'))
+
+def test_installation_limit_and_queue_full(controller):
+    controller.max_pending = 10
+    for repo in ('a', 'b', 'c'):
+        controller.admit(job(repo))
+    assert rejection(controller, job('d')).reason == 'installation_limit'
+    controller.max_pending = 3
+    error = rejection(controller, job('d', installation_id=2))
+    assert (error.reason, error.status_code) == ('queue_full', 503)
+    assert controller.stats()['rejections'] == {'installation_limit': 1, 'queue_full': 1}
+
+def test_slots_bound_running_jobs_and_release_admission(controller):
+    running, peak = [], []
+
+    async def run(j):
+        async with controller.slot(j):
+            running.append(j)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(j)
+
+    async def scenario():
+        jobs = [job('a'), job('b')]
+        for j in jobs:
+            controller.admit(j)
+        assert controller.stats()['pending'] == 2
+        await asyncio.gather(*(run(j) for j in jobs))
+
+    asyncio.run(scenario())
+    assert max(peak) == 1
+    assert controller.stats() == {'running': 0, 'pending': 0, 'max_running': 1, 'max_pending': 2,
+                                  'rejections': {}}
+    assert not controller._inflight
@@ -0,0 +1,100 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from worker.blob_reader import BlobCache, BlobReader
+
+def git(cwd, *args):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / 'repo'
+    git(tmp_path, 'init', '-q', str(path))
+    (path / 'src').mkdir()
+    (path / 'src' / 'app.py').write_text('print("v1")\n')
+    (path / 'data.bin').write_bytes(b'\xff\xfeok\n')
+    git(path, 'add', '.')
+    git(path, 'commit', '-q', '-m', 'v1')
+    (path / 'src' / 'app.py').write_text('print("v2")\n')
+    git(path, 'commit', '-q', '-am', 'v2')
+    return path
+
+def test_reads_committed_contents_at_rev(repo):
+    reader = BlobReader(str(repo))
+    (repo / 'src' / 'app.py').write_text('uncommitted\n')
+
+    async def scenario():
+        try:
+            assert await reader.read_text('src/app.py') == 'print("v2")\n'
+            assert await reader.read_text('./src/../src/app.py', rev='HEAD~1') == 'print("v1")\n'
+            assert await reader.read('data.bin') == b'\xff\xfeok\n'
+            assert await reader.read_text('data.bin') == 'ok\n'  # undecodable bytes dropped
+            info = await reader.info('src/app.py')
+            assert (info.type, info.size) == ('blob', 12)
+            assert await reader.exists('src/app.py')
+            assert not await reader.exists('src')  # a tree
+            assert not await reader.exists('missing.py')
+            assert await reader.read_text('../outside') is None
+        finally:
+            await reader.close()
+
+    asyncio.run(scenario())
+    assert reader._procs == {}
+
+def test_max_size_checked_before_reading(repo):
+    reader = BlobReader(str(repo))
+
+    async def scenario():
+        try:
+            assert await reader.read_text('src/app.py', max_size=12) is None
+            assert await reader.read_text('src/app.py', max_size=13) == 'print("v2")\n'
+        finally:
+            await reader.close()
+
+    asyncio.run(scenario())
+    assert reader.cache.stats['misses'] == 1
+
+def test_cache_shared_across_workspaces(repo, tmp_path):
+    clone = tmp_path / 'clone'
+    git(tmp_path, 'clone', '-q', str(repo), str(clone))
+    cache = BlobCache(max_entries=8, max_bytes=1024)
+
+    async def scenario():
+        for path in (repo, clone):
+            reader = BlobReader(str(path), cache)
+            try:
+                assert await reader.read_text('src/app.py') == 'print("v2")\n'
+            finally:
+                await reader.close()
+
+    asyncio.run(scenario())
+    assert (cache.stats['misses'], cache.stats['hits']) == (1, 1)
+
+def test_blob_cache_bounded():
+    cache = BlobCache(max_entries=2, max_bytes=10)
+    cache.put('a', 'aaaa')
+    cache.put('b', 'bbbb')
+    cache.get('a')
+    cache.put('c', 'cccc')  # evicts b, the least recently used
+    assert cache.get('b') is None and cache.get('a') == 'aaaa'
+    cache.put('big', 'x' * 11)  # larger than the whole cache
+    assert cache.get('big') is None
+    assert cache.stats['evicted'] == 1
+
+def test_restarts_after_cat_file_exits(repo):
+    reader = BlobReader(str(repo))
+
+    async def scenario():
+        try:
+            assert await reader.exists('src/app.py')
+            proc = reader._procs['--batch-check']
+            proc.kill()
+            await proc.wait()
+            assert await reader.exists('src/app.py')
+        finally:
+            await reader.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from dedup import DeliveryDeduplicator, MemoryDedupBackend, RedisDedupBackend
+
+@pytest.fixture(params=['memory', 'redis'])
+def dedup(request):
+    if request.param == 'memory':
+        return DeliveryDeduplicator(MemoryDedupBackend(ttl=60, max_entries=2))
+    fakeredis = pytest.importorskip('fakeredis')
+    backend = RedisDedupBackend(ttl=60, redis_url='redis://localhost:1/0', prefix='test')
+    backend._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return DeliveryDeduplicator(backend)
+
+def test_redelivery_ignored_until_released(dedup):
+    async def scenario():
+        assert await dedup.claim('delivery:1')
+        assert not await dedup.claim('delivery:1')
+        await dedup.release('delivery:1')
+        assert await dedup.claim('delivery:1')
+        # Webhooks without a key are never deduplicated
+        assert await dedup.claim(None) and await dedup.claim(None)
+
+    asyncio.run(scenario())
+    assert dedup.duplicates == 1
+
+def test_memory_backend_bounded_lru_and_ttl():
+    backend = MemoryDedupBackend(ttl=60, max_entries=2)
+
+    async def scenario():
+        for key in ('a', 'b', 'c'):
+            assert await backend.claim(key)
+        assert await backend.claim('a')  # evicted as least recently used
+        assert not await backend.claim('c')
+        backend.ttl = -1
+        assert await backend.claim('d') and await backend.claim('d')  # already expired
+
+    asyncio.run(scenario())
+
+def test_backend_errors_fail_open():
+    class Broken:
+        async def claim(self, key):
+            raise ConnectionError('redis down')
+
+        async def release(self, key):
+            raise ConnectionError('redis down')
+
+    dedup = DeliveryDeduplicator(Broken())
+
+    async def scenario():
+        assert await dedup.claim('delivery:1')
+        await dedup.release('delivery:1')
+
+    asyncio.run(scenario())
+
+def test_key_for():
+    job = {'owner': 'Octo', 'repo': 'Hello', 'issue_number': 7}
+    assert DeliveryDeduplicator.key_for({'x-github-delivery': 'abc'}, job) == 'delivery:abc'
+    assert DeliveryDeduplicator.key_for({}, dict(job, comment_id=9)) == 'comment:octo/hello#7:9'
+    assert DeliveryDeduplicator.key_for({}, dict(job, event_type='issues')) == 'issue:octo/hello#7'
+    assert DeliveryDeduplicator.key_for({}, job) is None
@@ -0,0 +1,77 @@
+import os
+import asyncio
+import subprocess
+
+import pytest
+
+from worker.git_backend import GITPYTHON_AVAILABLE, GitPythonBackend, SubprocessGitBackend
+
+pytestmark = pytest.mark.skipif(not GITPYTHON_AVAILABLE, reason='GitPython not installed')
+
+AUTHOR = ('Agent', 'agent@example.com')
+
+def git(cwd, *args):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / 'upstream'
+    git(tmp_path, 'init', '-q', '-b', 'main', str(repo))
+    (repo / 'src').mkdir()
+    (repo / 'src' / 'app.py').write_text('print("hi")\n')
+    (repo / 'README.md').write_text('# hello\n')
+    git(repo, 'add', '.')
+    git(repo, 'commit', '-q', '-m', 'initial')
+    return repo
+
+def run_job(backend, upstream, workspace):
+    """The local git steps of a job: branch, write, stage, inspect, commit"""
+    git(workspace.parent, 'clone', '-q', str(upstream), str(workspace))
+    written = ['src/app.py', 'src/new_module.py', 'run.sh']
+
+    async def scenario():
+        assert await backend.create_branch(str(workspace), 'agent/fix-1', 'main')
+        (workspace / 'src' / 'app.py').write_text('print("fixed")\n')
+        (workspace / 'src' / 'new_module.py').write_text('VALUE = 1\n')
+        (workspace / 'run.sh').write_text('#!/bin/sh\n')
+        os.chmod(workspace / 'run.sh', 0o755)
+        assert await backend.add_all(str(workspace), written)
+        changes = await backend.changed_files(str(workspace), written)
+        assert await backend.commit(str(workspace), 'Fix the greeting', AUTHOR)
+        head = git(workspace, 'rev-parse', 'HEAD')
+        # Nothing staged since: a no-op, not a failure
+        assert await backend.commit(str(workspace), 'Empty', AUTHOR)
+        assert git(workspace, 'rev-parse', 'HEAD') == head
+        tracked = await backend.tracked_files(str(workspace), 'HEAD')
+        backend.close(str(workspace))
+        return changes, tracked
+
+    changes, tracked = asyncio.run(scenario())
+    return {
+        'changes': sorted(changes, key=lambda change: change['file']),
+        'tracked': sorted(tracked),
+        'branch': git(workspace, 'rev-parse', '--abbrev-ref', 'HEAD'),
+        'tree': git(workspace, 'rev-parse', 'HEAD^{tree}'),
+        'commit': git(workspace, 'log', '-1', '--format=%an <%ae>|%s|%P'),
+        'status': git(workspace, 'status', '--porcelain')
+    }
+
+def test_gitpython_matches_subprocess(upstream, tmp_path):
+    expected = run_job(SubprocessGitBackend(), upstream, tmp_path / 'subprocess')
+    assert run_job(GitPythonBackend(), upstream, tmp_path / 'gitpython') == expected
+    assert expected['changes'] == [{'status': 'A', 'file': 'run.sh'}, {'status': 'M', 'file': 'src/app.py'},
+                                   {'status': 'A', 'file': 'src/new_module.py'}]
+    assert expected['branch'] == 'agent/fix-1'
+    assert expected['status'] == ''
+
+def test_gitpython_branch_from_other_checkout_falls_back(upstream, tmp_path):
+    git(upstream, 'checkout', '-q', '-b', 'feature')
+    git(upstream, 'commit', '-q', '--allow-empty', '-m', 'feature work')
+    workspace = tmp_path / 'work'
+    git(tmp_path, 'clone', '-q', '-b', 'feature', str(upstream), str(workspace))
+
+    backend = GitPythonBackend()
+    assert asyncio.run(backend.create_branch(str(workspace), 'agent/fix-1', 'main'))
+    assert git(workspace, 'rev-parse', 'HEAD') == git(upstream, 'rev-parse', 'main')
+    backend.close(str(workspace))
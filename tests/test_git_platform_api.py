@@ -0,0 +1,175 @@
+import json
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+
+from worker import git_platform_api
+from worker.git_platform_api import GitPlatformAPI
+from worker.rate_limit import LocalBudgetBackend, RateLimitScheduler
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setenv('PLATFORM', 'github')
+    monkeypatch.setenv('GITHUB_TOKEN', 'ghp_test')
+    monkeypatch.setenv('GITHUB_BASE', 'https://api.test')
+    monkeypatch.setenv('HTTP_CACHE_ENABLED', 'false')
+    monkeypatch.delenv('GITHUB_APP_ID', raising=False)
+    monkeypatch.delenv('GITHUB_GRAPHQL_URL', raising=False)
+    monkeypatch.delenv('GITHUB_GRAPHQL_ENABLED', raising=False)
+    limiter = RateLimitScheduler(LocalBudgetBackend(write_rate=100.0, write_burst=100, reserve=0))
+    monkeypatch.setattr(git_platform_api, 'get_rate_limiter', lambda: limiter)
+    return GitPlatformAPI()
+
+class FakePlatform:
+    """Answers GraphQL with the given payload and REST writes with an echo"""
+
+    def __init__(self, graphql_response=None):
+        self.graphql_response = graphql_response
+        self.requests = []
+
+    def __call__(self, request):
+        body = json.loads(request.content) if request.content else None
+        self.requests.append((request.method, request.url.path, body))
+        if request.url.path == '/graphql':
+            return httpx.Response(200, json=self.graphql_response)
+        if request.method == 'POST' and request.url.path.endswith('/comments'):
+            return httpx.Response(201, json={'id': 12, 'node_id': 'IC_12'})
+        return httpx.Response(200, json={})
+
+    def rest_calls(self):
+        return [(method, path, body) for method, path, body in self.requests if path != '/graphql']
+
+def run(platform, coro_fn):
+    async def scenario():
+        # Route the shared pool through the fake platform
+        git_platform_api._client = httpx.AsyncClient(transport=httpx.MockTransport(platform))
+        git_platform_api._client_loop = asyncio.get_running_loop()
+        try:
+            return await coro_fn()
+        finally:
+            await git_platform_api.close_api_client()
+
+    return asyncio.run(scenario())
+
+def test_batch_update_runs_one_mutation(api):
+    platform = FakePlatform({'data': {
+        'm0': {'clientMutationId': None},
+        'm1': {'commentEdge': {'node': {'id': 'IC_11', 'databaseId': 11}}},
+        'm2': {'clientMutationId': None},
+    }})
+    operations = [
+        {'op': 'mark_ready', 'number': 5, 'node_id': 'PR_5'},
+        {'op': 'comment', 'number': 5, 'body': 'done', 'node_id': 'PR_5'},
+        {'op': 'update_comment', 'comment_id': 9, 'body': 'edited', 'node_id': 'IC_9'},
+    ]
+    results = run(platform, lambda: api.batch_update('octo', 'hello', operations))
+
+    assert results == [{}, {'id': 11, 'node_id': 'IC_11'}, {}]
+    assert len(platform.requests) == 1
+    method, path, body = platform.requests[0]
+    assert (method, path) == ('POST', '/graphql')
+    assert body['variables'] == {'id0': 'PR_5', 'id1': 'PR_5', 'body1': 'done', 'id2': 'IC_9', 'body2': 'edited'}
+    query = body['query']
+    assert query.startswith('mutation(')
+    assert query.index('m0: markPullRequestReadyForReview') < query.index('m1: addComment') < query.index('m2: updateIssueComment')
+
+def test_partial_graphql_error_falls_back_for_failed_operations_only(api):
+    platform = FakePlatform({
+        'data': {'m0': {'clientMutationId': None}, 'm1': None},
+        'errors': [{'path': ['m1'], 'message': 'Resource not accessible by integration'}],
+    })
+    operations = [
+        {'op': 'update_body', 'number': 5, 'body': 'new body', 'node_id': 'PR_5'},
+        {'op': 'comment', 'number': 5, 'body': 'done', 'node_id': 'PR_5'},
+    ]
+    results = run(platform, lambda: api.batch_update('octo', 'hello', operations))
+
+    assert results == [{}, {'id': 12, 'node_id': 'IC_12'}]
+    assert platform.rest_calls() == [('POST', '/repos/octo/hello/issues/5/comments', {'body': 'done'})]
+
+def test_failed_graphql_request_falls_back_for_everything(api):
+    platform = FakePlatform()
+
+    def handler(request):
+        if request.url.path == '/graphql':
+            platform.requests.append((request.method, request.url.path, None))
+            return httpx.Response(502)
+        return platform(request)
+
+    operations = [
+        {'op': 'mark_ready', 'number': 5, 'node_id': 'PR_5'},
+        {'op': 'update_comment', 'comment_id': 9, 'body': 'edited', 'node_id': 'IC_9'},
+    ]
+    results = run(handler, lambda: api.batch_update('octo', 'hello', operations))
+
+    assert results == [{}, {}]
+    assert platform.rest_calls() == [
+        ('PATCH', '/repos/octo/hello/pulls/5', {'draft': False}),
+        ('PATCH', '/repos/octo/hello/issues/comments/9', {'body': 'edited'}),
+    ]
+
+def test_operations_without_node_id_go_to_rest(api):
+    platform = FakePlatform({'data': {'m0': {'clientMutationId': None}}})
+    operations = [
+        {'op': 'update_body', 'number': 5, 'body': 'new body', 'node_id': 'PR_5'},
+        {'op': 'comment', 'number': 7, 'body': 'done'},
+    ]
+    results = run(platform, lambda: api.batch_update('octo', 'hello', operations))
+
+    assert results == [{}, {'id': 12, 'node_id': 'IC_12'}]
+    graphql = [body for _, path, body in platform.requests if path == '/graphql']
+    assert len(graphql) == 1
+    assert graphql[0]['variables'] == {'id0': 'PR_5', 'body0': 'new body'}
+    assert 'm1' not in graphql[0]['query']
+    assert platform.rest_calls() == [('POST', '/repos/octo/hello/issues/7/comments', {'body': 'done'})]
+
+def test_graphql_disabled_uses_rest_only(api, monkeypatch):
+    monkeypatch.setenv('GITHUB_GRAPHQL_ENABLED', 'false')
+    api = GitPlatformAPI()
+    platform = FakePlatform()
+    operations = [{'op': 'mark_ready', 'number': 5, 'node_id': 'PR_5'}]
+    assert run(platform, lambda: api.batch_update('octo', 'hello', operations)) == [{}]
+    assert platform.requests == [('PATCH', '/repos/octo/hello/pulls/5', {'draft': False})]
+
+def test_instances_share_one_client_per_loop(api, monkeypatch):
+    other = GitPlatformAPI()
+    seen, created = [], []
+    real_client = httpx.AsyncClient
+
+    def handler(request):
+        seen.append(request.url.path)
+        return httpx.Response(200, json={'default_branch': 'trunk'})
+
+    def make_client(**kwargs):
+        kwargs.pop('proxy', None)
+        created.append(real_client(transport=httpx.MockTransport(handler), **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(git_platform_api.httpx, 'AsyncClient', make_client)
+
+    async def scenario():
+        assert await api.get_default_branch('octo', 'hello') == 'trunk'
+        assert await other.get_default_branch('octo', 'other') == 'trunk'
+        assert len(created) == 1
+        assert git_platform_api.get_api_client() is created[0]
+        await git_platform_api.close_api_client()
+        assert created[0].is_closed
+        assert git_platform_api._client is None
+        # The next call opens a fresh pool
+        assert await api.get_default_branch('octo', 'hello') == 'trunk'
+        assert len(created) == 2
+        await git_platform_api.close_api_client()
+
+    asyncio.run(scenario())
+    assert seen == ['/repos/octo/hello', '/repos/octo/other', '/repos/octo/hello']
+
+    async def next_loop():
+        # A client is bound to the loop that made it; a new loop gets its own
+        client = git_platform_api.get_api_client()
+        await git_platform_api.close_api_client()
+        return client
+
+    assert asyncio.run(next_loop()) is created[2]
+    assert created[2].is_closed
@@ -0,0 +1,121 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+pytest.importorskip('aiohttp')
+from fastapi.testclient import TestClient
+
+import app as gateway_app
+import github_api
+import security
+from dedup import DeliveryDeduplicator
+from outbox import Outbox
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """Records comment posts with the client port they arrived on"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    comments = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.comments.append((self.path, self.client_address[1], json.loads(body)['body']))
+        reply = b'{"id": 1}'
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_github():
+    FakeGitHub.comments = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def gateway(monkeypatch, fake_github):
+    for name in ('WEBHOOK_SECRET', 'ACL_FILE', 'ALLOWED_USERS', 'ALLOWED_REPOS', 'GITHUB_APP_ID'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('PLATFORM', 'github')
+    monkeypatch.setenv('GITHUB_TOKEN', 'ghp_test')
+    monkeypatch.setenv('OUTBOX_RETRY_DELAY', '0')
+    monkeypatch.setattr(security, '_acl_index', None)
+    monkeypatch.setattr(gateway_app, 'outbox', Outbox())
+    monkeypatch.setattr(gateway_app, 'deduplicator', DeliveryDeduplicator())
+    queued = []
+
+    async def enqueue_task(job):
+        queued.append(job['job_id'])
+        return True
+
+    monkeypatch.setattr(gateway_app, 'enqueue_task', enqueue_task)
+
+    created = []
+
+    class LocalGitHubAPI(github_api.GitHubAPI):
+        def __init__(self):
+            super().__init__()
+            self.base_url = fake_github
+            created.append(self)
+
+    monkeypatch.setattr(github_api, 'GitHubAPI', LocalGitHubAPI)
+    monkeypatch.setattr(github_api, '_github_api', None)
+    return created, queued
+
+def trigger(client, issue_number):
+    body = json.dumps({
+        'action': 'created',
+        'comment': {'id': issue_number, 'body': '/agent fix it', 'user': {'login': 'alice'}},
+        'issue': {'number': issue_number, 'title': 'Bug', 'body': '', 'user': {'login': 'alice'}},
+        'repository': {'name': 'hello', 'full_name': 'octo/hello', 'owner': {'login': 'octo'},
+                       'clone_url': 'https://github.com/octo/hello.git', 'default_branch': 'main'},
+        'sender': {'login': 'alice'}
+    })
+    response = client.post('/api/webhook', content=body, headers={
+        'X-GitHub-Event': 'issue_comment', 'X-GitHub-Delivery': f"d-{issue_number}"})
+    assert response.json()['status'] == 'accepted'
+
+def wait_for_comments(count):
+    deadline = time.time() + 5
+    while len(FakeGitHub.comments) < count and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(FakeGitHub.comments) == count
+
+def test_lifespan_shares_one_pooled_client(gateway):
+    created, queued = gateway
+
+    with TestClient(gateway_app.app) as client:
+        assert len(created) == 1
+        api = created[0]
+        session = api._session
+        assert session is not None and not session.closed  # opened at startup, not on first use
+
+        trigger(client, 7)
+        wait_for_comments(1)
+        trigger(client, 8)
+        wait_for_comments(2)
+
+        assert github_api.get_github_api() is api
+        assert api._session is session
+
+    assert len(created) == 1
+    assert len(queued) == 2
+    (first_path, first_port, _), (second_path, second_port, _) = FakeGitHub.comments
+    assert (first_path, second_path) == ('/repos/octo/hello/issues/7/comments', '/repos/octo/hello/issues/8/comments')
+    # Both acknowledgements went over the same kept-alive connection
+    assert first_port == second_port
+    assert session.closed
+    assert api._session is None
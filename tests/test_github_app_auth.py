@@ -0,0 +1,109 @@
+import os
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+jwt = pytest.importorskip('jwt')
+pytest.importorskip('cryptography')
+
+from worker import github_app_auth
+from worker.github_app_auth import AppJWTCache, GitHubAppAuth, InstallationCache
+
+@pytest.fixture
+def app_key(tmp_path, monkeypatch):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = tmp_path / 'app.pem'
+    path.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                       serialization.NoEncryption()))
+    monkeypatch.setenv('GITHUB_APP_ID', '42')
+    monkeypatch.setenv('GITHUB_APP_PRIVATE_KEY_PATH', str(path))
+    monkeypatch.setenv('TOKEN_STORE_BACKEND', 'memory')
+    monkeypatch.setattr(github_app_auth, '_app_jwt_cache', AppJWTCache())
+    return path
+
+@pytest.fixture
+def calls(monkeypatch):
+    counts = {'parse': 0, 'sign': 0}
+    real_parse, real_encode = github_app_auth._parse_private_key, jwt.encode
+
+    def parse(pem):
+        counts['parse'] += 1
+        return real_parse(pem)
+
+    def encode(*a, **kw):
+        counts['sign'] += 1
+        return real_encode(*a, **kw)
+
+    monkeypatch.setattr(github_app_auth, '_parse_private_key', parse)
+    monkeypatch.setattr(github_app_auth.jwt, 'encode', encode)
+    return counts
+
+def test_key_and_jwt_shared_across_instances(app_key, calls):
+    # A worker builds a GitHubAppAuth per job
+    tokens = {GitHubAppAuth()._generate_jwt() for _ in range(5)}
+    assert len(tokens) == 1
+    assert calls == {'parse': 1, 'sign': 1}
+    claims = jwt.decode(tokens.pop(), options={'verify_signature': False})
+    assert claims['iss'] == '42'
+
+def test_jwt_resigned_near_expiry(app_key, calls, monkeypatch):
+    auth = GitHubAppAuth()
+    first = auth._generate_jwt()
+    now = github_app_auth.time.time()
+    monkeypatch.setattr(github_app_auth.time, 'time',
+                        lambda: now + github_app_auth.JWT_LIFETIME - github_app_auth.JWT_REFRESH_MARGIN + 1)
+    assert GitHubAppAuth()._generate_jwt() != first
+    assert calls['sign'] == 2
+
+def test_key_reloaded_when_file_changes(app_key, calls):
+    GitHubAppAuth()
+    stat = os.stat(app_key)
+    os.utime(app_key, (stat.st_atime, stat.st_mtime + 10))
+    GitHubAppAuth()
+    assert calls['parse'] == 2
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+def refresher_threads():
+    return [t for t in threading.enumerate() if t.name == 'installation-token-refresher' and t.is_alive()]
+
+def test_jobs_share_one_auth_and_refresher(app_key, monkeypatch):
+    pytest.importorskip('httpx')
+    from worker.main import AgentWorker
+
+    mints = []
+
+    def post(url, **kwargs):
+        mints.append(url)
+        expires = datetime.fromtimestamp(github_app_auth.time.time() + 3600, tz=timezone.utc)
+        return FakeResponse({'token': f"ghs_{len(mints)}", 'expires_at': expires.strftime('%Y-%m-%dT%H:%M:%SZ')})
+
+    monkeypatch.setenv('PLATFORM', 'github')
+    monkeypatch.setattr(github_app_auth.requests, 'post', post)
+    monkeypatch.setattr(github_app_auth, '_installation_cache', InstallationCache())
+    github_app_auth.close_github_app_auth()
+    before = len(refresher_threads())
+    try:
+        for _ in range(5):
+            # process_job builds an AgentWorker (and its API client) per job
+            api = AgentWorker().api
+            api.remember_installation('octo', 'hello', 7)
+            assert asyncio.run(api.get_token('octo', 'hello')) == 'ghs_1'
+        assert len(refresher_threads()) == before + 1
+        assert len(mints) == 1
+    finally:
+        github_app_auth.close_github_app_auth()
+    assert len(refresher_threads()) == before
@@ -0,0 +1,130 @@
+import os
+import asyncio
+import subprocess
+
+import pytest
+
+from worker.gitops import CLONE_STRATEGIES, GitOps, resolve_clone_strategy
+
+FILES = {
+    'README.md': '# hello\n',
+    'setup.cfg': '[metadata]\nname = hello\n',
+    'src/app.py': 'print("v2")\n',
+    'src/lib/util.py': 'def util():\n    return 1\n',
+    'docs/guide.md': 'guide\n',
+}
+
+def git(cwd, *args):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / 'upstream'
+    git(tmp_path, 'init', '-q', '-b', 'main', str(repo))
+    # Partial clones over file:// need the server side to accept filters
+    git(repo, 'config', 'uploadpack.allowFilter', 'true')
+    git(repo, 'config', 'uploadpack.allowAnySHA1InWant', 'true')
+    (repo / 'src').mkdir()
+    (repo / 'src' / 'app.py').write_text('print("v1")\n')
+    git(repo, 'add', '.')
+    git(repo, 'commit', '-q', '-m', 'v1')
+    for path, content in FILES.items():
+        os.makedirs(repo / os.path.dirname(path), exist_ok=True)
+        (repo / path).write_text(content)
+    git(repo, 'add', '.')
+    git(repo, 'commit', '-q', '-m', 'v2')
+    return repo
+
+@pytest.fixture
+def ops(monkeypatch):
+    monkeypatch.setenv('GIT_CLONE_TIMEOUT', '60')
+    return GitOps()
+
+def clone(ops, upstream, destination, strategy, reference=None):
+    return asyncio.run(ops.clone_repo(f"file://{upstream}", str(destination), reference=reference,
+                                      strategy=strategy, branch='main'))
+
+@pytest.mark.parametrize('strategy', CLONE_STRATEGIES)
+def test_clone_strategies_list_and_read_files(ops, upstream, tmp_path, strategy):
+    work = tmp_path / 'work'
+    assert clone(ops, upstream, work, strategy)
+
+    commits = int(git(work, 'rev-list', '--count', 'HEAD'))
+    assert commits == (1 if strategy == 'shallow' else 2)
+    partial = git(work, 'config', '--default', '', 'remote.origin.partialclonefilter')
+    assert partial == ('blob:none' if strategy in ('blobless', 'sparse') else '')
+    assert ops.is_sparse(str(work)) == (strategy == 'sparse')
+
+    on_disk = {path for path in FILES if (work / path).exists()}
+    if strategy == 'sparse':
+        # Cone mode keeps top-level files only
+        assert on_disk == {'README.md', 'setup.cfg'}
+    else:
+        assert on_disk == set(FILES)
+
+    async def scenario():
+        try:
+            # Trees are all there, checked out or not
+            assert sorted(await ops.list_tracked_files(str(work))) == sorted(FILES)
+            reader = ops.blob_reader(str(work))
+            # Blobs outside the checkout are fetched on demand
+            for path, content in FILES.items():
+                assert await reader.read_text(path) == content
+            if strategy != 'shallow':
+                assert await reader.read_text('src/app.py', rev='HEAD~1') == 'print("v1")\n'
+        finally:
+            await ops.close_workspace(str(work))
+
+    asyncio.run(scenario())
+
+def test_ensure_paths_widens_sparse_checkout(ops, upstream, tmp_path):
+    work = tmp_path / 'work'
+    assert clone(ops, upstream, work, 'sparse')
+    assert not (work / 'src' / 'lib' / 'util.py').exists()
+
+    assert asyncio.run(ops.ensure_paths(str(work), ['src/lib/util.py', 'README.md', '']))
+    assert (work / 'src' / 'lib' / 'util.py').read_text() == FILES['src/lib/util.py']
+    # Only the directories asked for join the cone (plus, in cone mode, their parents' files)
+    assert (work / 'src' / 'app.py').exists()
+    assert not (work / 'docs' / 'guide.md').exists()
+    assert git(work, 'status', '--porcelain') == ''
+
+def test_ensure_paths_is_noop_without_sparse_checkout(ops, upstream, tmp_path):
+    work = tmp_path / 'work'
+    assert clone(ops, upstream, work, 'blobless')
+    assert asyncio.run(ops.ensure_paths(str(work), ['src/lib/util.py']))
+    assert not ops.is_sparse(str(work))
+
+def test_sparse_clone_with_reference_writes_outside_cone(ops, upstream, tmp_path):
+    mirror = tmp_path / 'mirror.git'
+    git(tmp_path, 'clone', '-q', '--mirror', f"file://{upstream}", str(mirror))
+    work = tmp_path / 'work'
+    assert clone(ops, upstream, work, 'sparse', reference=str(mirror))
+    alternates = (work / '.git' / 'objects' / 'info' / 'alternates').read_text()
+    assert alternates.strip() == str(mirror / 'objects')
+
+    async def scenario():
+        # What a stage does before touching a file outside the cone
+        assert await ops.ensure_paths(str(work), ['src/lib/util.py'])
+        assert await ops.write_file(str(work), 'src/lib/util.py', 'def util():\n    return 2\n')
+        assert await ops.write_file(str(work), 'agent/notes.md', 'notes\n')
+        assert await ops.commit(str(work), 'agent: update util', paths=['src/lib/util.py', 'agent/notes.md'])
+        await ops.close_workspace(str(work))
+
+    asyncio.run(scenario())
+    changed = git(work, 'diff', '--name-status', 'HEAD~1', 'HEAD').splitlines()
+    # Files outside the cone stay in the commit untouched, not deleted
+    assert changed == ['A\tagent/notes.md', 'M\tsrc/lib/util.py']
+    assert sorted(git(work, 'ls-files').splitlines()) == sorted([*FILES, 'agent/notes.md'])
+
+def test_resolve_clone_strategy_precedence(monkeypatch):
+    monkeypatch.setenv('CLONE_STRATEGY', 'blobless')
+    monkeypatch.setenv('CLONE_STRATEGY_REPOS', 'octo/big=sparse, octo/tiny = shallow')
+    job = {'owner': 'Octo', 'repo': 'Big'}
+    assert resolve_clone_strategy(job) == 'sparse'
+    assert resolve_clone_strategy({**job, 'clone_strategy': 'full'}) == 'full'
+    assert resolve_clone_strategy({'owner': 'octo', 'repo': 'tiny'}) == 'shallow'
+    assert resolve_clone_strategy({'owner': 'octo', 'repo': 'other', 'git_plan': {'clone_strategy': 'sparse'}}) == 'sparse'
+    assert resolve_clone_strategy({'owner': 'octo', 'repo': 'other'}) == 'blobless'
+    assert resolve_clone_strategy({'owner': 'octo', 'repo': 'other', 'clone_strategy': 'bogus'}) == 'full'
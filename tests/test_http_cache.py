@@ -0,0 +1,50 @@
+import os
+
+from worker.http_cache import ResponseCache
+
+def test_validators_and_scope_isolation(tmp_path):
+    cache = ResponseCache(max_bytes=1024, disk_dir='')
+    cache.put('installation:1', '/repos/o/r', '"v1"', 'Mon, 01 Jan 2024 00:00:00 GMT', b'{"a": 1}')
+    entry = cache.get('installation:1', '/repos/o/r')
+    assert entry.conditional_headers() == {'If-None-Match': '"v1"',
+                                           'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert entry.json() == {'a': 1}
+    # Another token may see a different answer for the same URL
+    assert cache.get('installation:2', '/repos/o/r') is None
+    # Responses without a validator can't be revalidated, so they aren't kept
+    cache.put('installation:1', '/repos/o/x', None, None, b'{}')
+    assert cache.get('installation:1', '/repos/o/x') is None
+
+def test_memory_tier_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=10, disk_dir='')
+    for url in ('/a', '/b', '/c'):
+        cache.put('s', url, url, None, b'12345')
+    assert cache.get('s', '/a') is None
+    assert cache.get('s', '/c').body == b'12345'
+    assert cache.stats['evicted'] == 1
+
+def test_disk_tier_survives_restart_and_prunes(tmp_path):
+    directory = str(tmp_path / 'cache')
+    ResponseCache(max_bytes=1024, disk_dir=directory).put('s', '/a', '"e"', None, '{"name": "ü"}'.encode())
+    entry = ResponseCache(max_bytes=1024, disk_dir=directory).get('s', '/a')
+    assert (entry.etag, entry.json()) == ('"e"', {'name': 'ü'})
+
+    cache = ResponseCache(max_bytes=1024, disk_dir=directory, disk_max_bytes=1)
+    cache.prune_disk()
+    assert not any(files for _, _, files in os.walk(directory))
+
+def test_memoize_computes_once():
+    cache = ResponseCache(max_bytes=1024, disk_dir='', memo_entries=1)
+    calls = []
+
+    def decode(value):
+        def compute():
+            calls.append(value)
+            return value.upper()
+        return compute
+
+    assert cache.memoize('sha1', decode('a')) == 'A'
+    assert cache.memoize('sha1', decode('a')) == 'A'
+    cache.memoize('sha2', decode('b'))
+    cache.memoize('sha1', decode('a'))
+    assert calls == ['a', 'b', 'a']
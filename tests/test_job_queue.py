@@ -0,0 +1,147 @@
+import time
+import asyncio
+
+import pytest
+
+from worker import job_queue
+from worker.job_queue import JobConsumer, RedisJobQueue
+
+def _queue(**kwargs):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    queue = RedisJobQueue(redis_url='redis://localhost:1/0', queue_name='test', prefix='test',
+                          visibility_timeout=30, max_attempts=2, retry_backoff=1, **kwargs)
+    queue._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    queue._enqueue = queue._redis.register_script(job_queue._ENQUEUE_SCRIPT)
+    queue._release = queue._redis.register_script(job_queue._RELEASE_SCRIPT)
+    queue._reserve = queue._redis.register_script(job_queue._RESERVE_SCRIPT)
+    queue._requeue_due = queue._redis.register_script(job_queue._REQUEUE_DUE_SCRIPT)
+    return queue
+
+def job(job_id):
+    return {'job_id': job_id, 'owner': 'octo', 'repo': 'hello'}
+
+def test_fifo_reserve_and_ack():
+    queue = _queue()
+
+    async def scenario():
+        for job_id in ('a', 'b'):
+            assert await queue.enqueue(job(job_id))
+        first = await queue.reserve()
+        assert (first['job']['job_id'], first['attempts']) == ('a', 1)
+        assert await queue.depth() == {'pending': 1, 'processing': 1, 'delayed': 0, 'dead': 0}
+        await queue.ack(first)
+        assert (await queue.reserve())['job']['job_id'] == 'b'
+        assert await queue.reserve() is None
+        assert not await queue._redis.hexists(queue._key('jobs'), 'a')
+
+    asyncio.run(scenario())
+
+def test_admission_limits_and_release():
+    queue = _queue()
+    limits = {'repo:octo/hello': 1, 'installation:1': 5}
+
+    async def scenario():
+        assert await queue.try_enqueue(job('a'), limits=limits) is None
+        assert await queue.try_enqueue(job('b'), limits=limits) == 'repo_limit'
+        assert await queue.try_enqueue(job('c'), max_pending=1) == 'queue_full'
+        envelope = await queue.reserve()
+        await queue.ack(envelope)
+        # Counters that reach zero are dropped, so the repo admits again
+        assert await queue._redis.hgetall(queue._key('inflight')) == {}
+        assert await queue.try_enqueue(job('b'), limits=limits) is None
+
+    asyncio.run(scenario())
+
+def test_retry_then_bury_after_max_attempts():
+    queue = _queue()
+
+    async def scenario():
+        await queue.try_enqueue(job('a'), limits={'repo:octo/hello': 1})
+        envelope = await queue.reserve()
+        await queue.retry(envelope, 'boom')
+        assert (await queue.depth())['delayed'] == 1
+        assert await queue.requeue_due() == 0  # backoff not over yet
+
+        await queue._redis.zadd(queue._key('delayed'), {'a': time.time() - 1})
+        assert await queue.requeue_due() == 1
+        envelope = await queue.reserve()
+        assert (envelope['attempts'], envelope['last_error']) == (2, 'boom')
+        await queue.retry(envelope, 'boom again')
+        assert await queue.depth() == {'pending': 0, 'processing': 0, 'delayed': 0, 'dead': 1}
+        assert await queue._redis.hgetall(queue._key('inflight')) == {}
+
+    asyncio.run(scenario())
+
+def test_expired_visibility_requeued():
+    queue = _queue()
+
+    async def scenario():
+        await queue.enqueue(job('a'))
+        await queue.reserve()
+        # The worker died: its heartbeat stopped extending the deadline
+        await queue._redis.zadd(queue._key('processing'), {'a': time.time() - 1})
+        assert not await queue.extend('missing')
+        assert await queue.requeue_due() == 1
+        envelope = await queue.reserve()
+        assert (envelope['job']['job_id'], envelope['attempts']) == ('a', 2)
+
+    asyncio.run(scenario())
+
+def test_consumer_never_retries_finished_job_when_ack_fails():
+    queue = _queue()
+    handled = []
+
+    retried = []
+
+    async def failing_ack(envelope):
+        raise ConnectionError('redis hiccup')
+
+    async def retry(envelope, error):
+        retried.append(envelope['job']['job_id'])
+
+    async def scenario():
+        for job_id in ('a', 'b'):
+            await queue.enqueue(job(job_id))
+        queue.ack, queue.retry = failing_ack, retry
+        consumer = JobConsumer(queue, None, concurrency=1, poll_interval=0.01, reap_interval=60)
+        consumer.ack_retry_delay = 0
+
+        async def handler(j):
+            handled.append(j['job_id'])
+            if len(handled) == 2:
+                consumer.stop()
+            return True
+
+        consumer.handler = handler
+        await asyncio.wait_for(consumer.run(), 5)
+
+    asyncio.run(scenario())
+    # Both jobs ran once: the failed ack neither retried 'a' nor stopped the consumer
+    assert handled == ['a', 'b']
+    assert retried == []
+
+def test_consumer_survives_failed_retry():
+    queue = _queue()
+    handled = []
+
+    async def failing_retry(envelope, error):
+        raise ConnectionError('redis hiccup')
+
+    async def scenario():
+        for job_id in ('a', 'b'):
+            await queue.enqueue(job(job_id))
+        queue.retry = failing_retry
+        consumer = JobConsumer(queue, None, concurrency=1, poll_interval=0.01, reap_interval=60)
+
+        async def handler(j):
+            handled.append(j['job_id'])
+            if len(handled) == 2:
+                consumer.stop()
+            raise RuntimeError('job failed')
+
+        consumer.handler = handler
+        await asyncio.wait_for(consumer.run(), 5)
+
+    asyncio.run(scenario())
+    assert handled == ['a', 'b']
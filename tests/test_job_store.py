@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from worker.job_store import JobStore, MemoryJobStore, RedisJobStore
+
+JOB = {'job_id': 'job-1', 'owner': 'octo', 'repo': 'Hello', 'issue_number': 7, 'issue_body': 'secret'}
+
+def test_memory_store_record_and_events():
+    async def scenario():
+        store = JobStore(MemoryJobStore(max_jobs=10, max_events=50))
+        await store.emit(JOB, 'started')
+        await store.emit(JOB, 'queued')  # late gateway write must not roll the status back
+        await store.emit(JOB, 'stage_started', stage='locate')
+        await store.emit(JOB, 'stage_completed', stage='locate', duration=1.5)
+        await store.emit(JOB, 'completed', duration=3.0)
+
+        record = await store.get('job-1')
+        assert record['status'] == 'succeeded'
+        assert record['stages']['locate'] == {'status': 'completed', 'started_at': record['stages']['locate']['started_at'],
+                                              'duration': 1.5}
+        assert 'issue_body' not in record
+        events = await store.read_events('job-1')
+        assert [e['type'] for _, e in events] == ['started', 'stage_started', 'stage_completed', 'completed']
+        assert await store.read_events('job-1', after=events[-1][0]) == []
+        assert [r['job_id'] for r in await store.list('OCTO/hello')] == ['job-1']
+
+    asyncio.run(scenario())
+
+def test_memory_store_blocking_read_wakes_on_event():
+    async def scenario():
+        store = JobStore(MemoryJobStore(max_jobs=10, max_events=50))
+        reader = asyncio.create_task(store.read_events('job-1', block=5))
+        await asyncio.sleep(0)
+        await store.emit(JOB, 'started')
+        events = await asyncio.wait_for(reader, 1)
+        assert [e['type'] for _, e in events] == ['started']
+
+    asyncio.run(scenario())
+
+def _redis_store():
+    fakeredis = pytest.importorskip('fakeredis')
+    store = RedisJobStore(ttl=60, max_events=100, prefix='test')
+    store._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    return store
+
+def test_redis_store_concurrent_writes_are_not_lost():
+    store = _redis_store()
+
+    async def scenario():
+        # Gateway and worker writing at the same time: every stage must survive
+        await asyncio.gather(
+            store.append(JOB, {'type': 'queued', 'at': 1.0}),
+            store.append(JOB, {'type': 'started', 'at': 1.1}),
+            *(store.append(JOB, {'type': 'stage_completed', 'stage': f's{i}', 'at': 2.0 + i, 'duration': i})
+              for i in range(10))
+        )
+        record = await store.get('job-1')
+        assert record['status'] == 'running'
+        assert sorted(record['stages']) == [f's{i}' for i in range(10)]
+        types = [e['type'] for _, e in await store.read_events('job-1', None, 0)]
+        assert types.count('stage_completed') == 10 and 'started' in types
+        assert [r['job_id'] for r in await store.list('octo/hello', 10)] == ['job-1']
+        await store.close()
+
+    asyncio.run(scenario())
+
+def test_redis_store_queued_after_started_is_dropped():
+    store = _redis_store()
+
+    async def scenario():
+        await store.append(JOB, {'type': 'started', 'at': 1.0})
+        await store.append(JOB, {'type': 'queued', 'at': 0.5})
+        record = await store.get('job-1')
+        assert record['status'] == 'running'
+        assert [e['type'] for _, e in await store.read_events('job-1', None, 0)] == ['started']
+        await store.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from conftest import PROJECT_ROOT
+from worker.metrics import endpoint_template, parse_transfer_bytes, render_latest
+
+def test_endpoint_template():
+    assert endpoint_template('/repos/octo/hello/issues/12/comments?page=2') == '/repos/{owner}/{repo}/issues/{n}/comments'
+    assert endpoint_template('repos/octo/hello/contents/src/app.py') == '/repos/{owner}/{repo}/contents/{path}'
+    assert endpoint_template('/app/installations/987/access_tokens') == '/app/installations/{id}/access_tokens'
+
+def test_parse_transfer_bytes():
+    progress = ("Receiving objects:  42% (5/12)\r"
+                "Receiving objects: 100% (12/12), 1.50 KiB | 1.50 MiB/s, done.\n")
+    assert parse_transfer_bytes(progress) == 1536
+    assert parse_transfer_bytes('Everything up-to-date') == 0
+
+def test_render_latest():
+    payload, content_type = render_latest()
+    assert isinstance(payload, bytes) and content_type.startswith('text/plain')
+
+def test_gateway_and_worker_share_worker_modules():
+    """The gateway imports worker modules under their package names only - one metrics registry per process"""
+    for module in ('fastapi', 'aiohttp', 'httpx', 'jwt', 'requests'):
+        pytest.importorskip(module)
+    script = (
+        "import sys\n"
+        "import app, task_queue, github_api\n"
+        "import worker.main, worker.metrics\n"
+        "flat = {'metrics', 'job_store', 'job_queue', 'github_app_auth', 'token_store', 'repo_profiles'}\n"
+        "assert not flat & set(sys.modules), flat & set(sys.modules)\n"
+        "assert task_queue.QUEUE_WAIT is worker.metrics.QUEUE_WAIT\n"
+        "assert app.get_job_store is worker.main.get_job_store\n"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.join(PROJECT_ROOT, 'gateway'),
+                            env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import subprocess
+
+import pytest
+
+from worker.mirror_cache import MirrorCache
+
+def git(cwd, *args):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def upstream(tmp_path):
+    repo = tmp_path / 'upstream'
+    git(tmp_path, 'init', '-q', '-b', 'main', str(repo))
+    git(repo, 'commit', '-q', '--allow-empty', '-m', 'first')
+    return repo
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('MIRROR_REFRESH_SECONDS', '3600')
+    return MirrorCache(root=str(tmp_path / 'mirrors'), max_bytes=1024 ** 3)
+
+def test_mirror_created_once_and_borrowed_by_clones(cache, upstream, tmp_path):
+    url = f"file://{upstream}"
+
+    async def scenario():
+        first = await cache.acquire(url)
+        second = await cache.acquire(url)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    try:
+        assert first.path == os.path.join(cache.root, 'local', str(upstream).strip('/') + '.git')
+        assert first.fetch_seconds is not None
+        assert second.fetch_seconds is None  # fetched within MIRROR_REFRESH_SECONDS
+        assert git(first.path, 'rev-parse', 'main') == git(upstream, 'rev-parse', 'HEAD')
+        # The token-carrying URL is never kept in the mirror's config
+        assert 'remote' not in git(first.path, 'config', '--list')
+
+        clone = tmp_path / 'clone'
+        git(tmp_path, 'clone', '-q', '--reference', first.path, url, str(clone))
+        assert (clone / '.git' / 'objects' / 'info' / 'alternates').read_text().strip() == \
+            os.path.join(first.path, 'objects')
+    finally:
+        first.release()
+        second.release()
+
+def test_evict_skips_mirrors_in_use(cache, upstream, tmp_path):
+    other = tmp_path / 'other'
+    git(tmp_path, 'clone', '-q', str(upstream), str(other))
+
+    async def scenario():
+        leased = await cache.acquire(f"file://{upstream}")
+        idle = await cache.acquire(f"file://{other}")
+        idle.release()
+        return leased, idle
+
+    leased, idle = asyncio.run(scenario())
+    try:
+        cache.max_bytes = 1
+        assert cache.evict() == 1
+        assert os.path.exists(leased.path) and not os.path.exists(idle.path)
+    finally:
+        leased.release()
+
+def test_fetches_stay_packed_and_mirror_repacked_when_not_in_use(cache, upstream, monkeypatch):
+    url = f"file://{upstream}"
+    cache.refresh_seconds = 0
+    cache.repack_packs = 100
+
+    async def fetch_new_commit(i):
+        (upstream / f"file{i}.txt").write_text(f"{i}\n")
+        git(upstream, 'add', '.')
+        git(upstream, 'commit', '-q', '-m', f"commit {i}")
+        lease = await cache.acquire(url)
+        lease.release()
+        return lease.path
+
+    async def scenario():
+        for i in range(3):
+            mirror = await fetch_new_commit(i)
+        counts = cache._count_objects(mirror)
+        assert counts['count'] == 0  # nothing loose
+        assert cache._size_info(mirror)['packs'] == 3
+
+        # Borrowed by a job clone: left alone
+        held = await cache.acquire(url)
+        cache.repack_packs = 3
+        cache._maintain(mirror)
+        assert cache._size_info(mirror)['packs'] == 3
+        held.release()
+
+        await fetch_new_commit(3)
+        return mirror
+
+    mirror = asyncio.run(scenario())
+    info = cache._size_info(mirror)
+    # Repacked before the lease, then one more pack from its fetch
+    assert info['packs'] == 2
+    assert info['bytes'] > 0
+    assert git(mirror, 'rev-parse', 'main') == git(upstream, 'rev-parse', 'HEAD')
+
+def test_eviction_uses_recorded_sizes(cache, upstream, monkeypatch):
+    async def scenario():
+        lease = await cache.acquire(f"file://{upstream}")
+        lease.release()
+        return lease.path
+
+    mirror = asyncio.run(scenario())
+    assert os.path.exists(f"{mirror}.size")
+    # Sizes come from the .size file, not from git or a walk of the mirror
+    monkeypatch.setattr(cache, '_count_objects', None)
+    cache.max_bytes = 1
+    assert cache.evict() == 1
+    assert not os.path.exists(mirror) and not os.path.exists(f"{mirror}.size")
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from outbox import Outbox
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setenv('OUTBOX_CONCURRENCY', '2')
+    monkeypatch.setenv('OUTBOX_MAX_ATTEMPTS', '3')
+    monkeypatch.setenv('OUTBOX_MAX_PENDING', '4')
+    monkeypatch.setenv('OUTBOX_RETRY_DELAY', '0')
+    return Outbox()
+
+def test_lane_order_kept_across_retries(outbox):
+    sent = []
+
+    def sender(name, failures=0):
+        attempts = {'left': failures}
+
+        async def send():
+            if attempts['left']:
+                attempts['left'] -= 1
+                raise ConnectionError('github down')
+            sent.append(name)
+            return True
+        return send
+
+    async def scenario():
+        outbox.submit('octo/hello#1', 'first', sender('first', failures=2))
+        outbox.submit('octo/hello#1', 'second', sender('second'))
+        await outbox.close()
+
+    asyncio.run(scenario())
+    assert sent == ['first', 'second']
+    stats = outbox.stats()
+    assert (stats['delivered'], stats['retries'], stats['pending'], stats['lanes']) == (2, 2, 0, 0)
+
+def test_gives_up_after_max_attempts(outbox):
+    calls = []
+
+    async def send():
+        calls.append(1)
+        return False
+
+    async def scenario():
+        outbox.submit('lane', 'comment', send)
+        await outbox.close()
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+    assert outbox.stats()['failed'] == 1
+
+def test_full_backlog_drops_and_concurrency_capped(outbox):
+    running, peak = [], []
+
+    async def send():
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return True
+
+    async def scenario():
+        accepted = [outbox.submit(f"lane{i}", 'comment', send) for i in range(5)]
+        assert accepted == [True] * 4 + [False]
+        await outbox.close()
+
+    asyncio.run(scenario())
+    assert max(peak) == 2
+    assert (outbox.counters['delivered'], outbox.counters['dropped']) == (4, 1)
+
+def test_dry_run_never_sends(outbox):
+    outbox.dry_run = True
+
+    async def send():
+        raise AssertionError('sent in dry run')
+
+    async def scenario():
+        outbox.submit('lane', 'comment', send)
+        await outbox.close()
+
+    asyncio.run(scenario())
+    assert outbox.counters['delivered'] == 1
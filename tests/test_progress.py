@@ -0,0 +1,75 @@
+import asyncio
+
+from worker.progress import ProgressReporter
+
+JOB = {'job_id': 'job-1', 'owner': 'octo', 'repo': 'hello', 'issue_number': 7, 'actor': 'alice',
+       'pr_number': 12, 'pr_node_id': 'PR_1', 'created_at': '2024-01-02T03:04:05Z'}
+
+class FakeAPI:
+    def __init__(self):
+        self.batches = []
+
+    async def batch_update(self, owner, repo, operations):
+        self.batches.append([op['op'] for op in operations])
+        return [{'id': 99, 'node_id': 'C_99'} if op['op'] == 'comment' else {'ok': True} for op in operations]
+
+def test_updates_within_debounce_coalesced_and_flushed_on_close():
+    api = FakeAPI()
+    reporter = ProgressReporter(api, dict(JOB), debounce=60)
+
+    async def scenario():
+        reporter.stage_completed('locate', 'found it')
+        await asyncio.sleep(0.01)
+        reporter.stage_completed('propose', 'plan')
+        reporter.stage_completed('fix', 'patched')
+        assert len(api.batches) == 1  # the rest waits for the debounce window
+        reporter.finish('done')
+        results = await reporter.close([{'op': 'ready'}])
+        assert results == [{'ok': True}]
+
+    asyncio.run(scenario())
+    assert api.batches == [['update_body', 'comment'], ['update_body', 'update_comment', 'ready']]
+    assert reporter.writes == 4
+    assert reporter._comment_id == 99
+
+def test_unchanged_state_not_rewritten():
+    api = FakeAPI()
+    reporter = ProgressReporter(api, dict(JOB), debounce=0)
+    reporter.mark_sent(reporter.render_body())
+
+    async def scenario():
+        assert await reporter.close() == []
+        reporter.stage_completed('locate')
+        await reporter.close()
+        await reporter.close()
+
+    asyncio.run(scenario())
+    assert api.batches == [['update_body']]
+
+def test_no_pr_yet_sends_nothing():
+    api = FakeAPI()
+    job = dict(JOB)
+    del job['pr_number']
+    reporter = ProgressReporter(api, job, debounce=0)
+    assert asyncio.run(reporter.close([{'op': 'ready'}])) == [None]
+    assert api.batches == []
+
+def test_failed_batch_retried_by_next_flush():
+    class FlakyAPI(FakeAPI):
+        async def batch_update(self, owner, repo, operations):
+            if not self.batches:
+                self.batches.append('error')
+                raise ConnectionError('github down')
+            return await super().batch_update(owner, repo, operations)
+
+    api = FlakyAPI()
+    reporter = ProgressReporter(api, dict(JOB), debounce=0)
+
+    async def scenario():
+        reporter.stage_completed('locate', 'found it')
+        await reporter.close()
+        # Nothing was marked sent, so the next flush sends it all again
+        await reporter.close()
+
+    asyncio.run(scenario())
+    assert api.batches == ['error', ['update_body', 'comment']]
@@ -0,0 +1,79 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from worker import gitops as gitops_module
+from worker.gitops import GitOps
+
+BRANCH = 'agent/fix-1'
+
+def git(cwd, *args):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+@pytest.fixture
+def workspace(tmp_path):
+    remote, repo = tmp_path / 'remote.git', tmp_path / 'work'
+    git(tmp_path, 'init', '--bare', '-q', str(remote))
+    git(tmp_path, 'init', '-q', str(repo))
+    git(repo, 'remote', 'add', 'origin', str(remote))
+    git(repo, 'checkout', '-q', '-b', BRANCH)
+    return remote, repo
+
+@pytest.fixture
+def make_gitops(monkeypatch):
+    def make(policy=None, interval='60'):
+        if policy is None:
+            monkeypatch.delenv('GIT_PUSH_POLICY', raising=False)
+        else:
+            monkeypatch.setenv('GIT_PUSH_POLICY', policy)
+        monkeypatch.setenv('GIT_PUSH_INTERVAL', interval)
+        ops = GitOps()
+        ops.pushes = 0
+        push = ops.push
+
+        async def counting_push(repo_path, branch_name, force=False):
+            ops.pushes += 1
+            return await push(repo_path, branch_name, force)
+
+        ops.push = counting_push
+        return ops
+    return make
+
+def run_stages(ops, remote, repo, stages=3):
+    """Commit and request a push per stage, then flush; (pushes by stages, pushes in all)"""
+    async def scenario():
+        for stage in range(stages):
+            git(repo, 'commit', '-q', '--allow-empty', '-m', f"stage {stage}")
+            assert await ops.request_push(str(repo), BRANCH)
+        pushed_by_stages = ops.pushes
+        assert await ops.flush_push(str(repo), BRANCH)
+        return pushed_by_stages, ops.pushes
+
+    result = asyncio.run(scenario())
+    # Whatever the policy, the remote has every commit once flushed
+    assert git(remote, 'rev-parse', BRANCH) == git(repo, 'rev-parse', 'HEAD')
+    return result
+
+@pytest.mark.parametrize('value', [None, 'bogus'])
+def test_default_and_unknown_policy_are_immediate(make_gitops, value):
+    assert gitops_module.DEFAULT_PUSH_POLICY == 'immediate'
+    assert make_gitops(value).push_policy == 'immediate'
+
+def test_immediate_pushes_every_stage(make_gitops, workspace):
+    assert run_stages(make_gitops('immediate'), *workspace) == (3, 3)
+
+def test_coalesced_defers_within_interval(make_gitops, workspace):
+    assert run_stages(make_gitops('coalesced', interval='3600'), *workspace) == (1, 2)
+
+def test_coalesced_pushes_after_interval(make_gitops, workspace):
+    assert run_stages(make_gitops('coalesced', interval='0'), *workspace) == (3, 3)
+
+def test_final_pushes_once_on_flush(make_gitops, workspace):
+    assert run_stages(make_gitops('final'), *workspace) == (0, 1)
+
+def test_flush_without_pending_commits_is_noop(make_gitops, workspace):
+    ops = make_gitops('final')
+    assert asyncio.run(ops.flush_push(str(workspace[1]), BRANCH))
+    assert ops.pushes == 0
@@ -0,0 +1,92 @@
+import time
+import asyncio
+
+import pytest
+
+from worker.rate_limit import (
+    LocalBudgetBackend, RedisBudgetBackend, RateLimitScheduler, RateLimitExceeded,
+    _RESERVE_SCRIPT, _OBSERVE_SCRIPT
+)
+
+def _redis_backend(write_rate, write_burst, reserve):
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    backend = RedisBudgetBackend(write_rate, write_burst, reserve, redis_url='redis://localhost:1/0', prefix='test')
+    backend._redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    backend._reserve = backend._redis.register_script(_RESERVE_SCRIPT)
+    backend._observe = backend._redis.register_script(_OBSERVE_SCRIPT)
+    return backend
+
+@pytest.fixture(params=['local', 'redis'])
+def backend(request):
+    if request.param == 'local':
+        return LocalBudgetBackend(write_rate=1.0, write_burst=2, reserve=5)
+    return _redis_backend(1.0, 2, 5)
+
+def test_write_burst_then_paced(backend):
+    async def scenario():
+        assert await backend.reserve('s', True) == 0
+        assert await backend.reserve('s', True) == 0
+        delay = await backend.reserve('s', True)
+        assert 0 < delay <= 1.0
+        # Reads are not paced
+        assert await backend.reserve('s', False) == 0
+
+    asyncio.run(scenario())
+
+def test_reserve_floor_holds_writes_back(backend):
+    async def scenario():
+        await backend.observe('s', remaining=5, reset_at=time.time() + 30, blocked_until=None)
+        assert await backend.reserve('s', False) == 0
+        assert 25 < await backend.reserve('s', True) <= 30
+
+    asyncio.run(scenario())
+
+def test_update_blocks_scope_after_rate_limit(backend):
+    scheduler = RateLimitScheduler(backend)
+    scheduler.max_wait = 5
+
+    async def scenario():
+        wait = await scheduler.update('s', 403, {'X-RateLimit-Remaining': '0',
+                                                  'X-RateLimit-Reset': str(int(time.time()) + 60)})
+        assert 55 < wait <= 60
+        assert await scheduler.update('t', 200, {'X-RateLimit-Remaining': '4000'}) is None
+        with pytest.raises(RateLimitExceeded):
+            await scheduler.acquire_async('s', 'GET')
+        await scheduler.acquire_async('t', 'GET')
+
+    asyncio.run(scenario())
+
+def test_acquire_async_yields_to_the_event_loop():
+    scheduler = RateLimitScheduler(LocalBudgetBackend(write_rate=20.0, write_burst=1, reserve=0))
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        task = asyncio.create_task(ticker())
+        for _ in range(3):
+            await scheduler.acquire_async('s', 'POST')  # ~50ms apart after the first
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert len(ticks) >= 10
+
+def test_backend_errors_do_not_stop_requests():
+    class Broken:
+        async def reserve(self, scope, write):
+            raise ConnectionError('redis down')
+
+        async def observe(self, *args):
+            raise ConnectionError('redis down')
+
+    scheduler = RateLimitScheduler(Broken())
+
+    async def scenario():
+        await scheduler.acquire_async('s', 'POST')
+        assert await scheduler.update('s', 200, {}) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,67 @@
+import pytest
+
+from worker.repo_profiles import (
+    FileRepoProfileStore, MemoryRepoProfileStore, RedisRepoProfileStore, merge_observation, plan_job
+)
+
+MB = 1024 ** 2
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    for name, value in {'GIT_CLONE_TIMEOUT': '120', 'GIT_PUSH_TIMEOUT': '60', 'MIRROR_FETCH_TIMEOUT': '1800',
+                        'GIT_MIN_THROUGHPUT': str(2 * MB), 'GIT_MAX_TIMEOUT': '3600',
+                        'REPO_BLOBLESS_BYTES': str(200 * MB), 'REPO_SPARSE_BYTES': str(1024 * MB),
+                        'REPO_SPARSE_FILES': '50000', 'REPO_LARGE_BYTES': str(2048 * MB),
+                        'REPO_LARGE_QUEUE': 'large'}.items():
+        monkeypatch.setenv(name, value)
+
+def test_unknown_repository_gets_defaults():
+    assert plan_job(None) == {'clone_strategy': None, 'clone_timeout': 120.0, 'fetch_timeout': 1800.0,
+                              'push_timeout': 60.0, 'queue': None}
+
+@pytest.mark.parametrize('profile, strategy, queue', [
+    ({'pack_bytes': 10 * MB}, 'full', None),
+    ({'pack_bytes': 300 * MB}, 'blobless', None),
+    ({'pack_bytes': 10 * MB, 'file_count': 80000}, 'sparse', None),
+    ({'pack_bytes': 3000 * MB}, 'sparse', 'large'),
+])
+def test_strategy_and_queue_follow_size(profile, strategy, queue):
+    plan = plan_job(profile)
+    assert (plan['clone_strategy'], plan['queue']) == (strategy, queue)
+
+def test_clone_timeout_escalates_strategy_and_timeout():
+    profile = merge_observation(None, {'pack_bytes': 10 * MB, 'clone_strategy': 'full', 'clone_seconds': 50,
+                                       'timeouts': ['clone']})
+    plan = plan_job(profile)
+    assert plan['clone_strategy'] == 'blobless'
+    assert plan['clone_timeout'] == 300.0  # 3x the observed 50s, doubled after the timeout
+
+def test_timeout_sized_from_pack_and_capped():
+    assert plan_job({'pack_bytes': 600 * MB})['clone_timeout'] == 300.0
+    assert plan_job({'pack_bytes': 100000 * MB})['clone_timeout'] == 3600.0
+
+def test_merge_observation_ewma_and_job_count():
+    profile = merge_observation(None, {'push_seconds': 10})
+    profile = merge_observation(profile, {'push_seconds': 20, 'timeouts': ['push']})
+    assert profile['push_seconds'] == 13.0
+    assert profile['jobs'] == 2
+    assert [t['op'] for t in profile['timeouts']] == ['push']
+
+@pytest.fixture(params=['memory', 'file', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepoProfileStore(max_entries=2)
+    if request.param == 'file':
+        return FileRepoProfileStore(str(tmp_path / 'profiles.json'), max_entries=2)
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # redis.lock runs Lua scripts
+    store = RedisRepoProfileStore(prefix='test')
+    store._redis = fakeredis.FakeRedis(decode_responses=True)
+    return store
+
+def test_store_records_and_merges(store):
+    assert store.get('octo/hello') is None
+    store.record('octo/hello', {'pack_bytes': MB, 'clone_seconds': 4})
+    profile = store.record('octo/hello', {'clone_seconds': 14})
+    assert store.get('octo/hello') == profile
+    assert (profile['pack_bytes'], profile['clone_seconds'], profile['jobs']) == (MB, 7.0, 2)
@@ -0,0 +1,143 @@
+import sys
+import time
+import signal
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+import run
+import start_local
+
+@pytest.fixture
+def production(monkeypatch):
+    monkeypatch.delenv('ENVIRONMENT', raising=False)
+    monkeypatch.setenv('APP_ENV', 'production')
+
+def test_reload_refused_in_production(production, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['run.py', '--reload'])
+    monkeypatch.setattr(run, 'Master', lambda *args: pytest.fail('master started'))
+    uvicorn = pytest.importorskip('uvicorn')
+    monkeypatch.setattr(uvicorn, 'run', lambda *args, **kwargs: pytest.fail('reloader started'))
+    with pytest.raises(SystemExit) as info:
+        run.main()
+    assert info.value.code == 1
+
+def test_start_local_refused_in_production(production, monkeypatch):
+    monkeypatch.setattr(start_local.os, 'execvp', lambda *args: pytest.fail('uvicorn started'))
+    with pytest.raises(SystemExit) as info:
+        start_local.start_server()
+    assert info.value.code == 1
+
+@pytest.mark.parametrize('env, expected', [
+    ({}, False), ({'APP_ENV': 'Prod'}, True), ({'ENVIRONMENT': 'production'}, True),
+    ({'APP_ENV': 'staging', 'ENVIRONMENT': 'production'}, False),
+])
+def test_is_production(monkeypatch, env, expected):
+    for name in ('APP_ENV', 'ENVIRONMENT'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    assert run.is_production() is start_local.is_production() is expected
+
+class StubEvent:
+    def set(self):
+        pass
+
+    def wait(self, timeout=None):
+        return True
+
+class StubProcess:
+    """Stands in for a uvicorn worker process; drains on terminate unless stubborn"""
+
+    pids = itertools.count(100)
+
+    def __init__(self, log, target=None, args=(), daemon=None):
+        self.log = log
+        self.pid = None
+        self.exitcode = None
+        self.alive = False
+        self.stubborn = False
+
+    def start(self):
+        self.pid = next(self.pids)
+        self.alive = True
+        self.log.append(('start', self.pid))
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.log.append(('terminate', self.pid))
+        if not self.stubborn:
+            self.alive, self.exitcode = False, -signal.SIGTERM
+
+    def kill(self):
+        self.log.append(('kill', self.pid))
+        self.alive, self.exitcode = False, -signal.SIGKILL
+
+    def join(self, timeout=None):
+        pass
+
+    def crash(self):
+        self.alive, self.exitcode = False, 1
+
+@pytest.fixture
+def master(monkeypatch):
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    dead = []
+    monkeypatch.setattr(run, 'mark_process_dead', dead.append)
+    master = run.Master('127.0.0.1', 0, workers=2, graceful_timeout=1, reuse_port=True)
+    master.log, master.dead = [], dead
+    master.ctx = SimpleNamespace(Event=StubEvent,
+                                 Process=lambda **kwargs: StubProcess(master.log, **kwargs))
+    return master
+
+def test_stop_worker_drains_then_kills_stubborn_worker(master):
+    polite, stubborn = master.spawn(), master.spawn()
+    stubborn.stubborn = True
+    master.stop_worker(polite)
+    master.stop_worker(stubborn)
+    assert master.workers == []
+    assert master.log[2:] == [('terminate', polite.pid), ('terminate', stubborn.pid), ('kill', stubborn.pid)]
+    assert master.dead == [polite.pid, stubborn.pid]
+
+def test_rolling_restart_starts_replacement_before_stopping_old(master):
+    old = [master.spawn(), master.spawn()]
+    del master.log[:]
+    master.rolling_restart()
+    new = master.workers
+    assert len(new) == 2 and not set(new) & set(old)
+    assert master.log == [('start', new[0].pid), ('terminate', old[0].pid),
+                          ('start', new[1].pid), ('terminate', old[1].pid)]
+
+def test_run_respawns_reloads_and_drains(master, monkeypatch):
+    handlers = {}
+    monkeypatch.setattr(run.signal, 'signal', lambda signum, handler: handlers.__setitem__(signum, handler))
+    snapshots = []
+
+    def tick(seconds):
+        # One supervisor loop iteration has passed
+        snapshots.append(list(master.workers))
+        if len(snapshots) == 1:
+            master.workers[0].crash()
+        elif len(snapshots) == 2:
+            handlers[signal.SIGHUP](signal.SIGHUP, None)
+        elif len(snapshots) == 3:
+            master.workers[0].stubborn = True
+            handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+    monkeypatch.setattr(run, 'time', SimpleNamespace(time=time.time, sleep=tick))
+    master.run()
+
+    first, respawned, reloaded = snapshots
+    crashed = first[0]
+    assert respawned == [first[1], respawned[1]] and respawned[1] not in first
+    assert crashed.pid in master.dead  # its metric files are released
+    assert not set(reloaded) & set(respawned)
+    stubborn = reloaded[0]
+    # Drain: every worker got SIGTERM, the one that would not exit was killed
+    assert master.log[-3:] == [('terminate', stubborn.pid), ('terminate', reloaded[1].pid), ('kill', stubborn.pid)]
+    assert not any(process.is_alive() for process in reloaded)
@@ -0,0 +1,67 @@
+import time
+import threading
+
+import pytest
+
+from worker.token_store import FileTokenStore, MemoryTokenStore, RedisTokenStore, create_token_store
+
+@pytest.fixture(params=['memory', 'file', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryTokenStore(max_entries=3)
+    if request.param == 'file':
+        return FileTokenStore(str(tmp_path / 'tokens.json'), max_entries=3)
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # mint_lock is a redis lock, which runs Lua scripts
+    store = RedisTokenStore(prefix='test')
+    store._redis = fakeredis.FakeRedis(decode_responses=True)
+    return store
+
+def test_put_get_delete(store):
+    expires_at = time.time() + 3600
+    assert store.get(1) is None
+    store.put(1, 'ghs_a', expires_at)
+    assert store.get(1) == {'token': 'ghs_a', 'expires_at': expires_at}
+    store.delete(1)
+    assert store.get(1) is None
+
+def test_expired_and_excess_tokens_dropped(store):
+    if isinstance(store, RedisTokenStore):
+        pytest.skip('Redis expires keys with the token instead')
+    now = time.time()
+    store.put(1, 'expired', now - 1)
+    for installation_id in range(2, 6):
+        store.put(installation_id, f"ghs_{installation_id}", now + 3600 + installation_id)
+    assert store.get(1) is None
+    # The soonest-expiring token goes beyond max_entries
+    assert store.get(2) is None
+    assert [store.get(i)['token'] for i in range(3, 6)] == ['ghs_3', 'ghs_4', 'ghs_5']
+
+def test_mint_lock_serializes(store):
+    inside, overlaps = [], []
+
+    def mint():
+        with store.mint_lock(1):
+            if inside:
+                overlaps.append(True)
+            inside.append(True)
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=mint) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+def test_file_store_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    writer, reader = FileTokenStore(path), FileTokenStore(path)
+    writer.put(7, 'ghs_shared', time.time() + 3600)
+    assert reader.get(7)['token'] == 'ghs_shared'
+    writer.delete(7)
+    assert reader.get(7) is None
+
+def test_unknown_backend_falls_back_to_memory():
+    assert isinstance(create_token_store('nope'), MemoryTokenStore)
@@ -0,0 +1,37 @@
+from triggers import TriggerMatcher, BOT_STATUS_MARKERS, SCAN_CHUNK
+
+def test_trigger_command_and_args():
+    matcher = TriggerMatcher('mybot')
+    trigger, marker = matcher.scan('hi @MyBot   fix the login redirect\nmore text')
+    assert marker is None
+    assert (trigger.command, trigger.args) == ('fix', 'the login redirect')
+    assert matcher.scan('@mybot help')[0].command == 'help'
+    assert matcher.scan('thanks @mybot!')[0].command == 'mention'
+    assert matcher.scan('/agent fix it')[0].command == 'fix'
+    assert matcher.scan('@mybotx is another app') == (None, None)
+
+def test_trigger_across_chunk_boundaries():
+    matcher = TriggerMatcher('mybot')
+    for offset in range(SCAN_CHUNK - 8, SCAN_CHUNK + 8):
+        trigger, _ = matcher.scan('x' * offset + '@agent fix now')
+        assert trigger is not None and trigger.args == 'now', offset
+
+def test_first_trigger_wins():
+    matcher = TriggerMatcher('mybot')
+    trigger, _ = matcher.scan('@agentx /agent  fix first\n' + '.' * 5000 + '\n@mybot help')
+    assert (trigger.command, trigger.args) == ('fix', 'first')
+
+def test_scan_limit():
+    matcher = TriggerMatcher('mybot', scan_limit=100)
+    assert matcher.scan('x' * 100 + '@mybot fix') == (None, None)
+
+def test_marker_wins_over_trigger():
+    matcher = TriggerMatcher('mybot')
+    body = f"@mybot fix\n{BOT_STATUS_MARKERS[1]} 123"
+    assert matcher.scan(body, check_markers=True) == (None, BOT_STATUS_MARKERS[1])
+    assert matcher.scan(body)[0].command == 'fix'
+
+def test_length_changing_lowercase():
+    # 'İ'.lower() is two characters - positions fall back to a plain regex search
+    trigger, _ = TriggerMatcher('mybot').scan('İ' * 10 + ' /agent fix now')
+    assert trigger.args == 'now'
@@ -0,0 +1,77 @@
+import hmac
+import json
+import hashlib
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('httpx')
+from fastapi.testclient import TestClient
+
+import app as gateway_app
+
+SECRET = 'test-secret'
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('PLATFORM', 'github')
+    monkeypatch.setenv('WEBHOOK_SECRET', SECRET)
+    monkeypatch.setenv('TEST_MODE', 'false')
+    monkeypatch.setattr(gateway_app, 'MAX_WEBHOOK_BODY_BYTES', 4096)
+    # No lifespan: these requests never reach the queue or the API client
+    return TestClient(gateway_app.app)
+
+def sign(body: bytes, secret: str = SECRET) -> str:
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def comment_payload(text: str, action: str = 'created') -> bytes:
+    return json.dumps({
+        'action': action,
+        'comment': {'id': 1, 'body': text, 'user': {'login': 'alice'}},
+        'issue': {'number': 7, 'title': 'Bug', 'body': '', 'user': {'login': 'alice'}},
+        'repository': {'name': 'hello', 'full_name': 'octo/hello', 'owner': {'login': 'octo'},
+                       'clone_url': 'https://github.com/octo/hello.git', 'default_branch': 'main'},
+        'sender': {'login': 'alice'}
+    }).encode()
+
+def chunked(body: bytes, size: int = 100):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+def post(client, body, signature=None, content=None, **headers):
+    headers = {'X-GitHub-Event': 'issue_comment', 'X-GitHub-Delivery': 'd-1', **headers}
+    if signature:
+        headers['X-Hub-Signature-256'] = signature
+    return client.post('/api/webhook', content=content if content is not None else body, headers=headers)
+
+def test_valid_signature_over_streamed_body(client):
+    body = comment_payload('just a comment')
+    response = post(client, body, sign(body), content=chunked(body))
+    assert response.status_code == 200
+    assert response.json()['status'] == 'ignored'
+
+@pytest.mark.parametrize('signature', [None, 'sha256=' + '0' * 64, 'wrong-secret'])
+def test_bad_signature_rejected(client, signature):
+    body = comment_payload('just a comment')
+    if signature == 'wrong-secret':
+        signature = sign(body, 'other-secret')
+    assert post(client, body, signature, content=chunked(body)).status_code == 401
+
+def test_declared_oversized_body_rejected(client):
+    body = b'{"action": "created", "pad": "' + b'x' * 5000 + b'"}'
+    response = post(client, body, sign(body))
+    assert response.status_code == 413
+
+def test_chunked_body_over_limit_rejected(client):
+    body = b'{"action": "created", "pad": "' + b'x' * 5000 + b'"}'
+    response = post(client, body, sign(body), content=chunked(body, 1000))
+    assert response.status_code == 413
+
+def test_non_triggering_action_ignored_before_parsing(client):
+    # Not valid JSON past the action: a full parse would answer 400
+    body = b'{"action": "deleted", "comment": {'
+    response = post(client, body, sign(body))
+    assert response.status_code == 200
+    assert response.json() == {'status': 'ignored', 'reason': 'Not a triggering event'}
+    broken = b'{"action": "created", "comment": {'
+    assert post(client, broken, sign(broken)).status_code == 400
@@ -0,0 +1,26 @@
+import json
+import asyncio
+
+from webhook_recorder import WebhookRecorder
+
+def test_records_deliveries_without_signatures(tmp_path):
+    recorder = WebhookRecorder(str(tmp_path), max_files=2)
+    headers = {'X-GitHub-Event': 'issue_comment', 'X-Hub-Signature-256': 'sha256=abc', 'Content-Length': '2'}
+
+    async def scenario():
+        for _ in range(3):
+            await recorder.record('issue_comment', headers, '{"action": "créé"}'.encode())
+
+    asyncio.run(scenario())
+    files = sorted(tmp_path.iterdir())
+    assert len(files) == 2 and not recorder.enabled
+    entry = json.loads(files[0].read_text(encoding='utf-8'))
+    assert entry == {'headers': {'X-GitHub-Event': 'issue_comment'}, 'body': '{"action": "créé"}'}
+    assert '-issue_comment-' in files[0].name
+
+def test_disabled_without_directory(monkeypatch):
+    monkeypatch.delenv('WEBHOOK_RECORD_DIR', raising=False)
+    recorder = WebhookRecorder()
+    assert not recorder.enabled
+    asyncio.run(recorder.record('issues', {}, b'{}'))
+    assert recorder.recorded == 0
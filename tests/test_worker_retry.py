@@ -0,0 +1,76 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('httpx')
+
+from worker import main as worker_main
+from worker.job_queue import JobConsumer
+from worker.job_store import JobStore, MemoryJobStore
+
+def make_job(**extra):
+    job = {'job_id': 'job-1', 'owner': 'octo', 'repo': 'hello', 'issue_number': 7, 'branch': 'agent/fix-7',
+           'default_branch': 'main', 'issue_node_id': 'I_1'}
+    job.update(extra)
+    return job
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setenv('PLATFORM', 'github')
+    monkeypatch.setattr(worker_main, 'plan_for', lambda owner, repo: {'clone_timeout': 1, 'push_timeout': 1})
+    monkeypatch.setattr(worker_main, 'record_job', lambda owner, repo, observation: None)
+
+    agent = worker_main.AgentWorker()
+    agent.job_store = JobStore(MemoryJobStore(max_jobs=10, max_events=50))
+    agent.failures = []
+
+    async def initialize_repo(job, repo_path, observation):
+        observation['timeouts'].append('clone')
+        return False
+
+    async def handle_job_failure(job, error_msg):
+        agent.failures.append(error_msg)
+
+    agent._initialize_repo = initialize_repo
+    agent._handle_job_failure = handle_job_failure
+    return agent
+
+def test_clone_timeout_retried_while_attempts_left(worker):
+    async def scenario():
+        with pytest.raises(worker_main.RetryableJobError):
+            await worker.process_job(make_job(retries_left=1))
+        record = await worker.job_store.get('job-1')
+        assert record['status'] == 'running'  # the next attempt finishes the record
+        assert worker.failures == []
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize('extra', [{}, {'retries_left': 0}], ids=['local-queue', 'last-attempt'])
+def test_clone_timeout_fails_without_retry(worker, extra):
+    async def scenario():
+        assert await worker.process_job(make_job(**extra)) is False
+        record = await worker.job_store.get('job-1')
+        assert record['status'] == 'failed'
+        assert 'clone timed out' in record['error']
+        assert len(worker.failures) == 1
+
+    asyncio.run(scenario())
+
+def test_consumer_tells_handler_retries_left():
+    seen = []
+
+    async def handler(job):
+        seen.append(job['retries_left'])
+        return True
+
+    async def noop(*args):
+        pass
+
+    queue = SimpleNamespace(max_attempts=3, visibility_timeout=30, ack=noop, retry=noop, extend=noop)
+    consumer = JobConsumer(queue, handler)
+    for attempts in (1, 3):
+        envelope = {'job': make_job(), 'attempts': attempts, 'enqueued_at': time.time()}
+        asyncio.run(consumer._process(envelope))
+    assert seen == [2, 0]
@@ -0,0 +1,177 @@
+"""
+Blob reads straight from a workspace's object store
+
+Stages read the files they look at through `GitOps.blob_reader(repo_path)`
+instead of open() on the working tree, so a file doesn't have to be checked
+out to be read (sparse workspaces only check out what fix will write).
+
+Each workspace keeps two long-lived processes, started on first use:
+- `git cat-file --batch-check`: sha, type and size of <rev>:<path>
+- `git cat-file --batch`: the object contents
+
+In a partial (blobless / sparse) clone a missing blob is fetched from the
+promisor remote by cat-file itself, one blob at a time as the stages ask.
+
+Decoded contents are kept in a BlobCache shared by all workspaces of the
+worker, keyed by blob sha: a file unchanged between two jobs on the same
+repository is decoded once.
+"""
+
+import os
+import asyncio
+import logging
+import posixpath
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class BlobInfo(NamedTuple):
+    sha: str
+    type: str
+    size: int
+
+class BlobCache:
+    """LRU of decoded blob contents by sha, bounded by entries and total characters"""
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv('BLOB_CACHE_ENTRIES', '256'))
+        self.max_bytes = max_bytes or int(os.getenv('BLOB_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+    def get(self, sha: str) -> Optional[str]:
+        text = self._entries.get(sha)
+        if text is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(sha)
+        self.stats['hits'] += 1
+        return text
+
+    def put(self, sha: str, text: str):
+        if len(text) > self.max_bytes or sha in self._entries:
+            return
+        self._entries[sha] = text
+        self._size += len(text)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats['evicted'] += 1
+
+class BlobReader:
+    """cat-file --batch / --batch-check processes of one workspace"""
+
+    def __init__(self, repo_path: str, cache: Optional[BlobCache] = None, env: Optional[Dict[str, str]] = None):
+        self.repo_path = repo_path
+        self.cache = cache if cache is not None else BlobCache()
+        self.env = env
+        self._procs: Dict[str, asyncio.subprocess.Process] = {}
+        # One request/response in flight per process
+        self._locks = {'--batch': asyncio.Lock(), '--batch-check': asyncio.Lock()}
+
+    async def _proc(self, mode: str) -> asyncio.subprocess.Process:
+        proc = self._procs.get(mode)
+        if proc is None or proc.returncode is not None:
+            proc = self._procs[mode] = await asyncio.create_subprocess_exec(
+                'git', 'cat-file', mode,
+                cwd=self.repo_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=self.env
+            )
+        return proc
+
+    @staticmethod
+    def _object_name(path: str, rev: str) -> Optional[str]:
+        path = posixpath.normpath(path.replace(os.sep, '/')).lstrip('/')
+        if not path or path == '.' or path.startswith('..') or '\n' in path or '\n' in rev:
+            return None
+        return f"{rev}:{path}"
+
+    @staticmethod
+    def _parse_header(line: bytes) -> Optional[BlobInfo]:
+        # "<sha> <type> <size>", or "<name> missing" / "<name> ambiguous"
+        parts = line.decode(errors='replace').split()
+        if len(parts) != 3 or not parts[2].isdigit():
+            return None
+        return BlobInfo(parts[0], parts[1], int(parts[2]))
+
+    async def _request(self, mode: str, name: str) -> Tuple[Optional[BlobInfo], Optional[bytes]]:
+        async with self._locks[mode]:
+            proc = await self._proc(mode)
+            try:
+                proc.stdin.write(f"{name}\n".encode())
+                await proc.stdin.drain()
+                info = self._parse_header(await proc.stdout.readline())
+                if info is None or mode == '--batch-check':
+                    return info, None
+                # Contents are followed by a newline
+                data = await proc.stdout.readexactly(info.size + 1)
+                return info, data[:-1]
+            except (asyncio.IncompleteReadError, BrokenPipeError, ConnectionResetError) as e:
+                logger.error(f"git cat-file {mode} stopped in {self.repo_path}: {e}")
+                self._procs.pop(mode, None)
+                return None, None
+
+    async def info(self, path: str, rev: str = 'HEAD') -> Optional[BlobInfo]:
+        """sha, type and size of path at rev; None if it doesn't exist"""
+        name = self._object_name(path, rev)
+        if name is None:
+            return None
+        info, _ = await self._request('--batch-check', name)
+        return info
+
+    async def read(self, path: str, rev: str = 'HEAD') -> Optional[bytes]:
+        """Raw contents of the blob at path@rev; None if it isn't a blob"""
+        name = self._object_name(path, rev)
+        if name is None:
+            return None
+        info, data = await self._request('--batch', name)
+        if info is None or info.type != 'blob':
+            return None
+        return data
+
+    async def read_text(self, path: str, rev: str = 'HEAD', max_size: Optional[int] = None) -> Optional[str]:
+        """
+        Decoded contents of path@rev (UTF-8, undecodable bytes dropped)
+
+        None if the path is not a blob at rev or is larger than max_size bytes;
+        the size is checked before the contents are read.
+        """
+        info = await self.info(path, rev)
+        if info is None or info.type != 'blob':
+            return None
+        if max_size is not None and info.size >= max_size:
+            logger.info(f"Skipping {path}: {info.size} bytes")
+            return None
+        text = self.cache.get(info.sha)
+        if text is not None:
+            return text
+        # Read by sha: path@rev may have moved on since the size check
+        _, data = await self._request('--batch', info.sha)
+        if data is None:
+            return None
+        text = data.decode('utf-8', errors='ignore')
+        self.cache.put(info.sha, text)
+        return text
+
+    async def exists(self, path: str, rev: str = 'HEAD') -> bool:
+        info = await self.info(path, rev)
+        return info is not None and info.type == 'blob'
+
+    async def close(self):
+        """Stop the workspace's cat-file processes"""
+        procs, self._procs = self._procs, {}
+        for mode, proc in procs.items():
+            if proc.returncode is not None:
+                continue
+            try:
+                # cat-file exits at end of input
+                proc.stdin.close()
+                await asyncio.wait_for(proc.wait(), timeout=5)
+            except Exception:
+                proc.kill()
+                await proc.wait()
@@ -0,0 +1,253 @@
+"""
+Local git backends for GitOps
+
+GitOps keeps network operations (clone, push, fetch, sparse checkout
+widening) on the git CLI; everything that only touches the local repository
+goes through a backend chosen by GIT_BACKEND:
+
+- gitpython (default when GitPython is installed): index updates, commits,
+  branch creation and tree listings run in-process. Object reads go through
+  GitPython's long-lived `git cat-file --batch` process per workspace, not a
+  new process per call.
+- subprocess: one `git` process per call (the old behaviour).
+
+Commit identity is passed to every commit (commit(author=...) or the
+GIT_AUTHOR_NAME / GIT_AUTHOR_EMAIL environment), never written to the global
+git config shared by concurrent jobs.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import git as gitpython
+    from git.index.typ import BaseIndexEntry
+    from git.index.fun import stat_mode_to_index_mode
+    from git.objects import Blob
+    from gitdb.base import IStream
+    GITPYTHON_AVAILABLE = True
+except ImportError:
+    GITPYTHON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Identity = Tuple[str, str]  # (name, email)
+
+def default_identity() -> Identity:
+    return (os.getenv('GIT_AUTHOR_NAME', 'Bug Fix Agent'), os.getenv('GIT_AUTHOR_EMAIL', 'agent@example.com'))
+
+def _committer(author: Identity) -> Identity:
+    return (os.getenv('GIT_COMMITTER_NAME', author[0]), os.getenv('GIT_COMMITTER_EMAIL', author[1]))
+
+class SubprocessGitBackend:
+    """Local operations through one git process per call"""
+
+    name = 'subprocess'
+
+    async def _run(self, repo_path: str, *args: str, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+        result = await asyncio.create_subprocess_exec(
+            'git', *args,
+            cwd=repo_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env
+        )
+        stdout, stderr = await result.communicate()
+        return result.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
+
+    async def add(self, repo_path: str, paths: Sequence[str]) -> bool:
+        code, _, stderr = await self._run(repo_path, 'add', '--', *paths)
+        if code != 0:
+            logger.error(f"Git add failed: {stderr}")
+        return code == 0
+
+    async def add_all(self, repo_path: str, written: Sequence[str]) -> bool:
+        code, _, stderr = await self._run(repo_path, 'add', '.')
+        if code != 0:
+            logger.error(f"Git add all failed: {stderr}")
+        return code == 0
+
+    async def commit(self, repo_path: str, message: str, author: Identity) -> bool:
+        committer = _committer(author)
+        env = os.environ.copy()
+        env.update({'GIT_AUTHOR_NAME': author[0], 'GIT_AUTHOR_EMAIL': author[1],
+                    'GIT_COMMITTER_NAME': committer[0], 'GIT_COMMITTER_EMAIL': committer[1]})
+        code, stdout, stderr = await self._run(repo_path, 'commit', '-m', message, env=env)
+        if code != 0:
+            # Check if it's just "nothing to commit"
+            if "nothing to commit" in (stdout + stderr).lower():
+                logger.info("Nothing to commit")
+                return True
+            logger.error(f"Git commit failed: {stderr}")
+            return False
+        return True
+
+    async def create_branch(self, repo_path: str, branch_name: str, base_branch: str) -> bool:
+        # -B resets a leftover local branch of the same name
+        code, _, stderr = await self._run(repo_path, 'checkout', '-B', branch_name, f'origin/{base_branch}')
+        if code != 0:
+            logger.error(f"Branch creation failed: {stderr}")
+        return code == 0
+
+    async def changed_files(self, repo_path: str, written: Sequence[str]) -> List[Dict[str, str]]:
+        code, stdout, stderr = await self._run(repo_path, 'diff', '--name-status', 'HEAD')
+        if code != 0:
+            logger.error(f"Git diff failed: {stderr}")
+            return []
+        # Parse output: "A    filename" or "M    filename"
+        changes = []
+        for line in stdout.strip().split('\n'):
+            parts = line.split('\t')
+            if len(parts) >= 2:
+                changes.append({'status': parts[0], 'file': parts[1]})
+        return changes
+
+    async def tracked_files(self, repo_path: str, rev: str) -> List[str]:
+        code, stdout, stderr = await self._run(repo_path, 'ls-tree', '-r', '-z', '--name-only', rev)
+        if code != 0:
+            logger.error(f"Git ls-tree failed: {stderr}")
+            return []
+        return [name for name in stdout.split('\0') if name]
+
+    def close(self, repo_path: str):
+        pass
+
+class GitPythonBackend:
+    """
+    Local operations in-process through GitPython
+
+    Calls are blocking, so they run in a thread; a workspace is only used by
+    its own job, one call at a time.
+    """
+
+    name = 'gitpython'
+
+    def __init__(self):
+        self._repos: Dict[str, "gitpython.Repo"] = {}
+        self._fallback = SubprocessGitBackend()
+
+    def _repo(self, repo_path: str) -> "gitpython.Repo":
+        repo = self._repos.get(repo_path)
+        if repo is None:
+            repo = self._repos[repo_path] = gitpython.Repo(repo_path)
+        return repo
+
+    def _add(self, repo_path: str, paths: Sequence[str]):
+        repo = self._repo(repo_path)
+        entries = []
+        for path in paths:
+            # Hash the blobs ourselves: index.add() with plain paths chdir()s the whole process
+            full_path = os.path.join(repo_path, path)
+            st = os.lstat(full_path)
+            with open(full_path, 'rb') as f:
+                stream = repo.odb.store(IStream(Blob.type, st.st_size, f))
+            entries.append(BaseIndexEntry((stat_mode_to_index_mode(st.st_mode), stream.binsha, 0,
+                                           path.replace(os.sep, '/'))))
+        # One index read and one index write for all paths
+        repo.index.add(entries)
+
+    async def add(self, repo_path: str, paths: Sequence[str]) -> bool:
+        try:
+            await asyncio.to_thread(self._add, repo_path, paths)
+            return True
+        except Exception as e:
+            logger.error(f"Git add error: {e}")
+            return False
+
+    async def add_all(self, repo_path: str, written: Sequence[str]) -> bool:
+        # Without a status scan (a subprocess) the backend stages what the job wrote through GitOps
+        if not written:
+            return True
+        return await self.add(repo_path, written)
+
+    def _commit(self, repo_path: str, message: str, author: Identity) -> bool:
+        repo = self._repo(repo_path)
+        index = repo.index
+        if repo.head.is_valid() and index.write_tree().binsha == repo.head.commit.tree.binsha:
+            logger.info("Nothing to commit")
+            return True
+        committer = _committer(author)
+        index.commit(message, author=gitpython.Actor(*author), committer=gitpython.Actor(*committer))
+        return True
+
+    async def commit(self, repo_path: str, message: str, author: Identity) -> bool:
+        try:
+            return await asyncio.to_thread(self._commit, repo_path, message, author)
+        except Exception as e:
+            logger.error(f"Git commit error: {e}")
+            return False
+
+    def _create_branch(self, repo_path: str, branch_name: str, base_branch: str) -> bool:
+        repo = self._repo(repo_path)
+        base = repo.commit(f'origin/{base_branch}')
+        if repo.head.commit != base:
+            return False  # needs a working tree checkout
+        # Same commit as the checkout: point HEAD at the new branch, index and files stay as they are
+        repo.head.reference = repo.create_head(branch_name, base, force=True)
+        return True
+
+    async def create_branch(self, repo_path: str, branch_name: str, base_branch: str) -> bool:
+        try:
+            if await asyncio.to_thread(self._create_branch, repo_path, branch_name, base_branch):
+                return True
+        except Exception as e:
+            logger.error(f"Branch creation error: {e}")
+            return False
+        # The clone checked out another branch than the base - let git check out the base's files
+        return await self._fallback.create_branch(repo_path, branch_name, base_branch)
+
+    def _changed_files(self, repo_path: str, written: Sequence[str]) -> List[Dict[str, str]]:
+        repo = self._repo(repo_path)
+        tree = repo.head.commit.tree
+        entries = repo.index.entries
+        changes = []
+        for path in written:
+            entry = entries.get((path, 0))
+            try:
+                head_sha = (tree / path).binsha
+            except KeyError:
+                head_sha = None
+            if entry is None:
+                if head_sha is not None:
+                    changes.append({'status': 'D', 'file': path})
+            elif head_sha is None:
+                changes.append({'status': 'A', 'file': path})
+            elif head_sha != entry.binsha:
+                changes.append({'status': 'M', 'file': path})
+        return changes
+
+    async def changed_files(self, repo_path: str, written: Sequence[str]) -> List[Dict[str, str]]:
+        """Staged changes against HEAD among the paths the job wrote"""
+        try:
+            return await asyncio.to_thread(self._changed_files, repo_path, written)
+        except Exception as e:
+            logger.error(f"Get changed files error: {e}")
+            return []
+
+    def _tracked_files(self, repo_path: str, rev: str) -> List[str]:
+        tree = self._repo(repo_path).commit(rev).tree
+        return [item.path for item in tree.traverse() if item.type == 'blob']
+
+    async def tracked_files(self, repo_path: str, rev: str) -> List[str]:
+        try:
+            return await asyncio.to_thread(self._tracked_files, repo_path, rev)
+        except Exception as e:
+            logger.error(f"List tracked files error: {e}")
+            return []
+
+    def close(self, repo_path: str):
+        """Stop the workspace's cat-file processes"""
+        repo = self._repos.pop(repo_path, None)
+        if repo is not None:
+            repo.close()
+
+def create_git_backend(name: Optional[str] = None):
+    """Backend for GIT_BACKEND (gitpython or subprocess)"""
+    name = (name or os.getenv('GIT_BACKEND', 'gitpython')).lower()
+    if name == 'gitpython':
+        if GITPYTHON_AVAILABLE:
+            return GitPythonBackend()
+        logger.warning("GitPython is not installed, using the git CLI for local operations")
+    return SubprocessGitBackend()
@@ -1,29 +1,105 @@
 import os
-import requests
+import time
+import httpx
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import json
 import base64
 
+try:
+    from .metrics import observe_api_call
+    from .rate_limit import get_rate_limiter, token_scope, RateLimitExceeded
+    from .http_cache import get_response_cache
+except ImportError:
+    from metrics import observe_api_call
+    from rate_limit import get_rate_limiter, token_scope, RateLimitExceeded
+    from http_cache import get_response_cache
+
 logger = logging.getLogger(__name__)
 
+# Batchable PR/issue writes: GraphQL mutation per operation kind. Each takes
+# the node id ($id) and, where noted, a body ($body).
+GRAPHQL_MUTATIONS = {
+    'mark_ready': ('markPullRequestReadyForReview(input: {{pullRequestId: ${id}}}) {{ clientMutationId }}', False),
+    'update_body': ('updatePullRequest(input: {{pullRequestId: ${id}, body: ${body}}}) {{ clientMutationId }}', True),
+    'comment': ('addComment(input: {{subjectId: ${id}, body: ${body}}}) '
+                '{{ commentEdge {{ node {{ id databaseId }} }} }}', True),
+    'update_comment': ('updateIssueComment(input: {{id: ${id}, body: ${body}}}) {{ clientMutationId }}', True),
+}
+
+JOB_CONTEXT_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!) {
+  repository(owner: $owner, name: $repo) {
+    id
+    defaultBranchRef { name }
+    issue(number: $number) { id number title body }
+  }
+}
+"""
+
+# 所有 GitPlatformAPI 实例共享一个 keep-alive 连接池（每个事件循环一个）
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_api_client() -> httpx.AsyncClient:
+    """Shared HTTP client for platform API calls on the running event loop"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        pool_size = int(os.getenv('GIT_API_POOL_SIZE', '20'))
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(os.getenv('GIT_API_KEEPALIVE', '30'))
+        )
+        proxy_url = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or 'http://127.0.0.1:7890'
+        _client = httpx.AsyncClient(
+            timeout=float(os.getenv('GIT_API_TIMEOUT', '30')),
+            limits=limits,
+            proxy=proxy_url or None
+        )
+        _client_loop = loop
+        logger.debug(f"Platform API connection pool started (limit={pool_size}, proxy={proxy_url})")
+    return _client
+
+async def close_api_client():
+    """Close the shared connection pool"""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
 class GitPlatformAPI:
-    """通用Git平台API适配器，支持GitHub和GitCode"""
+    """
+    通用Git平台API适配器，支持GitHub和GitCode
+    
+    All API methods are coroutines sharing one connection pool.
+    """
     
     def __init__(self):
         self.platform = os.getenv('PLATFORM', 'github').lower()
         
         if self.platform == 'github':
             self.base_url = os.getenv('GITHUB_BASE', 'https://api.github.com')
+            # GitHub Enterprise serves GraphQL at /api/graphql next to /api/v3
+            default_graphql = (self.base_url.rstrip('/')[:-len('/v3')] + '/graphql'
+                               if self.base_url.rstrip('/').endswith('/api/v3')
+                               else self.base_url.rstrip('/') + '/graphql')
+            self.graphql_url = os.getenv('GITHUB_GRAPHQL_URL', default_graphql)
         else:  # gitcode
             self.base_url = os.getenv('GITCODE_BASE', 'https://gitcode.net/api/v5')
+            self.graphql_url = None  # GitCode has no GraphQL API - batches fall back to REST
+        self.graphql_enabled = bool(self.graphql_url) and os.getenv('GITHUB_GRAPHQL_ENABLED', 'true').lower() == 'true'
         
         # GitHub App认证支持
         self._github_app_auth = None
         if self.platform == 'github':
             try:
-                from .github_app_auth import GitHubAppAuth
-                self._github_app_auth = GitHubAppAuth()
+                from .github_app_auth import get_github_app_auth
+                # 进程内共享：API 客户端每个任务新建一个，令牌缓存与续期线程只有一份
+                self._github_app_auth = get_github_app_auth()
                 if self._github_app_auth.is_app_available():
                     logger.info("GitHub App authentication initialized")
                 else:
@@ -46,6 +122,10 @@ class GitPlatformAPI:
     
     def _get_auth_headers(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Dict[str, str]:
         """获取认证头部"""
+        return self._resolve_auth(owner, repo)[0]
+    
+    def _resolve_auth(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Tuple[Dict[str, str], str]:
+        """获取认证头部和对应的限流范围（每个 installation 或每个 token 一份预算）"""
         headers = {
             'Content-Type': 'application/json',
             'User-Agent': 'Bug-Fix-Agent/1.0'
@@ -63,7 +143,7 @@ class GitPlatformAPI:
                         token = self._github_app_auth.get_installation_token(installation_id)
                         if token:
                             headers['Authorization'] = f'token {token}'
-                            return headers
+                            return headers, f'installation:{installation_id}'
                         logger.warning("Failed to get GitHub App installation token")
                     else:
                         logger.warning(f"No GitHub App installation found for {owner}/{repo}")
@@ -82,10 +162,34 @@ class GitPlatformAPI:
             else:
                 raise ValueError("GITCODE_TOKEN is required")
         
-        return headers
+        return headers, token_scope(self.platform, self.fallback_token)
+    
+    def remember_installation(self, owner: str, repo: str, installation_id: Optional[int]):
+        """Seed the installation cache from the webhook payload so no lookup is needed"""
+        if self._github_app_auth and installation_id:
+            self._github_app_auth.remember_installation_id(owner, repo, installation_id)
+    
+    def _auth_is_cached(self, owner: Optional[str], repo: Optional[str]) -> bool:
+        """True when resolving auth needs no App API call (so it may run on the event loop)"""
+        app_auth = self._github_app_auth
+        if self.platform != 'github' or not app_auth or not app_auth.is_app_available() or not owner or not repo:
+            return True
+        found, installation_id = app_auth.installations.get(owner, repo)
+        return found and (not installation_id or app_auth.peek_installation_token(installation_id) is not None)
     
-    def get_token(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Optional[str]:
+    async def _resolve_auth_async(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Tuple[Dict[str, str], str]:
+        # Installation lookups and token mints are blocking HTTP calls, keep them off the loop
+        if self._auth_is_cached(owner, repo):
+            return self._resolve_auth(owner, repo)
+        return await asyncio.to_thread(self._resolve_auth, owner, repo)
+    
+    async def get_token(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Optional[str]:
         """获取当前可用的访问令牌"""
+        if self._auth_is_cached(owner, repo):
+            return self._get_token(owner, repo)
+        return await asyncio.to_thread(self._get_token, owner, repo)
+    
+    def _get_token(self, owner: Optional[str] = None, repo: Optional[str] = None) -> Optional[str]:
         if self.platform == 'github':
             # 优先使用GitHub App认证
             if self._github_app_auth and self._github_app_auth.is_app_available() and owner and repo:
@@ -104,63 +208,231 @@ class GitPlatformAPI:
             # GitCode使用传统token
             return self.fallback_token
     
-    def _request(self, method: str, endpoint: str, owner: Optional[str] = None, repo: Optional[str] = None, **kwargs) -> Optional[Dict]:
-        """Make API request with proxy support"""
+    async def _request(self, method: str, endpoint: str, owner: Optional[str] = None, repo: Optional[str] = None, **kwargs) -> Optional[Dict]:
+        """
+        Make API request with proxy support.
+        
+        Requests go through the shared keep-alive pool (get_api_client), so
+        concurrent jobs overlap their API latency instead of blocking the loop.
+        
+        Requests are scheduled against the shared rate-limit budget of their
+        auth scope; rate-limited responses are retried after the advertised
+        wait. Raises RateLimitExceeded when the budget cannot be had in time,
+        so callers fail loudly instead of continuing without a result.
+        
+        GETs are revalidated against the response cache (If-None-Match /
+        If-Modified-Since) and 304s are answered from it.
+        """
         try:
             url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
-            headers = self._get_auth_headers(owner, repo)
+            headers, scope = await self._resolve_auth_async(owner, repo)
             
-            # Add proxy settings if available
-            proxies = {}
-            proxy_url = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or 'http://127.0.0.1:7890'
-            if proxy_url:
-                proxies = {
-                    'http': proxy_url,
-                    'https': proxy_url
-                }
-                logger.debug(f"Using proxy for API request: {proxy_url}")
+            cache = get_response_cache() if method.upper() == 'GET' else None
+            cached = cache.get(scope, url) if cache else None
+            if cached is not None:
+                headers = {**headers, **cached.conditional_headers()}
+            elif cache:
+                cache.record('misses')
             
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                timeout=30,
-                proxies=proxies,
-                **kwargs
-            )
+            client = get_api_client()
+            limiter = get_rate_limiter()
+            for attempt in range(limiter.max_retries + 1):
+                await limiter.acquire_async(scope, method)
+                
+                started = time.monotonic()
+                try:
+                    response = await client.request(method, url, headers=headers, **kwargs)
+                except httpx.HTTPError:
+                    observe_api_call('worker', method, endpoint, 'error', time.monotonic() - started)
+                    raise
+                observe_api_call('worker', method, endpoint, response.status_code, time.monotonic() - started)
+                
+                retry_after = await limiter.update(scope, response.status_code, response.headers,
+                                                   response.text if response.status_code == 403 else '')
+                if retry_after is None:
+                    break
+                if attempt == limiter.max_retries:
+                    raise RateLimitExceeded(scope, retry_after)
+                # The next acquire_async() waits out the block recorded by update()
             
             logger.debug(f"{method} {url} - Status: {response.status_code}")
             
+            if response.status_code == 304 and cached is not None:
+                cache.record('revalidated')
+                return cached.json()
+            
             if response.status_code == 404:
                 return None
                 
-            if not response.ok:
-                logger.error(f"API request failed: {method} {endpoint} - {response.status_code} {response.reason}")
+            if not response.is_success:
+                logger.error(f"API request failed: {method} {endpoint} - {response.status_code} {response.reason_phrase}")
                 logger.error(f"Response body: {response.text}")
                 
             response.raise_for_status()
+            if cache and response.status_code == 200:
+                cache.put(scope, url, response.headers.get('ETag'), response.headers.get('Last-Modified'), response.content)
             return response.json() if response.content else {}
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"API request failed: {method} {endpoint} - {e}")
             return None
     
+    async def _graphql(self, query: str, variables: Dict[str, Any], owner: Optional[str] = None,
+                       repo: Optional[str] = None) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        Run a GraphQL document; returns (data, errors).
+        
+        GraphQL has its own primary budget, so it is scheduled on a separate
+        rate-limit scope; mutations are paced as writes like REST writes.
+        data is None when the request itself failed.
+        """
+        method = 'POST' if query.lstrip().startswith('mutation') else 'GET'
+        endpoint = 'graphql'
+        try:
+            headers, scope = await self._resolve_auth_async(owner, repo)
+            scope = f"{scope}:graphql"
+            
+            client = get_api_client()
+            limiter = get_rate_limiter()
+            for attempt in range(limiter.max_retries + 1):
+                await limiter.acquire_async(scope, method)
+                
+                started = time.monotonic()
+                try:
+                    response = await client.post(self.graphql_url, headers=headers,
+                                                 json={'query': query, 'variables': variables})
+                except httpx.HTTPError:
+                    observe_api_call('worker', 'POST', endpoint, 'error', time.monotonic() - started)
+                    raise
+                observe_api_call('worker', 'POST', endpoint, response.status_code, time.monotonic() - started)
+                
+                retry_after = await limiter.update(scope, response.status_code, response.headers,
+                                                   response.text if response.status_code == 403 else '')
+                if retry_after is None:
+                    break
+                if attempt == limiter.max_retries:
+                    raise RateLimitExceeded(scope, retry_after)
+            
+            if not response.is_success:
+                logger.error(f"GraphQL request failed: {response.status_code} {response.reason_phrase}")
+                logger.error(f"Response body: {response.text}")
+                return None, []
+            
+            result = response.json()
+            errors = result.get('errors') or []
+            for error in errors:
+                logger.warning(f"GraphQL error at {error.get('path')}: {error.get('message')}")
+            return result.get('data'), errors
+            
+        except httpx.HTTPError as e:
+            logger.error(f"GraphQL request failed: {e}")
+            return None, []
+    
+    async def batch_update(self, owner: str, repo: str, operations: List[Dict[str, Any]]) -> List[Optional[Dict]]:
+        """
+        Apply several PR/issue writes, in one GraphQL mutation where possible
+        
+        Each operation is a dict with 'op' and its arguments:
+          {'op': 'mark_ready', 'number': pr}
+          {'op': 'update_body', 'number': pr, 'body': ...}
+          {'op': 'comment', 'number': issue_or_pr, 'body': ...}
+          {'op': 'update_comment', 'comment_id': id, 'body': ...}
+        plus 'node_id' (of the PR, issue/PR or comment) to make it batchable.
+        
+        GraphQL mutations run in order within the request. Operations without
+        a node id, failed mutations, and everything on GitCode go through
+        REST. Returns one result per operation: None on failure, otherwise a
+        dict ({'id', 'node_id'} for new comments).
+        """
+        results: List[Optional[Dict]] = [None] * len(operations)
+        batched = [i for i, op in enumerate(operations)
+                   if self.graphql_enabled and op.get('node_id') and op['op'] in GRAPHQL_MUTATIONS]
+        
+        if batched:
+            fields, params, variables = [], [], {}
+            for i in batched:
+                template, has_body = GRAPHQL_MUTATIONS[operations[i]['op']]
+                fields.append(f"m{i}: " + template.format(id=f"id{i}", body=f"body{i}"))
+                params.append(f"$id{i}: ID!")
+                variables[f"id{i}"] = operations[i]['node_id']
+                if has_body:
+                    params.append(f"$body{i}: String!")
+                    variables[f"body{i}"] = operations[i]['body']
+            query = f"mutation({', '.join(params)}) {{\n  " + "\n  ".join(fields) + "\n}"
+            
+            data, _ = await self._graphql(query, variables, owner, repo)
+            for i in batched:
+                payload = (data or {}).get(f"m{i}")
+                if payload is None:
+                    continue
+                node = (payload.get('commentEdge') or {}).get('node') or {}
+                results[i] = {'id': node['databaseId'], 'node_id': node['id']} if node else {}
+            if data is not None:
+                logger.info(f"Applied {sum(r is not None for r in results)}/{len(batched)} updates in one GraphQL request")
+        
+        for i, op in enumerate(operations):
+            if results[i] is None:
+                results[i] = await self._rest_update(owner, repo, op)
+        return results
+    
+    async def _rest_update(self, owner: str, repo: str, op: Dict[str, Any]) -> Optional[Dict]:
+        """REST equivalent of one batch_update operation"""
+        kind = op['op']
+        if kind == 'comment':
+            return await self.create_comment(owner, repo, op['number'], op['body'])
+        if kind == 'mark_ready':
+            ok = await self.mark_pr_ready(owner, repo, op['number'])
+        elif kind == 'update_body':
+            ok = await self.update_pr_body(owner, repo, op['number'], op['body'])
+        elif kind == 'update_comment':
+            ok = await self.update_comment(owner, repo, op['comment_id'], op['body'])
+        else:
+            raise ValueError(f"Unknown batch operation: {kind}")
+        return {} if ok else None
+    
+    async def get_job_context(self, owner: str, repo: str, number: int) -> Optional[Dict[str, Any]]:
+        """
+        Default branch plus the issue's title, body and node id - one GraphQL
+        query on GitHub, two concurrent REST reads otherwise
+        
+        The App installation is not part of the GraphQL schema; it comes from
+        the webhook payload and the installation cache instead.
+        """
+        if self.graphql_enabled:
+            data, _ = await self._graphql(JOB_CONTEXT_QUERY, {'owner': owner, 'repo': repo, 'number': number},
+                                          owner, repo)
+            repository = (data or {}).get('repository')
+            if repository and repository.get('issue'):
+                issue = repository['issue']
+                return {
+                    'default_branch': (repository.get('defaultBranchRef') or {}).get('name') or 'main',
+                    'issue_title': issue.get('title', ''),
+                    'issue_body': issue.get('body', ''),
+                    'issue_node_id': issue.get('id')
+                }
+        
+        repo_data, issue = await asyncio.gather(self.get_repo(owner, repo), self.get_issue(owner, repo, number))
+        if not issue:
+            return None
+        return {
+            'default_branch': (repo_data or {}).get('default_branch') or 'main',
+            'issue_title': issue.get('title', ''),
+            'issue_body': issue.get('body', ''),
+            'issue_node_id': issue.get('node_id')
+        }
+    
     # Issue operations
-    def get_issue(self, owner: str, repo: str, number: int) -> Optional[Dict]:
+    async def get_issue(self, owner: str, repo: str, number: int) -> Optional[Dict]:
         """Get issue details"""
-        return self._request('GET', f'/repos/{owner}/{repo}/issues/{number}', owner, repo)
+        return await self._request('GET', f'/repos/{owner}/{repo}/issues/{number}', owner, repo)
     
-    def comment_issue(self, owner: str, repo: str, number: int, body: str) -> bool:
+    async def comment_issue(self, owner: str, repo: str, number: int, body: str) -> bool:
         """Add comment to issue"""
-        result = self._request('POST', f'/repos/{owner}/{repo}/issues/{number}/comments', 
+        result = await self._request('POST', f'/repos/{owner}/{repo}/issues/{number}/comments', 
                              owner, repo, json={'body': body})
         return result is not None
     
-    def comment_issue_sync(self, owner: str, repo: str, number: int, body: str) -> bool:
-        """Add comment to issue (sync version)"""
-        return self.comment_issue(owner, repo, number, body)
-    
-    def create_pr(self, owner: str, repo: str, head: str, base: str, 
+    async def create_pr(self, owner: str, repo: str, head: str, base: str, 
                   title: str, body: str, draft: bool = True) -> Optional[Dict]:
         """Create pull request"""
         data: Dict[str, Any] = {
@@ -174,53 +446,64 @@ class GitPlatformAPI:
         if self.platform == 'github':
             data['draft'] = draft
         
-        return self._request('POST', f'/repos/{owner}/{repo}/pulls', 
+        return await self._request('POST', f'/repos/{owner}/{repo}/pulls', 
                            owner, repo, json=data)
     
-    def update_pr_body(self, owner: str, repo: str, number: int, body: str) -> bool:
+    async def update_pr_body(self, owner: str, repo: str, number: int, body: str) -> bool:
         """Update PR description"""
-        result = self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
+        result = await self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
                              owner, repo, json={'body': body})
         return result is not None
     
-    def mark_pr_ready(self, owner: str, repo: str, number: int) -> bool:
+    async def mark_pr_ready(self, owner: str, repo: str, number: int) -> bool:
         """Mark PR as ready for review (non-draft)"""
         if self.platform == 'github':
-            result = self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
+            result = await self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
                                  owner, repo, json={'draft': False})
         else:
-            result = self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
+            result = await self._request('PATCH', f'/repos/{owner}/{repo}/pulls/{number}', 
                                  owner, repo, json={'draft': False})
         return result is not None
     
-    def comment_pr(self, owner: str, repo: str, number: int, body: str) -> bool:
+    async def comment_pr(self, owner: str, repo: str, number: int, body: str) -> bool:
         """Add comment to PR"""
-        result = self._request('POST', f'/repos/{owner}/{repo}/issues/{number}/comments', 
+        result = await self._request('POST', f'/repos/{owner}/{repo}/issues/{number}/comments', 
                              owner, repo, json={'body': body})
         return result is not None
     
+    async def create_comment(self, owner: str, repo: str, number: int, body: str) -> Optional[Dict]:
+        """Add comment to issue or PR, returning the created comment (with its id)"""
+        return await self._request('POST', f'/repos/{owner}/{repo}/issues/{number}/comments',
+                                   owner, repo, json={'body': body})
+    
+    async def update_comment(self, owner: str, repo: str, comment_id: int, body: str) -> bool:
+        """Edit an existing issue/PR comment in place"""
+        result = await self._request('PATCH', f'/repos/{owner}/{repo}/issues/comments/{comment_id}',
+                                     owner, repo, json={'body': body})
+        return result is not None
+    
     # Repository operations
-    def get_repo(self, owner: str, repo: str) -> Optional[Dict]:
+    async def get_repo(self, owner: str, repo: str) -> Optional[Dict]:
         """Get repository details"""
-        return self._request('GET', f'/repos/{owner}/{repo}', owner, repo)
+        return await self._request('GET', f'/repos/{owner}/{repo}', owner, repo)
     
-    def get_default_branch(self, owner: str, repo: str) -> str:
+    async def get_default_branch(self, owner: str, repo: str) -> str:
         """Get repository default branch"""
-        repo_data = self.get_repo(owner, repo)
+        repo_data = await self.get_repo(owner, repo)
         if repo_data and 'default_branch' in repo_data:
             return repo_data['default_branch']
         return 'main'  # fallback
     
-    def create_branch(self, owner: str, repo: str, branch: str, sha: str) -> Optional[Dict]:
+    async def create_branch(self, owner: str, repo: str, branch: str, sha: str) -> Optional[Dict]:
         """Create new branch"""
         data = {
             'ref': f'refs/heads/{branch}',
             'sha': sha
         }
-        return self._request('POST', f'/repos/{owner}/{repo}/git/refs', 
+        return await self._request('POST', f'/repos/{owner}/{repo}/git/refs', 
                            owner, repo, json=data)
     
-    def create_or_update_file(self, owner: str, repo: str, path: str, 
+    async def create_or_update_file(self, owner: str, repo: str, path: str, 
                             content: str, message: str, branch: str = 'main',
                             sha: Optional[str] = None) -> Optional[Dict]:
         """Create or update a file"""
@@ -233,13 +516,20 @@ class GitPlatformAPI:
         if sha:
             data['sha'] = sha
         
-        return self._request('PUT', f'/repos/{owner}/{repo}/contents/{path}', 
+        return await self._request('PUT', f'/repos/{owner}/{repo}/contents/{path}', 
                            owner, repo, json=data)
     
-    def get_file_content(self, owner: str, repo: str, path: str, ref: str = 'main') -> Optional[str]:
+    async def get_file_content(self, owner: str, repo: str, path: str, ref: str = 'main') -> Optional[str]:
         """Get file content from repository"""
-        result = self._request('GET', f'/repos/{owner}/{repo}/contents/{path}?ref={ref}', owner, repo)
+        result = await self._request('GET', f'/repos/{owner}/{repo}/contents/{path}?ref={ref}', owner, repo)
         
         if result and result.get('content'):
-            return base64.b64decode(result['content']).decode()
+            def decode() -> str:
+                return base64.b64decode(result['content']).decode()
+            
+            # Unchanged files come back from the cache with the same blob sha - decode them once
+            cache = get_response_cache()
+            if cache and result.get('sha'):
+                return cache.memoize(f"blob:{result['sha']}", decode)
+            return decode()
         return None
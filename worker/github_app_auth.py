@@ -1,12 +1,146 @@
 import os
 import time
+import calendar
 import jwt
 import requests
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from .token_store import create_token_store
+except ImportError:
+    from token_store import create_token_store
 
 logger = logging.getLogger(__name__)
 
+# App JWTs are valid for 10 minutes; reuse one until this many seconds before expiry
+JWT_LIFETIME = 10 * 60
+JWT_REFRESH_MARGIN = 60
+
+# 请求路径上使用的令牌至少还要有效这么久（秒），否则当场重新获取
+TOKEN_MIN_VALIDITY = 300
+
+class InstallationCache:
+    """
+    Process-wide owner/repo -> installation id mapping with TTL
+    
+    Filled from webhook payloads (jobs carry installation_id) and from
+    GET /repos/{owner}/{repo}/installation; installation and
+    installation_repositories webhooks invalidate it. "Not installed" answers
+    are cached briefly too, so a misconfigured repo does not cost a lookup per call.
+    """
+    
+    def __init__(self, ttl: Optional[int] = None, negative_ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else int(os.getenv('GITHUB_INSTALLATION_CACHE_TTL', '3600'))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else int(os.getenv('GITHUB_INSTALLATION_NEGATIVE_TTL', '60'))
+        self._entries: Dict[str, Tuple[Optional[int], float]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(owner: str, repo: str) -> str:
+        return f"{owner}/{repo}".lower()
+    
+    def get(self, owner: str, repo: str) -> Tuple[bool, Optional[int]]:
+        """Returns (found, installation_id); installation_id is None for a cached negative answer"""
+        with self._lock:
+            entry = self._entries.get(self._key(owner, repo))
+            if entry is None:
+                return False, None
+            installation_id, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[self._key(owner, repo)]
+                return False, None
+            return True, installation_id
+    
+    def set(self, owner: str, repo: str, installation_id: Optional[int]):
+        ttl = self.ttl if installation_id else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[self._key(owner, repo)] = (installation_id, time.time() + ttl)
+            if len(self._entries) > 10000:
+                self._prune()
+    
+    def invalidate_repo(self, owner: str, repo: str):
+        with self._lock:
+            self._entries.pop(self._key(owner, repo), None)
+    
+    def invalidate_installation(self, installation_id: int) -> int:
+        """Forget every repo mapped to an installation; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key, (iid, _) in self._entries.items() if iid == installation_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+    
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+_installation_cache = InstallationCache()
+
+def get_installation_cache() -> InstallationCache:
+    return _installation_cache
+
+def _parse_private_key(pem: str):
+    """解析 PEM 私钥一次，避免每次签名 JWT 时重复解析"""
+    try:
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+        return load_pem_private_key(pem.encode(), password=None)
+    except Exception as e:
+        logger.warning(f"Could not pre-parse private key, PyJWT will parse it per signature: {e}")
+        return pem
+
+class AppJWTCache:
+    """
+    Process-wide App private keys and JWTs
+
+    A key file is read and parsed once per process (again only when it changes
+    on disk), and one signed JWT per App is shared by every GitHubAppAuth until
+    JWT_REFRESH_MARGIN before it expires.
+    """
+
+    def __init__(self):
+        self._keys: Dict[str, Tuple[float, Any]] = {}  # path -> (mtime, parsed key)
+        self._jwts: Dict[Tuple[str, str], Tuple[str, float]] = {}  # (app id, key path) -> (jwt, expires_at)
+        self._lock = threading.Lock()
+
+    def private_key(self, path: str):
+        """Parsed key from path; raises OSError if the file can't be read"""
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._keys.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+        with open(path, 'r') as key_file:
+            key = _parse_private_key(key_file.read())
+        with self._lock:
+            self._keys[path] = (mtime, key)
+        return key
+
+    def jwt(self, app_id: str, path: str, private_key) -> str:
+        """App JWT, re-signed only when the cached one is about to expire"""
+        with self._lock:
+            now = int(time.time())
+            cached = self._jwts.get((app_id, path))
+            if cached is not None and now < cached[1] - JWT_REFRESH_MARGIN:
+                return cached[0]
+            payload = {
+                'iat': now - 60,  # 签发时间（过去1分钟，避免时钟偏差）
+                'exp': now + JWT_LIFETIME,  # 过期时间（10分钟后）
+                'iss': str(app_id)  # GitHub App ID（PyJWT 2.10+ 要求字符串）
+            }
+            token = jwt.encode(payload, private_key, algorithm='RS256')
+            self._jwts[(app_id, path)] = (token, payload['exp'])
+            return token
+
+_app_jwt_cache = AppJWTCache()
+
+def get_app_jwt_cache() -> AppJWTCache:
+    return _app_jwt_cache
+
 class GitHubAppAuth:
     """GitHub App 认证管理器"""
     
@@ -18,6 +152,19 @@ class GitHubAppAuth:
         
         self._installation_tokens = {}  # 缓存安装令牌
         self._private_key = None
+        # 私钥与 JWT 由进程内所有实例共享
+        self.app_jwts = get_app_jwt_cache()
+        self.installations = get_installation_cache()
+        
+        # 安装令牌存放在跨进程共享的存储中，后台线程在过期前续期
+        self.token_store = create_token_store()
+        self.refresh_ahead = int(os.getenv('GITHUB_TOKEN_REFRESH_AHEAD', '900'))
+        self.refresh_interval = int(os.getenv('GITHUB_TOKEN_REFRESH_INTERVAL', '60'))
+        self.idle_seconds = int(os.getenv('GITHUB_TOKEN_IDLE_SECONDS', '3600'))
+        self._last_used: Dict[int, float] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self._refresher_lock = threading.Lock()
+        self._closed = threading.Event()
         
         if self.app_id and self.private_key_path:
             self._load_private_key()
@@ -30,8 +177,7 @@ class GitHubAppAuth:
             
         try:
             if os.path.exists(self.private_key_path):
-                with open(self.private_key_path, 'r') as key_file:
-                    self._private_key = key_file.read()
+                self._private_key = self.app_jwts.private_key(self.private_key_path)
                 logger.info("GitHub App private key loaded")
             else:
                 logger.warning(f"Private key file not found: {self.private_key_path}")
@@ -39,34 +185,70 @@ class GitHubAppAuth:
             logger.error(f"Failed to load private key: {e}")
     
     def _generate_jwt(self) -> Optional[str]:
-        """生成GitHub App JWT令牌"""
+        """生成GitHub App JWT令牌（进程内共享，临近过期前才重新签名）"""
         if not self.app_id or not self._private_key:
             return None
-            
+        
         try:
-            now = int(time.time())
-            payload = {
-                'iat': now - 60,  # 签发时间（过去1分钟，避免时钟偏差）
-                'exp': now + (10 * 60),  # 过期时间（10分钟后）
-                'iss': int(self.app_id)  # GitHub App ID
-            }
-            
-            token = jwt.encode(payload, self._private_key, algorithm='RS256')
-            return token
-            
+            return self.app_jwts.jwt(self.app_id, self.private_key_path, self._private_key)
         except Exception as e:
             logger.error(f"Failed to generate JWT: {e}")
             return None
     
+    def peek_installation_token(self, installation_id: int) -> Optional[str]:
+        """返回仍然有效的缓存令牌，不发起网络请求"""
+        self._last_used[installation_id] = time.time()
+        token_data = self._installation_tokens.get(installation_id)
+        if token_data and time.time() < token_data['expires_at'] - TOKEN_MIN_VALIDITY:
+            return token_data['token']
+        return None
+    
     def get_installation_token(self, installation_id: int) -> Optional[str]:
-        """获取安装令牌"""
-        # 检查缓存的令牌是否仍然有效
-        if installation_id in self._installation_tokens:
-            token_data = self._installation_tokens[installation_id]
-            if time.time() < token_data['expires_at'] - 300:  # 提前5分钟刷新
-                return token_data['token']
+        """获取安装令牌：本进程缓存 -> 共享存储 -> 向 GitHub 申请"""
+        token = self.peek_installation_token(installation_id)
+        if token:
+            return token
+        
+        self._ensure_refresher()
+        token_data = self._load_token(installation_id)
+        if token_data and time.time() < token_data['expires_at'] - TOKEN_MIN_VALIDITY:
+            return token_data['token']
         
-        # 生成新的安装令牌
+        return self._mint_token(installation_id, TOKEN_MIN_VALIDITY)
+    
+    def _load_token(self, installation_id: int) -> Optional[Dict[str, Any]]:
+        """从共享存储读取令牌（可能由其他进程生成）"""
+        try:
+            token_data = self.token_store.get(installation_id)
+        except Exception as e:
+            logger.error(f"Token store read failed for installation {installation_id}: {e}")
+            return None
+        if token_data:
+            self._installation_tokens[installation_id] = token_data
+        return token_data
+    
+    def _mint_token(self, installation_id: int, min_validity: float) -> Optional[str]:
+        """
+        Mint a token unless another process did so while we waited for the
+        mint lock - only one process per installation calls GitHub at a time
+        """
+        try:
+            with self.token_store.mint_lock(installation_id):
+                token_data = self._load_token(installation_id)
+                if token_data and time.time() < token_data['expires_at'] - min_validity:
+                    return token_data['token']
+                return self._request_token(installation_id)
+        except Exception as e:
+            logger.error(f"Token store lock failed for installation {installation_id}: {e}")
+            return self._request_token(installation_id)
+    
+    @staticmethod
+    def _parse_expiry(value: str) -> float:
+        """expires_at 是 UTC 时间（...Z），必须用 timegm 而不是按本地时区解析的 mktime"""
+        return float(calendar.timegm(time.strptime(value, '%Y-%m-%dT%H:%M:%SZ')))
+    
+    def _request_token(self, installation_id: int) -> Optional[str]:
+        """POST /app/installations/{id}/access_tokens 并写入共享存储"""
         jwt_token = self._generate_jwt()
         if not jwt_token:
             return None
@@ -88,21 +270,108 @@ class GitHubAppAuth:
             token_data = response.json()
             
             # 缓存令牌
-            expires_at = time.mktime(time.strptime(token_data['expires_at'], '%Y-%m-%dT%H:%M:%SZ'))
+            expires_at = self._parse_expiry(token_data['expires_at'])
             self._installation_tokens[installation_id] = {
                 'token': token_data['token'],
                 'expires_at': expires_at
             }
+            try:
+                self.token_store.put(installation_id, token_data['token'], expires_at)
+            except Exception as e:
+                logger.error(f"Token store write failed for installation {installation_id}: {e}")
             
             logger.info(f"Generated installation token for installation {installation_id}")
             return token_data['token']
             
         except Exception as e:
             logger.error(f"Failed to get installation token: {e}")
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 404:
+                # 安装已被删除：不再把仓库映射到这个 installation
+                self.installations.invalidate_installation(installation_id)
             return None
     
+    def _ensure_refresher(self):
+        """第一次需要令牌时启动后台续期线程"""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._refresher_lock:
+            if self._closed.is_set():
+                return
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._refresh_loop, name='installation-token-refresher',
+                                                   daemon=True)
+                self._refresher.start()
+    
+    def _refresh_loop(self):
+        while not self._closed.wait(self.refresh_interval):
+            try:
+                self.refresh_tokens()
+            except Exception as e:
+                logger.error(f"Installation token refresh failed: {e}")
+    
+    def refresh_tokens(self) -> int:
+        """
+        Renew tokens of recently used installations that expire within
+        GITHUB_TOKEN_REFRESH_AHEAD, so requests never wait on a mint.
+        Installations idle for GITHUB_TOKEN_IDLE_SECONDS are dropped instead.
+        """
+        now = time.time()
+        refreshed = 0
+        for installation_id, last_used in list(self._last_used.items()):
+            if now - last_used > self.idle_seconds:
+                self._last_used.pop(installation_id, None)
+                self._installation_tokens.pop(installation_id, None)
+                continue
+            
+            token_data = self._installation_tokens.get(installation_id)
+            if token_data and token_data['expires_at'] - now > self.refresh_ahead:
+                continue
+            token_data = self._load_token(installation_id)
+            if token_data and token_data['expires_at'] - now > self.refresh_ahead:
+                continue
+            
+            if self._mint_token(installation_id, self.refresh_ahead):
+                refreshed += 1
+        return refreshed
+    
+    def remember_installation_id(self, owner: str, repo: str, installation_id: Optional[int]):
+        """记录 webhook 中已知的安装ID，省去一次查询"""
+        if installation_id:
+            self.installations.set(owner, repo, int(installation_id))
+    
+    def forget_installation(self, installation_id: int, repos: Optional[List[Tuple[str, str]]] = None):
+        """
+        安装被删除/暂停或仓库被移除时清除相关缓存
+        
+        Without repos every repo mapped to the installation is dropped. Other
+        processes keep their entries until the TTL, but each job re-seeds the
+        mapping from its own webhook payload.
+        """
+        self._installation_tokens.pop(installation_id, None)
+        if repos is None:
+            self._last_used.pop(installation_id, None)
+            try:
+                self.token_store.delete(installation_id)
+            except Exception as e:
+                logger.error(f"Token store delete failed for installation {installation_id}: {e}")
+            dropped = self.installations.invalidate_installation(installation_id)
+        else:
+            for owner, repo in repos:
+                self.installations.invalidate_repo(owner, repo)
+            dropped = len(repos)
+        logger.info(f"Invalidated installation {installation_id} ({dropped} cached repos)")
+    
     def get_installation_id(self, owner: str, repo: str) -> Optional[int]:
-        """获取仓库的安装ID"""
+        """获取仓库的安装ID（带 TTL 缓存）"""
+        found, installation_id = self.installations.get(owner, repo)
+        if found:
+            return installation_id
+        
+        installation_id = self._fetch_installation_id(owner, repo)
+        self.installations.set(owner, repo, installation_id)
+        return installation_id
+    
+    def _fetch_installation_id(self, owner: str, repo: str) -> Optional[int]:
         jwt_token = self._generate_jwt()
         if not jwt_token:
             return None
@@ -132,3 +401,35 @@ class GitHubAppAuth:
     def is_app_available(self) -> bool:
         """检查GitHub App是否可用"""
         return bool(self.app_id and self._private_key)
+    
+    def close(self):
+        """停止后台续期线程"""
+        with self._refresher_lock:
+            self._closed.set()
+            refresher, self._refresher = self._refresher, None
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join(timeout=5)
+
+_github_app_auth: Optional[GitHubAppAuth] = None
+_github_app_auth_lock = threading.Lock()
+
+def get_github_app_auth() -> GitHubAppAuth:
+    """
+    Get the process-wide GitHubAppAuth
+
+    API clients are built per job; sharing the auth keeps one in-memory token
+    cache and one refresher thread per process.
+    """
+    global _github_app_auth
+    if _github_app_auth is None:
+        with _github_app_auth_lock:
+            if _github_app_auth is None:
+                _github_app_auth = GitHubAppAuth()
+    return _github_app_auth
+
+def close_github_app_auth():
+    global _github_app_auth
+    with _github_app_auth_lock:
+        auth, _github_app_auth = _github_app_auth, None
+    if auth is not None:
+        auth.close()
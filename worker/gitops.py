@@ -1,224 +1,390 @@
 import os
+import time
 import asyncio
 import logging
-import subprocess
-from typing import Optional
+from typing import Dict, Any, Iterable, List, Optional, Sequence
+
+try:
+    from .metrics import GIT_DURATION, GIT_BYTES, parse_transfer_bytes
+    from .git_backend import create_git_backend, default_identity, Identity
+    from .blob_reader import BlobCache, BlobReader
+except ImportError:
+    from metrics import GIT_DURATION, GIT_BYTES, parse_transfer_bytes
+    from git_backend import create_git_backend, default_identity, Identity
+    from blob_reader import BlobCache, BlobReader
 
 logger = logging.getLogger(__name__)
 
+def network_env() -> dict:
+    """Environment for git network operations, with proxy settings if available"""
+    env = os.environ.copy()
+    proxy_url = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or 'http://127.0.0.1:7890'
+    if proxy_url:
+        env['HTTP_PROXY'] = proxy_url
+        env['HTTPS_PROXY'] = proxy_url
+        env['http_proxy'] = proxy_url
+        env['https_proxy'] = proxy_url
+        logger.debug(f"Using proxy: {proxy_url}")
+    return env
+
+# full:     complete history and checkout
+# shallow:  --depth 1 --single-branch, tip of the base branch only
+# blobless: --filter=blob:none, history without file contents; blobs are fetched on demand
+# sparse:   blobless + cone-mode sparse checkout of top-level files and agent/,
+#           widened with ensure_paths() once the stages know which files they need
+CLONE_STRATEGIES = ('full', 'shallow', 'blobless', 'sparse')
+
+# When request_push() from a stage reaches the remote:
+# immediate: every request (one push per stage) - the default
+# coalesced: at most every GIT_PUSH_INTERVAL seconds; flush_push() sends the rest
+# final:     never - stages only commit locally and flush_push() pushes once after verify
+PUSH_POLICIES = ('immediate', 'coalesced', 'final')
+DEFAULT_PUSH_POLICY = 'immediate'
+
+def resolve_clone_strategy(job: Dict[str, Any]) -> str:
+    """
+    Clone strategy for a job: job['clone_strategy'], then a per-repo entry in
+    CLONE_STRATEGY_REPOS ("owner/repo=sparse,owner/other=shallow"), then the
+    repository profile's choice (job['git_plan'], see repo_profiles), then
+    CLONE_STRATEGY (default full)
+    """
+    strategy = job.get('clone_strategy')
+    if not strategy:
+        full_name = f"{job['owner']}/{job['repo']}".lower()
+        for entry in os.getenv('CLONE_STRATEGY_REPOS', '').split(','):
+            name, _, value = entry.partition('=')
+            if name.strip().lower() == full_name:
+                strategy = value.strip()
+                break
+    if not strategy:
+        strategy = (job.get('git_plan') or {}).get('clone_strategy')
+    strategy = (strategy or os.getenv('CLONE_STRATEGY', 'full')).lower()
+    if strategy not in CLONE_STRATEGIES:
+        logger.warning(f"Unknown clone strategy {strategy!r}, using full")
+        strategy = 'full'
+    return strategy
+
 class GitOps:
     """Git operations wrapper"""
     
     def __init__(self):
-        # Configure git globally for the bot
-        self._setup_git_config()
+        # Defaults; per-workspace values come from the repository profile (set_timeouts)
+        self.clone_timeout = float(os.getenv('GIT_CLONE_TIMEOUT', '120'))
+        self.push_timeout = float(os.getenv('GIT_PUSH_TIMEOUT', '60'))
+        self._timeouts: Dict[str, Dict[str, float]] = {}
+        self._observations: Dict[str, Dict[str, Any]] = {}
+        self.push_policy = os.getenv('GIT_PUSH_POLICY', DEFAULT_PUSH_POLICY).lower()
+        if self.push_policy not in PUSH_POLICIES:
+            logger.warning(f"Unknown push policy {self.push_policy!r}, using {DEFAULT_PUSH_POLICY}")
+            self.push_policy = DEFAULT_PUSH_POLICY
+        self.push_interval = float(os.getenv('GIT_PUSH_INTERVAL', '60'))
+        self._pushes: Dict[str, Dict[str, Any]] = {}  # repo_path -> last push time, unpushed commits
+        # Local (non-network) operations; identity goes with each commit, no global git config
+        self.backend = create_git_backend()
+        self._written: Dict[str, List[str]] = {}  # repo_path -> paths written since the last commit
+        # File reads from the object store; decoded contents are shared across workspaces by blob sha
+        self.blob_cache = BlobCache()
+        self._readers: Dict[str, BlobReader] = {}
     
-    def _setup_git_config(self):
-        """Setup git configuration for the bot"""
-        try:
-            subprocess.run(['git', 'config', '--global', 'user.name', 'Bug Fix Agent'], 
-                          check=True, capture_output=True)
-            subprocess.run(['git', 'config', '--global', 'user.email', 'agent@example.com'], 
-                          check=True, capture_output=True)
-            subprocess.run(['git', 'config', '--global', 'init.defaultBranch', 'main'], 
-                          check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            logger.warning(f"Git config setup failed: {e}")
+    def set_timeouts(self, repo_path: str, clone: Optional[float] = None, push: Optional[float] = None):
+        """Clone / push timeouts for one workspace (repo_path is the clone destination)"""
+        timeouts = self._timeouts.setdefault(repo_path, {})
+        if clone:
+            timeouts['clone'] = clone
+        if push:
+            timeouts['push'] = push
+    
+    def _timeout(self, repo_path: str, op: str) -> float:
+        default = self.clone_timeout if op == 'clone' else self.push_timeout
+        return self._timeouts.get(repo_path, {}).get(op, default)
     
-    async def clone_repo(self, clone_url: str, destination: str) -> bool:
-        """Clone repository using authenticated URL with proxy support"""
+    def _observe(self, repo_path: str, op: str, seconds: float, outcome: str):
+        """Keep the workspace's clone/push durations and timeouts for its repository profile"""
+        observation = self._observations.setdefault(repo_path, {'timeouts': []})
+        if outcome == 'timeout':
+            observation['timeouts'].append(op)
+        elif outcome == 'success':
+            # The slowest push of a job is what its timeout has to cover
+            observation[f'{op}_seconds'] = max(seconds, observation.get(f'{op}_seconds') or 0)
+    
+    def pop_observation(self, repo_path: str) -> Dict[str, Any]:
+        """Durations and timeouts seen on a workspace"""
+        return self._observations.pop(repo_path, {'timeouts': []})
+    
+    def blob_reader(self, repo_path: str) -> BlobReader:
+        """The workspace's reader for file contents at a revision, checked out or not"""
+        reader = self._readers.get(repo_path)
+        if reader is None:
+            # Partial clones fetch missing blobs on read, which needs the proxy settings
+            reader = self._readers[repo_path] = BlobReader(repo_path, self.blob_cache, env=network_env())
+        return reader
+    
+    async def close_workspace(self, repo_path: str):
+        """Forget a workspace's settings and release its backend resources"""
+        self._timeouts.pop(repo_path, None)
+        self._pushes.pop(repo_path, None)
+        self._written.pop(repo_path, None)
+        self._observations.pop(repo_path, None)
+        self.backend.close(repo_path)
+        reader = self._readers.pop(repo_path, None)
+        if reader is not None:
+            await reader.close()
+    
+    async def clone_repo(self, clone_url: str, destination: str, reference: Optional[str] = None,
+                         strategy: str = 'full', branch: Optional[str] = None) -> bool:
+        """
+        Clone repository using authenticated URL with proxy support
+        
+        With reference (a local mirror, see mirror_cache), objects already in
+        the mirror are borrowed through alternates and only newer objects are
+        downloaded. strategy is one of CLONE_STRATEGIES; branch is the base
+        branch (required by shallow, which fetches nothing else).
+        """
+        started = time.monotonic()
+        outcome = 'error'
         try:
-            logger.info(f"Cloning repository to {destination}")
+            logger.info(f"Cloning repository to {destination} ({strategy})" + (f" (reference {reference})" if reference else ""))
             
             # Set up environment with proxy settings
-            env = os.environ.copy()
-            
-            # Add proxy settings if available
-            proxy_url = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or 'http://127.0.0.1:7890'
-            if proxy_url:
-                env['HTTP_PROXY'] = proxy_url
-                env['HTTPS_PROXY'] = proxy_url
-                env['http_proxy'] = proxy_url
-                env['https_proxy'] = proxy_url
-                logger.info(f"Using proxy: {proxy_url}")
+            env = network_env()
+            
+            git_cmd = ['git', 'clone', '--progress']
+            if reference:
+                git_cmd += ['--reference', reference]
+            if strategy == 'shallow':
+                git_cmd += ['--depth', '1', '--single-branch']
+                if branch:
+                    git_cmd += ['--branch', branch]
+            elif strategy in ('blobless', 'sparse'):
+                git_cmd += ['--filter=blob:none']
+            if strategy == 'sparse':
+                # Cone mode: only top-level files are checked out until ensure_paths() widens it
+                git_cmd += ['--sparse']
             
             # The clone_url should already be authenticated from main.py
-            result = await asyncio.wait_for(
-                asyncio.create_subprocess_exec(
-                    'git', 'clone', clone_url, destination,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
-                ),
-                timeout=120  # 2 minutes timeout
+            result = await asyncio.create_subprocess_exec(
+                *git_cmd, clone_url, destination,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env
             )
             
-            stdout, stderr = await asyncio.wait_for(result.communicate(), timeout=120)
+            try:
+                stdout, stderr = await asyncio.wait_for(result.communicate(),
+                                                        timeout=self._timeout(destination, 'clone'))
+            except asyncio.TimeoutError:
+                result.kill()
+                await result.wait()
+                raise
             
             if result.returncode != 0:
                 logger.error(f"Git clone failed: {stderr.decode()}")
                 logger.error(f"Git clone stdout: {stdout.decode()}")
                 return False
             
+            GIT_BYTES.labels('clone').inc(parse_transfer_bytes(stderr.decode(errors='replace')))
+            
+            # The agent's own files are always written, keep them in the cone
+            if strategy == 'sparse' and not await self.ensure_paths(destination, ['agent/']):
+                return False
+            
+            outcome = 'success'
             logger.info("Repository cloned successfully")
             return True
             
         except asyncio.TimeoutError:
-            logger.error("Git clone operation timed out")
+            outcome = 'timeout'
+            logger.error(f"Git clone operation timed out after {self._timeout(destination, 'clone')}s")
             return False
         except Exception as e:
             logger.error(f"Clone error: {e}")
             return False
+        finally:
+            GIT_DURATION.labels('clone', outcome).observe(time.monotonic() - started)
+            self._observe(destination, 'clone', time.monotonic() - started, outcome)
     
-    async def create_branch(self, repo_path: str, branch_name: str, base_branch: str = 'main') -> bool:
-        """Create and checkout new branch"""
+    def is_sparse(self, repo_path: str) -> bool:
+        """Whether the workspace was cloned with a sparse checkout"""
+        return os.path.exists(os.path.join(repo_path, '.git', 'info', 'sparse-checkout'))
+    
+    async def ensure_paths(self, repo_path: str, paths: Iterable[str]) -> bool:
+        """
+        Make sure paths are present in the working tree
+        
+        No-op unless the workspace is sparse; otherwise the directories holding
+        paths (a path ending in "/" is a directory) are added to the cone and
+        their blobs fetched. Top-level files are always in the cone.
+        """
+        if not self.is_sparse(repo_path):
+            return True
+        directories = sorted({path.rstrip('/') if path.endswith('/') else os.path.dirname(path)
+                              for path in paths if path})
+        directories = [d for d in directories if d and not d.startswith('..')]
+        if not directories:
+            return True
         try:
-            logger.info(f"Creating branch {branch_name} from {base_branch}")
-            
-            # First, try to delete the branch locally if it exists
-            try:
-                await asyncio.create_subprocess_exec(
-                    'git', 'branch', '-D', branch_name,
-                    cwd=repo_path,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                logger.info(f"Deleted existing local branch {branch_name}")
-            except:
-                pass  # Branch doesn't exist locally, which is fine
-            
-            # Change to repo directory and create branch
+            logger.info(f"Widening sparse checkout with {directories}")
+            # Checking out the new directories fetches their blobs from the promisor remote
             result = await asyncio.create_subprocess_exec(
-                'git', 'checkout', '-b', branch_name, f'origin/{base_branch}',
+                'git', 'sparse-checkout', 'add', *directories,
                 cwd=repo_path,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                env=network_env()
             )
-            
-            stdout, stderr = await result.communicate()
-            
+            stdout, stderr = await asyncio.wait_for(result.communicate(), timeout=120)
             if result.returncode != 0:
-                logger.error(f"Branch creation failed: {stderr.decode()}")
+                logger.error(f"Sparse checkout widening failed: {stderr.decode()}")
                 return False
-            
-            logger.info(f"Branch {branch_name} created successfully")
             return True
-            
+        except asyncio.TimeoutError:
+            logger.error("Sparse checkout widening timed out")
+            return False
         except Exception as e:
-            logger.error(f"Branch creation error: {e}")
+            logger.error(f"Sparse checkout error: {e}")
             return False
     
-    async def add_file(self, repo_path: str, file_path: str) -> bool:
-        """Add file to git"""
+    def _object_bytes(self, repo_path: str) -> int:
+        git_dir = os.path.join(repo_path, '.git')
+        objects = os.path.join(git_dir if os.path.isdir(git_dir) else repo_path, 'objects')
+        total = 0
+        for directory, _, files in os.walk(objects):
+            for filename in files:
+                try:
+                    total += os.lstat(os.path.join(directory, filename)).st_size
+                except FileNotFoundError:
+                    pass
+        return total
+    
+    async def pack_size(self, repo_path: str) -> Optional[int]:
+        """Bytes of packed and loose objects in a repository (a workspace or a bare mirror)"""
         try:
-            result = await asyncio.create_subprocess_exec(
-                'git', 'add', file_path,
-                cwd=repo_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await result.communicate()
-            return result.returncode == 0
-            
+            return await asyncio.to_thread(self._object_bytes, repo_path)
         except Exception as e:
-            logger.error(f"Git add error: {e}")
+            logger.error(f"Pack size error: {e}")
+            return None
+    
+    async def list_tracked_files(self, repo_path: str, rev: str = 'HEAD') -> List[str]:
+        """
+        All files tracked at rev, whether or not they are checked out
+        
+        Reads trees only, so it needs no blobs - works on blobless and sparse clones.
+        """
+        return await self.backend.tracked_files(repo_path, rev)
+    
+    async def create_branch(self, repo_path: str, branch_name: str, base_branch: str = 'main') -> bool:
+        """Create and checkout new branch"""
+        logger.info(f"Creating branch {branch_name} from {base_branch}")
+        if not await self.backend.create_branch(repo_path, branch_name, base_branch):
             return False
+        logger.info(f"Branch {branch_name} created successfully")
+        return True
+    
+    async def add_file(self, repo_path: str, file_path: str) -> bool:
+        """Add file to git"""
+        return await self.add_files(repo_path, [file_path])
+    
+    async def add_files(self, repo_path: str, file_paths: Sequence[str]) -> bool:
+        """Add several files in one index update"""
+        return await self.backend.add(repo_path, list(file_paths))
     
     async def add_all(self, repo_path: str) -> bool:
-        """Add all changes to git"""
-        try:
-            result = await asyncio.create_subprocess_exec(
-                'git', 'add', '.',
-                cwd=repo_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await result.communicate()
-            return result.returncode == 0
-            
-        except Exception as e:
-            logger.error(f"Git add all error: {e}")
-            return False
+        """Add all changes to git (with the gitpython backend: every file written through GitOps)"""
+        return await self.backend.add_all(repo_path, self._written.get(repo_path, []))
     
-    async def commit(self, repo_path: str, message: str) -> bool:
-        """Commit changes"""
-        try:
-            result = await asyncio.create_subprocess_exec(
-                'git', 'commit', '-m', message,
-                cwd=repo_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await result.communicate()
-            
-            if result.returncode != 0:
-                # Check if it's just "nothing to commit"
-                if "nothing to commit" in stderr.decode().lower():
-                    logger.info("Nothing to commit")
-                    return True
-                logger.error(f"Git commit failed: {stderr.decode()}")
-                return False
-            
-            logger.info(f"Committed: {message}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Git commit error: {e}")
+    async def commit(self, repo_path: str, message: str, paths: Optional[Sequence[str]] = None,
+                     author: Optional[Identity] = None) -> bool:
+        """
+        Commit changes
+        
+        paths are staged first, all in one index update. author is a (name,
+        email) pair, default GIT_AUTHOR_NAME / GIT_AUTHOR_EMAIL.
+        """
+        if paths and not await self.add_files(repo_path, paths):
+            return False
+        if not await self.backend.commit(repo_path, message, author or default_identity()):
             return False
+        self._written.pop(repo_path, None)
+        logger.info(f"Committed: {message}")
+        return True
     
     async def push(self, repo_path: str, branch_name: str, force: bool = False) -> bool:
         """Push branch to remote with proxy support"""
+        started = time.monotonic()
+        outcome = 'error'
         try:
             logger.info(f"Pushing branch {branch_name}" + (" (force)" if force else ""))
             
             # Set up environment with proxy settings
-            env = os.environ.copy()
-            
-            # Add proxy settings if available
-            proxy_url = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or 'http://127.0.0.1:7890'
-            if proxy_url:
-                env['HTTP_PROXY'] = proxy_url
-                env['HTTPS_PROXY'] = proxy_url
-                env['http_proxy'] = proxy_url
-                env['https_proxy'] = proxy_url
-                logger.info(f"Using proxy for push: {proxy_url}")
+            env = network_env()
             
             # Prepare git command
-            git_cmd = ['git', 'push', '-u', 'origin', branch_name]
+            git_cmd = ['git', 'push', '--progress', '-u', 'origin', branch_name]
             if force:
                 git_cmd.insert(2, '--force-with-lease')  # Safer than --force
             
-            result = await asyncio.wait_for(
-                asyncio.create_subprocess_exec(
-                    *git_cmd,
-                    cwd=repo_path,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    env=env
-                ),
-                timeout=60  # 1 minute timeout for push
+            result = await asyncio.create_subprocess_exec(
+                *git_cmd,
+                cwd=repo_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env
             )
             
-            stdout, stderr = await asyncio.wait_for(result.communicate(), timeout=60)
+            try:
+                stdout, stderr = await asyncio.wait_for(result.communicate(),
+                                                        timeout=self._timeout(repo_path, 'push'))
+            except asyncio.TimeoutError:
+                result.kill()
+                await result.wait()
+                raise
             
             if result.returncode != 0:
                 logger.error(f"Git push failed: {stderr.decode()}")
                 logger.error(f"Git push stdout: {stdout.decode()}")
                 return False
             
+            GIT_BYTES.labels('push').inc(parse_transfer_bytes(stderr.decode(errors='replace')))
+            self._pushes[repo_path] = {'pushed_at': time.monotonic(), 'pending': False}
+            outcome = 'success'
             logger.info(f"Branch {branch_name} pushed successfully")
             logger.debug(f"Push output: {stdout.decode()}")
             return True
             
         except asyncio.TimeoutError:
-            logger.error("Git push operation timed out")
+            outcome = 'timeout'
+            logger.error(f"Git push operation timed out after {self._timeout(repo_path, 'push')}s")
             return False
         except Exception as e:
             logger.error(f"Git push error: {e}")
             return False
+        finally:
+            GIT_DURATION.labels('push', outcome).observe(time.monotonic() - started)
+            self._observe(repo_path, 'push', time.monotonic() - started, outcome)
+    
+    async def request_push(self, repo_path: str, branch_name: str) -> bool:
+        """
+        Ask for the branch's local commits to reach the remote, as push_policy allows
+        
+        Returns False only if a push was attempted and failed; deferred commits
+        are sent by a later request or by flush_push().
+        """
+        state = self._pushes.setdefault(repo_path, {'pushed_at': None, 'pending': False})
+        state['pending'] = True
+        if self.push_policy == 'final':
+            return True
+        if self.push_policy == 'coalesced' and state['pushed_at'] is not None \
+                and time.monotonic() - state['pushed_at'] < self.push_interval:
+            logger.info(f"Deferring push of {branch_name} (last push {time.monotonic() - state['pushed_at']:.0f}s ago)")
+            return True
+        return await self.push(repo_path, branch_name)
+    
+    async def flush_push(self, repo_path: str, branch_name: str) -> bool:
+        """Push commits deferred by request_push(); no-op when nothing is pending"""
+        state = self._pushes.get(repo_path)
+        if not state or not state['pending']:
+            return True
+        return await self.push(repo_path, branch_name)
     
     async def commit_changes(self, repo_path: str, message: str) -> bool:
         """Add all changes and commit them"""
@@ -240,36 +406,13 @@ class GitOps:
         return await self.push(repo_path, branch_name)
     
     async def get_changed_files(self, repo_path: str) -> list:
-        """Get list of changed files"""
-        try:
-            result = await asyncio.create_subprocess_exec(
-                'git', 'diff', '--name-status', 'HEAD',
-                cwd=repo_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await result.communicate()
-            
-            if result.returncode != 0:
-                logger.error(f"Git diff failed: {stderr.decode()}")
-                return []
-            
-            # Parse output: "A    filename" or "M    filename"
-            changes = []
-            for line in stdout.decode().strip().split('\n'):
-                if line.strip():
-                    parts = line.split('\t')
-                    if len(parts) >= 2:
-                        status = parts[0]
-                        filename = parts[1]
-                        changes.append({'status': status, 'file': filename})
-            
-            return changes
-            
-        except Exception as e:
-            logger.error(f"Get changed files error: {e}")
-            return []
+        """Get list of uncommitted changes against HEAD (call after staging, before commit)"""
+        return await self.backend.changed_files(repo_path, self._written.get(repo_path, []))
+    
+    def _track_write(self, repo_path: str, file_path: str):
+        written = self._written.setdefault(repo_path, [])
+        if file_path not in written:
+            written.append(file_path)
     
     async def write_file(self, repo_path: str, file_path: str, content: str) -> bool:
         """Write content to file in repo"""
@@ -281,6 +424,7 @@ class GitOps:
             
             with open(full_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            self._track_write(repo_path, file_path)
             
             logger.info(f"Created/updated file: {file_path}")
             return True
@@ -296,6 +440,7 @@ class GitOps:
             
             with open(full_path, 'a', encoding='utf-8') as f:
                 f.write(content)
+            self._track_write(repo_path, file_path)
             
             logger.info(f"Appended to file: {file_path}")
             return True
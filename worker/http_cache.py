@@ -0,0 +1,197 @@
+"""
+Conditional-request cache for Git platform API reads
+
+GET responses carrying an ETag or Last-Modified are kept per (auth scope, URL).
+The next GET for the same URL is sent with If-None-Match / If-Modified-Since,
+and a 304 Not Modified is answered from the cache - GitHub does not count 304s
+against the rate limit.
+
+- memory tier: LRU bounded by HTTP_CACHE_MAX_BYTES of response bodies
+- disk tier (optional, HTTP_CACHE_DIR): survives restarts and is shared by
+  worker processes on one host, pruned oldest-first to HTTP_CACHE_DISK_MAX_BYTES
+- memo: derived values (e.g. decoded file contents) keyed by content hash, so
+  unchanged files are not base64-decoded again
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class CacheEntry:
+    """A cached response body with its validators"""
+    __slots__ = ('etag', 'last_modified', 'body')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else {}
+
+class ResponseCache:
+    """LRU response cache with an optional on-disk tier"""
+
+    def __init__(self, max_bytes: Optional[int] = None, disk_dir: Optional[str] = None,
+                 disk_max_bytes: Optional[int] = None, memo_entries: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('HTTP_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv('HTTP_CACHE_DIR', '')
+        self.disk_max_bytes = disk_max_bytes or int(os.getenv('HTTP_CACHE_DISK_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.memo_entries = memo_entries or int(os.getenv('HTTP_CACHE_MEMO_ENTRIES', '256'))
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._memo: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.stats = {'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(scope: str, url: str) -> str:
+        return hashlib.sha256(f"{scope}\n{url}".encode()).hexdigest()
+
+    def get(self, scope: str, url: str) -> Optional[CacheEntry]:
+        """Cached entry for a URL, promoting disk hits into memory"""
+        key = self._key(scope, url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            with self._lock:
+                self._store_memory(key, entry)
+        return entry
+
+    def put(self, scope: str, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        """Remember a 200 response that carries a validator"""
+        if not etag and not last_modified:
+            return
+        key = self._key(scope, url)
+        entry = CacheEntry(etag, last_modified, body)
+        with self._lock:
+            self._store_memory(key, entry)
+            self.stats['stored'] += 1
+        self._write_disk(key, entry)
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def memoize(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return a derived value for key (e.g. a blob sha), computing it once"""
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        value = compute()
+        with self._lock:
+            self._memo[key] = value
+            while len(self._memo) > self.memo_entries:
+                self._memo.popitem(last=False)
+        return value
+
+    def _store_memory(self, key: str, entry: CacheEntry):
+        if len(entry.body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous.body)
+        self._entries[key] = entry
+        self._size += len(entry.body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.body)
+            self.stats['evicted'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[CacheEntry]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            os.utime(path)  # mtime doubles as last-access time for pruning
+            return CacheEntry(data.get('etag'), data.get('last_modified'), data['body'].encode('utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache file {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry: CacheEntry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'etag': entry.etag, 'last_modified': entry.last_modified,
+                           'body': entry.body.decode('utf-8', errors='replace')}, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache file {path}: {e}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Delete least recently used files until the disk tier fits its budget"""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None when HTTP_CACHE_ENABLED=false"""
+    global _response_cache
+    if os.getenv('HTTP_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
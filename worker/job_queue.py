@@ -0,0 +1,400 @@
+"""
+Redis-backed durable job queue
+
+Layout (all keys share QUEUE_PREFIX, default "agent"):
+- {prefix}:jobs                   HASH  job_id -> envelope JSON
+- {prefix}:pending:{queue}        LIST  job ids waiting to be reserved (LPUSH / RPOP = FIFO)
+- {prefix}:processing:{queue}     ZSET  job id -> visibility deadline
+- {prefix}:delayed:{queue}        ZSET  job id -> time the retry becomes due
+- {prefix}:dead:{queue}           LIST  job ids that exhausted their attempts
+- {prefix}:inflight               HASH  admission key (repo:/installation:) -> jobs not yet acked
+
+A reserved job stays in the processing set until it is acked. If the worker
+dies, the visibility deadline passes and the reaper pushes the job back to the
+pending list, so in-flight jobs survive restarts.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import signal
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+try:
+    from .metrics import QUEUE_WAIT
+except ImportError:
+    from metrics import QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Admission-checked enqueue: reject when the pending list or a per-key in-flight
+# count is at its limit, otherwise store the envelope, push it and count it in-flight
+_ENQUEUE_SCRIPT = """
+local max_pending = tonumber(ARGV[3])
+if max_pending > 0 and redis.call('LLEN', KEYS[2]) >= max_pending then
+    return 'queue_full'
+end
+for i = 4, #ARGV, 2 do
+    local limit = tonumber(ARGV[i + 1])
+    if limit > 0 and tonumber(redis.call('HGET', KEYS[3], ARGV[i]) or '0') >= limit then
+        return string.match(ARGV[i], '^[^:]+') .. '_limit'
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('LPUSH', KEYS[2], ARGV[1])
+for i = 4, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[3], ARGV[i], 1)
+end
+return 'ok'
+"""
+
+# Decrement in-flight counters, dropping fields that reach zero
+_RELEASE_SCRIPT = """
+for _, key in ipairs(ARGV) do
+    if redis.call('HINCRBY', KEYS[1], key, -1) <= 0 then
+        redis.call('HDEL', KEYS[1], key)
+    end
+end
+return 1
+"""
+
+# RPOP a job id and mark it in-flight with its visibility deadline atomically
+_RESERVE_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then
+    return false
+end
+redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+return {job_id, redis.call('HGET', KEYS[3], job_id)}
+"""
+
+# Move every member of a ZSET whose score is due back onto the pending list
+_REQUEUE_DUE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job_id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('LPUSH', KEYS[2], job_id)
+end
+return #ids
+"""
+
+
+class RedisJobQueue:
+    """Durable job queue with ack/retry semantics and visibility timeouts"""
+
+    def __init__(self, redis_url: Optional[str] = None, queue_name: Optional[str] = None,
+                 prefix: Optional[str] = None, visibility_timeout: Optional[int] = None,
+                 max_attempts: Optional[int] = None, retry_backoff: Optional[int] = None):
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.queue_name = queue_name or os.getenv('QUEUE_NAME', 'default')
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self.visibility_timeout = visibility_timeout or int(os.getenv('QUEUE_VISIBILITY_TIMEOUT', '900'))
+        self.max_attempts = max_attempts or int(os.getenv('QUEUE_MAX_ATTEMPTS', '3'))
+        self.retry_backoff = retry_backoff or int(os.getenv('QUEUE_RETRY_BACKOFF', '30'))
+
+        self._redis = None
+        self._enqueue = None
+        self._release = None
+        self._reserve = None
+        self._requeue_due = None
+
+    # Keys
+    def _key(self, kind: str, queue_name: Optional[str] = None) -> str:
+        if kind in ('jobs', 'inflight'):
+            return f"{self.prefix}:{kind}"
+        return f"{self.prefix}:{kind}:{queue_name or self.queue_name}"
+
+    async def connect(self):
+        """Create the Redis connection pool and register Lua scripts"""
+        if self._redis is not None:
+            return
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        self._enqueue = self._redis.register_script(_ENQUEUE_SCRIPT)
+        self._release = self._redis.register_script(_RELEASE_SCRIPT)
+        self._reserve = self._redis.register_script(_RESERVE_SCRIPT)
+        self._requeue_due = self._redis.register_script(_REQUEUE_DUE_SCRIPT)
+        logger.info(f"Connected job queue '{self.queue_name}' to {self.redis_url}")
+
+    async def close(self):
+        """Close the Redis connection pool"""
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def enqueue(self, job: Dict[str, Any], queue_name: Optional[str] = None) -> bool:
+        """Persist a job and push it onto the pending list (no admission limits)"""
+        try:
+            return await self.try_enqueue(job, queue_name=queue_name) is None
+        except Exception as e:
+            logger.error(f"Failed to enqueue job {job.get('job_id')}: {e}")
+            return False
+
+    async def try_enqueue(self, job: Dict[str, Any], queue_name: Optional[str] = None,
+                          max_pending: int = 0, limits: Optional[Dict[str, int]] = None) -> Optional[str]:
+        """
+        Atomically admit and enqueue a job.
+
+        Args:
+            max_pending: Reject when this many jobs are already pending (0 = unbounded)
+            limits: Admission key -> max in-flight jobs, e.g. {'repo:o/r': 2, 'installation:1': 10}
+
+        Returns:
+            None if the job was enqueued, otherwise the rejection reason
+            ('queue_full', 'repo_limit', 'installation_limit'). Redis errors propagate.
+        """
+        await self.connect()
+        limits = limits or {}
+        envelope = {
+            'job': job,
+            'queue': queue_name or self.queue_name,
+            'attempts': 0,
+            'enqueued_at': time.time(),
+            'last_error': None,
+            'admission_keys': list(limits)
+        }
+
+        args = [job['job_id'], json.dumps(envelope), max_pending]
+        for key, limit in limits.items():
+            args.extend([key, limit])
+
+        result = await self._enqueue(
+            keys=[self._key('jobs'), self._key('pending', envelope['queue']), self._key('inflight')],
+            args=args
+        )
+        if result != 'ok':
+            return result
+
+        logger.info(f"Enqueued job {job['job_id']} on queue '{envelope['queue']}'")
+        return None
+
+    async def reserve(self) -> Optional[Dict[str, Any]]:
+        """
+        Reserve the next pending job.
+
+        Returns the job envelope, or None if the queue is empty. The job stays
+        invisible to other consumers until ack/retry or its visibility deadline.
+        """
+        await self.connect()
+        deadline = time.time() + self.visibility_timeout
+        result = await self._reserve(
+            keys=[self._key('pending'), self._key('processing'), self._key('jobs')],
+            args=[deadline]
+        )
+        if not result:
+            return None
+
+        job_id, raw = result
+        if not raw:
+            # Envelope vanished (acked by a previous holder after timeout) - drop the id
+            await self._redis.zrem(self._key('processing'), job_id)
+            return None
+
+        envelope = json.loads(raw)
+        envelope['attempts'] += 1
+
+        if envelope['attempts'] > self.max_attempts:
+            logger.error(f"Job {job_id} exceeded {self.max_attempts} attempts, moving to dead letter list")
+            await self._bury(job_id, envelope)
+            return None
+
+        await self._redis.hset(self._key('jobs'), job_id, json.dumps(envelope))
+        return envelope
+
+    async def extend(self, job_id: str) -> bool:
+        """Push back the visibility deadline of an in-flight job (heartbeat)"""
+        await self.connect()
+        deadline = time.time() + self.visibility_timeout
+        updated = await self._redis.zadd(self._key('processing'), {job_id: deadline}, xx=True, ch=True)
+        return bool(updated)
+
+    async def ack(self, envelope: Dict[str, Any]):
+        """Mark a job as done and forget it"""
+        await self.connect()
+        job_id = envelope['job']['job_id']
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._key('processing'), job_id)
+            pipe.hdel(self._key('jobs'), job_id)
+            await pipe.execute()
+        await self._release_admission(envelope)
+
+    async def retry(self, envelope: Dict[str, Any], error: str):
+        """Schedule a failed job for another attempt, or bury it when attempts are exhausted"""
+        await self.connect()
+        job_id = envelope['job']['job_id']
+        envelope['last_error'] = error
+
+        if envelope['attempts'] >= self.max_attempts:
+            logger.error(f"Job {job_id} failed after {envelope['attempts']} attempts: {error}")
+            await self._bury(job_id, envelope)
+            return
+
+        due = time.time() + self.retry_backoff * envelope['attempts']
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._key('processing'), job_id)
+            pipe.hset(self._key('jobs'), job_id, json.dumps(envelope))
+            pipe.zadd(self._key('delayed'), {job_id: due})
+            await pipe.execute()
+        logger.warning(f"Job {job_id} attempt {envelope['attempts']} failed, retrying in {int(due - time.time())}s")
+
+    async def _bury(self, job_id: str, envelope: Dict[str, Any]):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._key('processing'), job_id)
+            pipe.hset(self._key('jobs'), job_id, json.dumps(envelope))
+            pipe.lpush(self._key('dead'), job_id)
+            await pipe.execute()
+        await self._release_admission(envelope)
+
+    async def _release_admission(self, envelope: Dict[str, Any]):
+        keys = envelope.get('admission_keys') or []
+        if keys:
+            await self._release(keys=[self._key('inflight')], args=keys)
+
+    async def requeue_due(self, batch_size: int = 100) -> int:
+        """Return timed-out and due-for-retry jobs to the pending list"""
+        await self.connect()
+        now = time.time()
+        expired = await self._requeue_due(
+            keys=[self._key('processing'), self._key('pending')], args=[now, batch_size]
+        )
+        due = await self._requeue_due(
+            keys=[self._key('delayed'), self._key('pending')], args=[now, batch_size]
+        )
+        if expired:
+            logger.warning(f"Requeued {expired} job(s) whose visibility timeout expired")
+        return expired + due
+
+    async def depth(self) -> Dict[str, int]:
+        """Queue depth snapshot"""
+        await self.connect()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.llen(self._key('pending'))
+            pipe.zcard(self._key('processing'))
+            pipe.zcard(self._key('delayed'))
+            pipe.llen(self._key('dead'))
+            pending, processing, delayed, dead = await pipe.execute()
+        return {'pending': pending, 'processing': processing, 'delayed': delayed, 'dead': dead}
+
+
+class JobConsumer:
+    """Long-running consumer that processes queued jobs with bounded concurrency"""
+
+    def __init__(self, queue: RedisJobQueue, handler: Callable[[Dict[str, Any]], Awaitable[bool]],
+                 concurrency: int = 2, poll_interval: float = 1.0, reap_interval: float = 5.0):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.reap_interval = reap_interval
+        self.ack_retry_delay = 1.0
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Stop reserving new jobs; in-flight jobs are allowed to finish"""
+        if not self._stopping.is_set():
+            logger.info("Consumer shutting down, waiting for in-flight jobs...")
+            self._stopping.set()
+
+    async def run(self):
+        """Run the consumer until stop() is called"""
+        await self.queue.connect()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        logger.info(f"Worker consuming queue '{self.queue.queue_name}' with concurrency {self.concurrency}")
+
+        reaper = asyncio.create_task(self._reap_loop())
+        try:
+            await asyncio.gather(*(self._slot_loop(slot) for slot in range(self.concurrency)))
+        finally:
+            reaper.cancel()
+            await self.queue.close()
+
+    async def _reap_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await self.queue.requeue_due()
+            except Exception as e:
+                logger.error(f"Queue reaper error: {e}")
+            await self._sleep(self.reap_interval)
+
+    async def _slot_loop(self, slot: int):
+        while not self._stopping.is_set():
+            try:
+                envelope = await self.queue.reserve()
+            except Exception as e:
+                logger.error(f"Failed to reserve job (slot {slot}): {e}")
+                await self._sleep(self.poll_interval)
+                continue
+
+            if envelope is None:
+                await self._sleep(self.poll_interval)
+                continue
+
+            try:
+                await self._process(envelope)
+            except Exception as e:
+                # One bad envelope must not stop the slot (and with it the consumer)
+                logger.error(f"Failed to process envelope (slot {slot}): {e}", exc_info=True)
+
+    async def _process(self, envelope: Dict[str, Any]):
+        job = envelope['job']
+        job_id = job['job_id']
+        logger.info(f"Reserved job {job_id} (attempt {envelope['attempts']}/{self.queue.max_attempts})")
+        if envelope['attempts'] == 1:
+            QUEUE_WAIT.observe(max(0.0, time.time() - envelope['enqueued_at']))
+
+        # The worker only asks for a retry (RetryableJobError) while one is left
+        job['retries_left'] = self.queue.max_attempts - envelope['attempts']
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            # A False result means the job ran to completion and reported its own
+            # failure on the issue - retrying would only open another PR.
+            await self.handler(job)
+        except Exception as e:
+            logger.error(f"Job {job_id} raised: {e}", exc_info=True)
+            try:
+                await self.queue.retry(envelope, str(e))
+            except Exception as retry_error:
+                # Still in the processing set: the reaper redelivers it after the visibility timeout
+                logger.error(f"Failed to schedule retry of job {job_id}: {retry_error}")
+        else:
+            # The job is done - a failed ack is never turned into a retry
+            await self._ack(envelope)
+        finally:
+            heartbeat.cancel()
+
+    async def _ack(self, envelope: Dict[str, Any], attempts: int = 3):
+        job_id = envelope['job']['job_id']
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.queue.ack(envelope)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to ack job {job_id} (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(self.ack_retry_delay * attempt)
+        logger.error(f"Could not ack finished job {job_id}; it may be redelivered after the visibility timeout")
+
+    async def _heartbeat(self, job_id: str):
+        interval = max(self.queue.visibility_timeout / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.queue.extend(job_id)
+            except Exception as e:
+                logger.warning(f"Failed to extend visibility for job {job_id}: {e}")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,300 @@
+"""
+Job status store
+
+Workers append lifecycle events to it (queued, started, stage_started,
+stage_completed, stage_failed, pr_created, completed, failed) and the gateway
+serves them from /api/jobs, so dashboards and bots can follow a job without
+polling the PR body on GitHub.
+
+Each event also updates a job record (status, current stage, per-stage timings,
+PR number, last error).
+
+JOB_STORE_BACKEND=memory (default) keeps records in the process - enough for
+QUEUE_BACKEND=local, where jobs run inside the gateway. JOB_STORE_BACKEND=redis
+shares records between workers and gateway processes:
+- {prefix}:status:{job_id}          STRING record JSON (expires after JOB_STORE_TTL)
+- {prefix}:status:{job_id}:events   STREAM events (ids double as SSE event ids)
+- {prefix}:status-index:recent      ZSET   job id -> created time
+- {prefix}:status-index:repo:{repo} ZSET   job id -> created time, per repository
+
+The gateway (queued) and the worker (everything else) can write one record at
+the same moment; the Redis record is updated under WATCH/MULTI, so neither
+write is lost.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = {'completed', 'failed'}
+
+# Job fields copied into the record (issue bodies and tokens stay out)
+RECORD_FIELDS = ('job_id', 'owner', 'repo', 'issue_number', 'actor', 'branch', 'command', 'created_at')
+
+def new_record(job: Dict[str, Any]) -> Dict[str, Any]:
+    record = {field: job.get(field) for field in RECORD_FIELDS}
+    record.update({
+        'status': 'queued',
+        'stage': None,
+        'stages': {},
+        'pr_number': job.get('pr_number'),
+        'error': None,
+        'updated_at': time.time()
+    })
+    return record
+
+def apply_event(record: Dict[str, Any], event: Dict[str, Any]):
+    """Fold one event into the job record"""
+    kind = event['type']
+    stage = event.get('stage')
+    record['updated_at'] = event['at']
+
+    if kind == 'started':
+        record['status'] = 'running'
+        record['started_at'] = event['at']
+    elif kind == 'stage_started':
+        record['status'] = 'running'
+        record['stage'] = stage
+        record['stages'][stage] = {'status': 'running', 'started_at': event['at']}
+    elif kind in ('stage_completed', 'stage_failed'):
+        entry = record['stages'].setdefault(stage, {})
+        entry['status'] = 'completed' if kind == 'stage_completed' else 'failed'
+        entry['duration'] = event.get('duration')
+        if kind == 'stage_failed':
+            record['error'] = event.get('error')
+    elif kind == 'pr_created':
+        record['pr_number'] = event.get('pr_number')
+    elif kind == 'completed':
+        record['status'] = 'succeeded'
+        record['stage'] = None
+        record['duration'] = event.get('duration')
+    elif kind == 'failed':
+        record['status'] = 'failed'
+        record['error'] = event.get('error') or record.get('error')
+        record['duration'] = event.get('duration')
+
+class MemoryJobStore:
+    """In-process store, bounded to JOB_STORE_MAX_JOBS records"""
+
+    def __init__(self, max_jobs: int, max_events: int):
+        self.max_jobs = max_jobs
+        self.max_events = max_events
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._events: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        self._seq = 0
+        self._changed = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def append(self, job: Dict[str, Any], event: Dict[str, Any]):
+        job_id = job['job_id']
+        record = self._records.get(job_id)
+        if record is None:
+            record = self._records[job_id] = new_record(job)
+            while len(self._records) > self.max_jobs:
+                evicted, _ = self._records.popitem(last=False)
+                self._events.pop(evicted, None)
+        elif event['type'] == 'queued':
+            # The worker got there first - don't roll the status back
+            return
+        apply_event(record, event)
+
+        self._seq += 1
+        events = self._events.setdefault(job_id, [])
+        events.append((self._seq, event))
+        del events[:-self.max_events]
+
+        condition = self._condition()
+        async with condition:
+            condition.notify_all()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._records.get(job_id)
+
+    async def list(self, repo: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        records = reversed(self._records.values())
+        if repo:
+            records = (r for r in records if f"{r['owner']}/{r['repo']}".lower() == repo)
+        result = []
+        for record in records:
+            result.append(record)
+            if len(result) >= limit:
+                break
+        return result
+
+    async def read_events(self, job_id: str, after: Optional[str], block: float) -> List[Tuple[str, Dict[str, Any]]]:
+        last = int(after) if after and after.isdigit() else 0
+
+        def pending():
+            return [(str(seq), event) for seq, event in self._events.get(job_id, []) if seq > last]
+
+        events = pending()
+        if events or block <= 0:
+            return events
+
+        condition = self._condition()
+        try:
+            async with condition:
+                await asyncio.wait_for(condition.wait_for(lambda: bool(pending())), timeout=block)
+        except asyncio.TimeoutError:
+            return []
+        return pending()
+
+    async def close(self):
+        pass
+
+class RedisJobStore:
+    """Shared store: JSON records plus one Redis stream of events per job"""
+
+    def __init__(self, ttl: int, max_events: int, redis_url: Optional[str] = None, prefix: Optional[str] = None):
+        self.ttl = ttl
+        self.max_events = max_events
+        self.redis_url = redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self.index_size = 1000
+        self.append_retries = 20
+        self._redis = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    def _record_key(self, job_id: str) -> str:
+        return f"{self.prefix}:status:{job_id}"
+
+    def _repo_index(self, repo: str) -> str:
+        return f"{self.prefix}:status-index:repo:{repo.lower()}"
+
+    async def append(self, job: Dict[str, Any], event: Dict[str, Any]):
+        from redis.exceptions import WatchError
+
+        job_id = job['job_id']
+        key = self._record_key(job_id)
+        # The gateway and the worker write the same record - WATCH makes the
+        # read-modify-write atomic, a concurrent write just means another round
+        async with self._client().pipeline(transaction=True) as pipe:
+            for _ in range(self.append_retries):
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is not None and event['type'] == 'queued':
+                        # The worker got there first - don't roll the status back
+                        await pipe.unwatch()
+                        return
+                    record = new_record(job) if raw is None else json.loads(raw)
+                    apply_event(record, event)
+
+                    pipe.multi()
+                    if raw is None:
+                        self._index(pipe, job)
+                    pipe.set(key, json.dumps(record), ex=self.ttl)
+                    pipe.xadd(f"{key}:events", {'event': json.dumps(event)}, maxlen=self.max_events, approximate=True)
+                    pipe.expire(f"{key}:events", self.ttl)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        raise RuntimeError(f"job {job_id} record kept changing, {event['type']} not recorded")
+
+    def _index(self, pipe, job: Dict[str, Any]):
+        created = time.time()
+        repo = f"{job['owner']}/{job['repo']}"
+        pipe.zadd(f"{self.prefix}:status-index:recent", {job['job_id']: created})
+        pipe.zremrangebyrank(f"{self.prefix}:status-index:recent", 0, -self.index_size - 1)
+        pipe.zadd(self._repo_index(repo), {job['job_id']: created})
+        pipe.zremrangebyrank(self._repo_index(repo), 0, -self.index_size - 1)
+        pipe.expire(self._repo_index(repo), self.ttl)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._client().get(self._record_key(job_id))
+        return json.loads(raw) if raw else None
+
+    async def list(self, repo: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        client = self._client()
+        index = self._repo_index(repo) if repo else f"{self.prefix}:status-index:recent"
+        job_ids = await client.zrevrange(index, 0, limit - 1)
+        if not job_ids:
+            return []
+        raws = await client.mget([self._record_key(job_id) for job_id in job_ids])
+        return [json.loads(raw) for raw in raws if raw]
+
+    async def read_events(self, job_id: str, after: Optional[str], block: float) -> List[Tuple[str, Dict[str, Any]]]:
+        stream = f"{self._record_key(job_id)}:events"
+        result = await self._client().xread(
+            {stream: after or '0-0'},
+            count=100,
+            block=int(block * 1000) if block > 0 else None
+        )
+        events = []
+        for _, entries in result or []:
+            for event_id, fields in entries:
+                events.append((event_id, json.loads(fields['event'])))
+        return events
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+class JobStore:
+    """Front for the configured backend; write failures never fail a job"""
+
+    def __init__(self, backend=None):
+        if backend is None:
+            max_events = int(os.getenv('JOB_STORE_MAX_EVENTS', '200'))
+            if os.getenv('JOB_STORE_BACKEND', 'memory').lower() == 'redis':
+                backend = RedisJobStore(int(os.getenv('JOB_STORE_TTL', str(7 * 86400))), max_events)
+            else:
+                backend = MemoryJobStore(int(os.getenv('JOB_STORE_MAX_JOBS', '1000')), max_events)
+        self.backend = backend
+
+    async def emit(self, job: Dict[str, Any], event_type: str, **data) -> bool:
+        """Record a lifecycle event for a job"""
+        event = {'type': event_type, 'at': time.time(), **data}
+        try:
+            await self.backend.append(job, event)
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to record {event_type} for job {job.get('job_id')}: {e}")
+            return False
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.backend.get(job_id)
+
+    async def list(self, repo: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally for one "owner/repo" """
+        return await self.backend.list(repo.lower() if repo else None, limit)
+
+    async def read_events(self, job_id: str, after: Optional[str] = None,
+                          block: float = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        """Events after the given id, waiting up to block seconds for new ones"""
+        return await self.backend.read_events(job_id, after, block)
+
+    async def close(self):
+        await self.backend.close()
+
+_job_store: Optional[JobStore] = None
+
+def get_job_store() -> JobStore:
+    """Get the process-wide job store"""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
+
+async def close_job_store():
+    global _job_store
+    if _job_store is not None:
+        await _job_store.close()
+        _job_store = None
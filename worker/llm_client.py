@@ -5,10 +5,16 @@ Integrates with OpenAI-compatible API to generate bug analysis and fixes
 
 import os
 import json
+import time
 import logging
 import httpx
 from typing import Dict, Any, Optional, List
 
+try:
+    from .metrics import LLM_DURATION, LLM_TOKENS
+except ImportError:
+    from metrics import LLM_DURATION, LLM_TOKENS
+
 logger = logging.getLogger(__name__)
 
 class LLMClient:
@@ -27,9 +33,12 @@ class LLMClient:
     
     async def chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None, max_tokens: int = 1000) -> Optional[str]:
         """Make a chat completion request"""
+        model = model or self.model
+        started = time.monotonic()
+        outcome = 'error'
         try:
             payload = {
-                "model": model or self.model,
+                "model": model,
                 "messages": messages,
                 "max_tokens": max_tokens,
                 "temperature": 0.7
@@ -48,14 +57,21 @@ class LLMClient:
             
             if response.status_code == 200:
                 result = response.json()
+                usage = result.get("usage") or {}
+                LLM_TOKENS.labels(model, 'prompt').inc(usage.get("prompt_tokens", 0))
+                LLM_TOKENS.labels(model, 'completion').inc(usage.get("completion_tokens", 0))
+                outcome = 'success'
                 return result["choices"][0]["message"]["content"]
             else:
+                outcome = str(response.status_code)
                 logger.error(f"LLM API error: {response.status_code} - {response.text}")
                 return None
         
         except Exception as e:
             logger.error(f"LLM request failed: {e}")
             return None
+        finally:
+            LLM_DURATION.labels(model, outcome).observe(time.monotonic() - started)
     
     async def analyze_bug(self, issue_title: str, issue_body: str, file_list: List[str]) -> Dict[str, Any]:
         """Analyze a bug report and suggest candidate files"""
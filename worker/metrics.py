@@ -0,0 +1,177 @@
+"""
+Prometheus metrics for the gateway and workers
+
+Both processes record into the same metric families:
+- agent_webhook_duration_seconds      webhook handling latency by event and outcome
+- agent_queue_depth / _wait_seconds   queue depth by state, time from enqueue to start
+- agent_job_duration_seconds          whole-job duration by outcome
+- agent_stage_duration_seconds        locate / propose / fix / verify durations
+- agent_git_duration_seconds          clone / push durations, plus transferred bytes
+- agent_llm_request_duration_seconds  LLM latency, plus prompt/completion tokens
+- agent_api_request_duration_seconds  GitHub/GitCode API calls by templated endpoint and status
+
+The gateway serves them on /metrics. Workers either serve them
+(WORKER_METRICS_PORT) or push them to a Pushgateway (PUSHGATEWAY_URL), which
+suits one-shot `worker.main run` jobs. With the multi-process gateway launcher,
+set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all worker processes.
+
+prometheus_client is optional: without it every metric is a no-op.
+"""
+
+import os
+import re
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram,
+        CONTENT_TYPE_LATEST, generate_latest, push_to_gateway, start_http_server
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+    class _NoopMetric:
+        """Stands in for a metric when prometheus_client is not installed"""
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *args, **kwargs):
+            return self
+
+        def observe(self, *args, **kwargs):
+            pass
+
+        def inc(self, *args, **kwargs):
+            pass
+
+        def set(self, *args, **kwargs):
+            pass
+
+    Counter = Gauge = Histogram = _NoopMetric
+
+# Buckets: webhooks and API calls are sub-second, jobs and stages take minutes
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+WEBHOOK_DURATION = Histogram(
+    'agent_webhook_duration_seconds', 'Webhook handling latency',
+    ['event', 'outcome'], buckets=FAST_BUCKETS
+)
+QUEUE_DEPTH = Gauge(
+    'agent_queue_depth', 'Jobs in the queue by state',
+    ['state'], multiprocess_mode='livemax'
+)
+QUEUE_WAIT = Histogram(
+    'agent_queue_wait_seconds', 'Time from enqueue until a worker starts the job',
+    buckets=SLOW_BUCKETS
+)
+JOB_DURATION = Histogram(
+    'agent_job_duration_seconds', 'Whole job duration',
+    ['outcome'], buckets=SLOW_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    'agent_stage_duration_seconds', 'Pipeline stage duration',
+    ['stage', 'outcome'], buckets=SLOW_BUCKETS
+)
+GIT_DURATION = Histogram(
+    'agent_git_duration_seconds', 'Git network operation duration',
+    ['operation', 'outcome'], buckets=SLOW_BUCKETS
+)
+GIT_BYTES = Counter(
+    'agent_git_transfer_bytes_total', 'Bytes transferred by git network operations',
+    ['operation']
+)
+LLM_DURATION = Histogram(
+    'agent_llm_request_duration_seconds', 'LLM request latency',
+    ['model', 'outcome'], buckets=SLOW_BUCKETS
+)
+LLM_TOKENS = Counter(
+    'agent_llm_tokens_total', 'LLM tokens consumed',
+    ['model', 'kind']
+)
+API_DURATION = Histogram(
+    'agent_api_request_duration_seconds', 'Git platform API call latency',
+    ['client', 'method', 'endpoint', 'status'], buckets=FAST_BUCKETS
+)
+
+# /repos/{owner}/{repo}/issues/123/comments -> /repos/{owner}/{repo}/issues/{n}/comments
+_REPO_PREFIX = re.compile(r'^/repos/[^/]+/[^/]+')
+_CONTENTS_PATH = re.compile(r'/contents/.*$')
+_NUMERIC_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_INSTALLATION_ID = re.compile(r'/installations/\d+')
+
+def endpoint_template(path: str) -> str:
+    """Collapse owner, repo, numbers and file paths so endpoint labels stay low-cardinality"""
+    path = '/' + path.split('?', 1)[0].lstrip('/')
+    path = _REPO_PREFIX.sub('/repos/{owner}/{repo}', path)
+    path = _CONTENTS_PATH.sub('/contents/{path}', path)
+    path = _INSTALLATION_ID.sub('/installations/{id}', path)
+    return _NUMERIC_SEGMENT.sub('/{n}', path)
+
+def observe_api_call(client: str, method: str, path: str, status, seconds: float):
+    API_DURATION.labels(client, method.upper(), endpoint_template(path), str(status)).observe(seconds)
+
+_SIZE_UNITS = {'bytes': 1, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+_TRANSFER_SIZE = re.compile(r'(?:Receiving|Writing) objects:\s+100%[^,]*,\s*([\d.]+)\s*(bytes|KiB|MiB|GiB)')
+
+def parse_transfer_bytes(progress: str) -> int:
+    """Bytes reported by `git clone/push --progress` ("Writing objects: 100% (3/3), 1.20 KiB | ...")"""
+    matches = _TRANSFER_SIZE.findall(progress)
+    if not matches:
+        return 0
+    value, unit = matches[-1]
+    return int(float(value) * _SIZE_UNITS[unit])
+
+def render_latest() -> Tuple[bytes, str]:
+    """Exposition payload for /metrics, aggregating all processes in multiprocess mode"""
+    if not PROMETHEUS_AVAILABLE:
+        return b'# prometheus_client not installed\n', CONTENT_TYPE_LATEST
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    """Drop a dead process's live gauges from the multiprocess directory"""
+    if PROMETHEUS_AVAILABLE and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+def start_metrics_server(port: Optional[int] = None) -> bool:
+    """Serve worker metrics over HTTP (WORKER_METRICS_PORT); returns False if disabled"""
+    port = port if port is not None else int(os.getenv('WORKER_METRICS_PORT', '0'))
+    if not port:
+        return False
+    if not PROMETHEUS_AVAILABLE:
+        logger.warning("WORKER_METRICS_PORT set but prometheus_client is not installed")
+        return False
+    try:
+        start_http_server(port)
+        logger.info(f"Worker metrics listening on :{port}/metrics")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to start metrics server on port {port}: {e}")
+        return False
+
+def push_metrics(job: str = 'agent-worker', grouping_key: Optional[dict] = None) -> bool:
+    """Push worker metrics to PUSHGATEWAY_URL, if configured"""
+    gateway = os.getenv('PUSHGATEWAY_URL')
+    if not gateway or not PROMETHEUS_AVAILABLE:
+        return False
+    try:
+        from prometheus_client import REGISTRY
+        push_to_gateway(gateway, job=job, registry=REGISTRY, grouping_key=grouping_key or {})
+        return True
+    except Exception as e:
+        logger.error(f"Failed to push metrics to {gateway}: {e}")
+        return False
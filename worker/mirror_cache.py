@@ -0,0 +1,298 @@
+"""
+Persistent bare mirror cache for job clones
+
+One bare mirror per repository lives under MIRROR_CACHE_DIR
+({host}/{owner}/{repo}.git). A job leases the mirror, refreshes it with an
+incremental `git fetch` (skipped if another job fetched within
+MIRROR_REFRESH_SECONDS), and clones its own workspace with
+`git clone --reference <mirror>`: objects the mirror already has are
+borrowed through alternates, so only commits newer than the mirror are
+downloaded.
+
+Locking (fcntl, so it holds across worker processes and containers sharing
+the cache volume):
+- {mirror}.fetch.lock  exclusive while creating/fetching the mirror
+- {mirror}.use.lock    shared for the lifetime of every job clone that
+                       borrows from the mirror; eviction takes it exclusively
+                       (non-blocking) so a mirror is never removed under a job
+
+Mirrors never run gc (gc.auto=0) so objects referenced by job clones stay
+put. Fetches keep what they download as a pack (fetch.unpackLimit=1, no loose
+objects), and once a mirror has MIRROR_REPACK_PACKS packs it is repacked into
+one (`git repack -a -d`) the next time it is leased while no job clone borrows
+from it - the use lock is held exclusively for that. When the cache exceeds
+MIRROR_CACHE_MAX_BYTES, the least recently used mirrors not in use are
+deleted. Mirror sizes come from `git count-objects -v` after each fetch and
+repack ({mirror}.size), so eviction doesn't walk every file of every mirror.
+
+The remote URL (which carries the job's token) is passed to each fetch and
+never stored in the mirror's config.
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import asyncio
+import logging
+import tempfile
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    from .gitops import network_env
+    from .metrics import GIT_DURATION, GIT_BYTES, parse_transfer_bytes
+except ImportError:
+    from gitops import network_env
+    from metrics import GIT_DURATION, GIT_BYTES, parse_transfer_bytes
+
+logger = logging.getLogger(__name__)
+
+MIRROR_REFSPECS = ['+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*']
+
+class MirrorLease:
+    """A job's hold on a mirror; release() once the job's clone is deleted"""
+
+    def __init__(self, path: str, use_fd: int):
+        self.path = path
+        self._use_fd = use_fd
+        self.fetch_seconds: Optional[float] = None  # set when this lease refreshed the mirror
+
+    def release(self):
+        if self._use_fd is not None:
+            fcntl.flock(self._use_fd, fcntl.LOCK_UN)
+            os.close(self._use_fd)
+            self._use_fd = None
+
+class MirrorCache:
+    """Bare mirrors shared by all jobs on this host"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.getenv('MIRROR_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'agent-mirrors')
+        self.max_bytes = max_bytes or int(os.getenv('MIRROR_CACHE_MAX_BYTES', str(20 * 1024 ** 3)))
+        self.refresh_seconds = float(os.getenv('MIRROR_REFRESH_SECONDS', '60'))
+        self.fetch_timeout = float(os.getenv('MIRROR_FETCH_TIMEOUT', '1800'))
+        self.repack_packs = int(os.getenv('MIRROR_REPACK_PACKS', '20'))
+        os.makedirs(self.root, exist_ok=True)
+
+    def mirror_path(self, clone_url: str) -> str:
+        parts = urlsplit(clone_url)
+        name = parts.path.strip('/')
+        if not name.endswith('.git'):
+            name += '.git'
+        return os.path.join(self.root, parts.hostname or 'local', name)
+
+    @staticmethod
+    def _open_lock(path: str) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _lock_use(self, mirror: str) -> int:
+        """Shared use lock; also marks the mirror as recently used for LRU eviction"""
+        fd = self._open_lock(f"{mirror}.use.lock")
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        os.utime(f"{mirror}.use.lock")
+        return fd
+
+    async def acquire(self, clone_url: str, fetch_timeout: Optional[float] = None) -> MirrorLease:
+        """
+        Lease the repository's mirror, creating or refreshing it as needed
+        
+        Raises asyncio.TimeoutError if the fetch takes longer than fetch_timeout
+        (default MIRROR_FETCH_TIMEOUT).
+        """
+        mirror = self.mirror_path(clone_url)
+        await asyncio.to_thread(self._maintain, mirror)
+        use_fd = await asyncio.to_thread(self._lock_use, mirror)
+        lease = MirrorLease(mirror, use_fd)
+        try:
+            fetch_fd = self._open_lock(f"{mirror}.fetch.lock")
+            try:
+                await asyncio.to_thread(fcntl.flock, fetch_fd, fcntl.LOCK_EX)
+                if self._needs_fetch(mirror):
+                    started = time.monotonic()
+                    await self._fetch(mirror, clone_url, fetch_timeout or self.fetch_timeout)
+                    lease.fetch_seconds = time.monotonic() - started
+            finally:
+                fcntl.flock(fetch_fd, fcntl.LOCK_UN)
+                os.close(fetch_fd)
+        except Exception:
+            lease.release()
+            raise
+
+        await asyncio.to_thread(self.evict, mirror)
+        return lease
+
+    def _needs_fetch(self, mirror: str) -> bool:
+        try:
+            fetched_at = os.stat(os.path.join(mirror, 'FETCH_HEAD')).st_mtime
+        except FileNotFoundError:
+            return True
+        return time.time() - fetched_at > self.refresh_seconds
+
+    async def _run_git(self, args: List[str], timeout: float) -> Tuple[int, str]:
+        process = await asyncio.create_subprocess_exec(
+            'git', *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=network_env()
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stderr.decode(errors='replace')
+
+    async def _fetch(self, mirror: str, clone_url: str, timeout: float):
+        """Create the mirror if missing and bring its branches and tags up to date"""
+        started = time.monotonic()
+        outcome = 'error'
+        created = not os.path.exists(os.path.join(mirror, 'HEAD'))
+        try:
+            if created:
+                logger.info(f"Creating mirror {mirror}")
+                code, stderr = await self._run_git(['init', '--bare', mirror], 60)
+                if code != 0:
+                    raise RuntimeError(f"git init failed: {stderr}")
+                await self._run_git(['-C', mirror, 'config', 'gc.auto', '0'], 60)
+
+            # unpackLimit=1: keep every fetch as a pack instead of loose objects
+            code, stderr = await self._run_git(
+                ['-C', mirror, '-c', 'fetch.unpackLimit=1', 'fetch', '--prune', '--progress', clone_url,
+                 *MIRROR_REFSPECS],
+                timeout
+            )
+            if code != 0:
+                raise RuntimeError(f"git fetch failed: {stderr.strip()[-500:]}")
+            GIT_BYTES.labels('mirror_fetch').inc(parse_transfer_bytes(stderr))
+            await asyncio.to_thread(self._update_size, mirror)
+            outcome = 'success'
+            logger.info(f"Mirror {mirror} {'created' if created else 'updated'} in {time.monotonic() - started:.1f}s")
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            raise
+        except Exception:
+            if created:
+                shutil.rmtree(mirror, ignore_errors=True)
+            raise
+        finally:
+            GIT_DURATION.labels('mirror_fetch', outcome).observe(time.monotonic() - started)
+
+    @staticmethod
+    def _count_objects(mirror: str) -> Optional[Dict[str, int]]:
+        """`git count-objects -v` of a mirror (sizes in KiB), None if git fails"""
+        result = subprocess.run(['git', '-C', mirror, 'count-objects', '-v'], capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        counts = {}
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition(':')
+            if value.strip().isdigit():
+                counts[key.strip()] = int(value)
+        return counts
+
+    def _update_size(self, mirror: str) -> Optional[Dict[str, int]]:
+        """Record the mirror's size and pack count in {mirror}.size"""
+        counts = self._count_objects(mirror)
+        if counts is None:
+            return None
+        info = {'bytes': 1024 * (counts.get('size', 0) + counts.get('size-pack', 0) + counts.get('size-garbage', 0)),
+                'packs': counts.get('packs', 0)}
+        tmp = f"{mirror}.size.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp, f"{mirror}.size")
+        return info
+
+    def _size_info(self, mirror: str) -> Dict[str, int]:
+        try:
+            with open(f"{mirror}.size") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Mirror from before sizes were recorded, or a torn write
+            return self._update_size(mirror) or {'bytes': 0, 'packs': 0}
+
+    def _maintain(self, mirror: str):
+        """Repack a mirror with too many packs, unless a job clone is borrowing from it"""
+        if not os.path.exists(os.path.join(mirror, 'HEAD')) \
+                or self._size_info(mirror).get('packs', 0) < self.repack_packs:
+            return
+        fd = self._open_lock(f"{mirror}.use.lock")
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return  # in use - the next lease tries again
+        try:
+            started = time.monotonic()
+            result = subprocess.run(['git', '-C', mirror, 'repack', '-a', '-d', '-q'], capture_output=True, text=True)
+            if result.returncode != 0:
+                logger.warning(f"git repack of {mirror} failed: {result.stderr.strip()[-500:]}")
+                return
+            info = self._update_size(mirror)
+            logger.info(f"Repacked mirror {mirror} in {time.monotonic() - started:.1f}s: {info}")
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _mirrors(self) -> List[Tuple[float, int, str]]:
+        """(last used, size in bytes, path) of every mirror in the cache"""
+        mirrors = []
+        for dirpath, dirnames, _ in os.walk(self.root):
+            for name in list(dirnames):
+                if not name.endswith('.git'):
+                    continue
+                dirnames.remove(name)  # don't descend into mirrors
+                path = os.path.join(dirpath, name)
+                size = self._size_info(path)['bytes']
+                try:
+                    last_used = os.stat(f"{path}.use.lock").st_mtime
+                except FileNotFoundError:
+                    last_used = 0.0
+                mirrors.append((last_used, size, path))
+        return mirrors
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used mirrors until the cache fits MIRROR_CACHE_MAX_BYTES"""
+        mirrors = sorted(self._mirrors())
+        total = sum(size for _, size, _ in mirrors)
+        evicted = 0
+        for _, size, path in mirrors:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            fd = self._open_lock(f"{path}.use.lock")
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue  # a job is cloning from it
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+                try:
+                    os.remove(f"{path}.size")
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+                logger.info(f"Evicted mirror {path} ({size / 1024 ** 2:.0f} MB)")
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+        return evicted
+
+_mirror_cache: Optional[MirrorCache] = None
+
+def get_mirror_cache() -> Optional[MirrorCache]:
+    """Process-wide mirror cache, or None when MIRROR_CACHE_ENABLED=false"""
+    global _mirror_cache
+    if os.getenv('MIRROR_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+    if _mirror_cache is None:
+        _mirror_cache = MirrorCache()
+    return _mirror_cache
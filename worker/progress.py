@@ -0,0 +1,174 @@
+"""
+Coalescing progress reporter for a job's pull request
+
+Instead of one PR comment per stage plus a PR body PATCH after every stage,
+a job keeps:
+- the PR body (render_progress_panel), PATCHed only when the rendered text
+  actually changed
+- one status comment on the PR, created on first use and edited in place as
+  stages report
+
+Both go out through GitPlatformAPI.batch_update - one GraphQL request on
+GitHub, REST calls on GitCode.
+
+Updates arriving within PROGRESS_DEBOUNCE_SECONDS of the last write are
+coalesced into one write; close() always flushes the final state.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+try:
+    from .templates import render_progress_panel
+except ImportError:
+    from templates import render_progress_panel
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('locate', 'propose', 'fix', 'verify', 'ready')
+
+def _display_time(value: Optional[str]) -> str:
+    """created_at of the job as shown in the panel; fixed for the job's lifetime"""
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+class ProgressReporter:
+    """Owns the PR body and the single status comment of one job"""
+
+    def __init__(self, api, job: Dict[str, Any], debounce: Optional[float] = None):
+        self.api = api
+        self.job = job
+        self.debounce = debounce if debounce is not None else float(os.getenv('PROGRESS_DEBOUNCE_SECONDS', '10'))
+        self.created_at = _display_time(job.get('created_at'))
+
+        self.progress = {'initialized': True, **{stage: False for stage in STAGES}}
+        self.notes: List[str] = []
+        self.summary: Optional[str] = None
+
+        self._sent_body: Optional[str] = None
+        self._sent_comment: Optional[str] = None
+        self._comment_id: Optional[int] = None
+        self._comment_node_id: Optional[str] = None
+        self._last_write = 0.0
+        self._pending: Optional[asyncio.Task] = None
+        self._waiting = False
+        self._lock = asyncio.Lock()
+        self.writes = 0
+
+    def render_body(self) -> str:
+        return render_progress_panel(
+            issue_number=self.job['issue_number'],
+            actor=self.job['actor'],
+            job_id=self.job['job_id'],
+            created_at=self.created_at,
+            **self.progress
+        )
+
+    def render_comment(self) -> Optional[str]:
+        sections = list(self.notes)
+        if self.summary:
+            sections.append(self.summary)
+        if not sections:
+            return None
+        return "\n\n---\n\n".join(sections) + f"\n\n---\n*任务ID: `{self.job['job_id']}`*"
+
+    def mark_sent(self, body: str):
+        """Record a PR body written elsewhere (e.g. when the PR was created)"""
+        self._sent_body = body
+
+    def stage_completed(self, stage: str, comment: Optional[str] = None):
+        """Tick a stage and, optionally, add its report to the status comment"""
+        self.progress[stage] = True
+        if comment:
+            self.notes.append(comment)
+        self._schedule()
+
+    def finish(self, summary: Optional[str] = None):
+        """Mark the job ready; no write is scheduled - close() sends it with the final batch"""
+        self.progress['ready'] = True
+        if summary:
+            self.summary = summary
+
+    def _schedule(self):
+        """Write now, or once the debounce window since the last write has passed"""
+        if self._pending is not None and not self._pending.done():
+            return  # the pending write will pick up this change too
+        delay = max(0.0, self._last_write + self.debounce - time.monotonic())
+        self._waiting = True
+        self._pending = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._waiting = False
+        await self._flush()
+
+    async def close(self, extra_operations: Optional[List[Dict[str, Any]]] = None) -> List[Optional[Dict]]:
+        """
+        Skip any debounce wait and flush the final state
+        
+        extra_operations (batch_update operations such as marking the PR ready)
+        are sent in the same batch; their results are returned.
+        """
+        if self._pending is not None and not self._pending.done():
+            # Cancel only before the write starts - never in the middle of an API call
+            if self._waiting:
+                self._pending.cancel()
+            try:
+                await self._pending
+            except asyncio.CancelledError:
+                pass
+        return await self._flush(extra_operations or [])
+
+    async def _flush(self, extra_operations: Optional[List[Dict[str, Any]]] = None) -> List[Optional[Dict]]:
+        """Send the changed body and status comment (and any extras) as one batch"""
+        extra_operations = extra_operations or []
+        owner, repo, pr_number = self.job['owner'], self.job['repo'], self.job.get('pr_number')
+        if not pr_number:
+            return [None] * len(extra_operations)
+
+        async with self._lock:
+            operations = []
+            body = self.render_body()
+            if body != self._sent_body:
+                operations.append({'op': 'update_body', 'number': pr_number, 'body': body,
+                                   'node_id': self.job.get('pr_node_id')})
+            comment = self.render_comment()
+            if comment and comment != self._sent_comment:
+                if self._comment_id:
+                    operations.append({'op': 'update_comment', 'comment_id': self._comment_id, 'body': comment,
+                                       'node_id': self._comment_node_id})
+                else:
+                    operations.append({'op': 'comment', 'number': pr_number, 'body': comment,
+                                       'node_id': self.job.get('pr_node_id')})
+            if not operations and not extra_operations:
+                return []
+
+            try:
+                results = await self.api.batch_update(owner, repo, operations + extra_operations)
+            except Exception as e:
+                logger.error(f"Failed to update PR progress: {e}")
+                return [None] * len(extra_operations)
+
+            for operation, result in zip(operations, results):
+                if result is None:
+                    continue
+                self.writes += 1
+                if operation['op'] == 'update_body':
+                    self._sent_body = body
+                else:
+                    self._sent_comment = comment
+                    if operation['op'] == 'comment':
+                        self._comment_id = result.get('id')
+                        self._comment_node_id = result.get('node_id')
+            if any(result is not None for result in results):
+                self._last_write = time.monotonic()
+            return results[len(operations):]
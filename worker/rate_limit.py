@@ -0,0 +1,278 @@
+"""
+Rate-limit-aware request scheduler for the Git platform API
+
+Budgets are kept per auth scope (one GitHub App installation, or one personal
+token) and shared by every job in the worker process - or by every worker when
+RATE_LIMIT_BACKEND=redis.
+
+Before each request the scheduler is asked for a slot:
+- primary limit: X-RateLimit-Remaining / X-RateLimit-Reset from the last
+  response are tracked; at 0 every request waits for the reset, and below
+  GITHUB_RATE_RESERVE content-creating requests (POST/PATCH/PUT/DELETE) wait
+  so reads keep working
+- secondary limits: writes are paced by a token bucket
+  (GITHUB_WRITES_PER_MINUTE, burst GITHUB_WRITE_BURST)
+- Retry-After, or a 403/429 rate-limit response, blocks the scope until then
+
+Waiting requests are queued behind the budget rather than failed; a wait
+longer than GITHUB_RATE_MAX_WAIT raises RateLimitExceeded.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {'POST', 'PATCH', 'PUT', 'DELETE'}
+
+# GitHub asks clients hitting a secondary limit without Retry-After to wait at least a minute
+SECONDARY_LIMIT_BACKOFF = 60
+
+class RateLimitExceeded(Exception):
+    """The request could not be scheduled within GITHUB_RATE_MAX_WAIT"""
+
+    def __init__(self, scope: str, wait: float):
+        super().__init__(f"Rate limit for {scope} exhausted, next slot in {wait:.0f}s")
+        self.scope = scope
+        self.wait = wait
+
+def token_scope(prefix: str, token: str) -> str:
+    """Stable scope name for a token that never appears in logs or Redis keys"""
+    return f"{prefix}:{hashlib.sha256(token.encode()).hexdigest()[:12]}"
+
+class LocalBudgetBackend:
+    """Budgets for the current process (plain memory - the coroutines never wait)"""
+
+    def __init__(self, write_rate: float, write_burst: float, reserve: int):
+        self.write_rate = write_rate
+        self.write_burst = write_burst
+        self.reserve_floor = reserve
+        self._scopes: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, scope: str, now: float) -> Dict[str, float]:
+        state = self._scopes.get(scope)
+        if state is None:
+            state = self._scopes[scope] = {
+                'remaining': -1, 'reset_at': 0, 'blocked_until': 0,
+                'tokens': self.write_burst, 'tokens_at': now
+            }
+        return state
+
+    async def reserve(self, scope: str, write: bool) -> float:
+        """Take a slot; returns 0, or the seconds to wait before asking again"""
+        now = time.time()
+        with self._lock:
+            state = self._state(scope, now)
+
+            if now < state['blocked_until']:
+                return state['blocked_until'] - now
+
+            if now >= state['reset_at']:
+                state['remaining'] = -1  # new window, budget unknown until the next response
+            elif state['remaining'] == 0 or (write and 0 <= state['remaining'] <= self.reserve_floor):
+                return state['reset_at'] - now
+
+            if write:
+                tokens = min(self.write_burst, state['tokens'] + (now - state['tokens_at']) * self.write_rate)
+                state['tokens_at'] = now
+                if tokens < 1:
+                    state['tokens'] = tokens
+                    return (1 - tokens) / self.write_rate
+                state['tokens'] = tokens - 1
+
+            # Count the request now so concurrent jobs don't all spend the last few calls
+            if state['remaining'] > 0:
+                state['remaining'] -= 1
+            return 0.0
+
+    async def observe(self, scope: str, remaining: Optional[int], reset_at: Optional[float],
+                      blocked_until: Optional[float]):
+        with self._lock:
+            state = self._state(scope, time.time())
+            if remaining is not None and reset_at is not None:
+                state['remaining'] = remaining
+                state['reset_at'] = reset_at
+            if blocked_until:
+                state['blocked_until'] = max(state['blocked_until'], blocked_until)
+
+# Same algorithm as LocalBudgetBackend.reserve, atomically on a Redis hash
+_RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local write = ARGV[2] == '1'
+local rate = tonumber(ARGV[3])
+local burst = tonumber(ARGV[4])
+local floor = tonumber(ARGV[5])
+
+local s = redis.call('HMGET', KEYS[1], 'remaining', 'reset_at', 'blocked_until', 'tokens', 'tokens_at')
+local remaining = tonumber(s[1] or '-1')
+local reset_at = tonumber(s[2] or '0')
+local blocked_until = tonumber(s[3] or '0')
+local tokens = tonumber(s[4] or tostring(burst))
+local tokens_at = tonumber(s[5] or tostring(now))
+
+if now < blocked_until then
+    return tostring(blocked_until - now)
+end
+if now >= reset_at then
+    remaining = -1
+elseif remaining == 0 or (write and remaining >= 0 and remaining <= floor) then
+    return tostring(reset_at - now)
+end
+
+if write then
+    tokens = math.min(burst, tokens + (now - tokens_at) * rate)
+    tokens_at = now
+    if tokens < 1 then
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'tokens_at', tostring(tokens_at))
+        return tostring((1 - tokens) / rate)
+    end
+    tokens = tokens - 1
+end
+if remaining > 0 then
+    remaining = remaining - 1
+end
+
+redis.call('HSET', KEYS[1], 'remaining', remaining, 'tokens', tostring(tokens), 'tokens_at', tostring(tokens_at))
+redis.call('EXPIRE', KEYS[1], 7200)
+return '0'
+"""
+
+_OBSERVE_SCRIPT = """
+if ARGV[1] ~= '' then
+    redis.call('HSET', KEYS[1], 'remaining', ARGV[1], 'reset_at', ARGV[2])
+end
+if ARGV[3] ~= '' then
+    local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+    if tonumber(ARGV[3]) > current then
+        redis.call('HSET', KEYS[1], 'blocked_until', ARGV[3])
+    end
+end
+redis.call('EXPIRE', KEYS[1], 7200)
+return 1
+"""
+
+class RedisBudgetBackend:
+    """Budgets shared by every worker process through Redis (asyncio client)"""
+
+    def __init__(self, write_rate: float, write_burst: float, reserve: int,
+                 redis_url: Optional[str] = None, prefix: Optional[str] = None):
+        import redis.asyncio as aioredis
+
+        self.write_rate = write_rate
+        self.write_burst = write_burst
+        self.reserve_floor = reserve
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self._redis = aioredis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                                        decode_responses=True)
+        self._reserve = self._redis.register_script(_RESERVE_SCRIPT)
+        self._observe = self._redis.register_script(_OBSERVE_SCRIPT)
+
+    def _key(self, scope: str) -> str:
+        return f"{self.prefix}:ratelimit:{scope}"
+
+    async def reserve(self, scope: str, write: bool) -> float:
+        return float(await self._reserve(
+            keys=[self._key(scope)],
+            args=[time.time(), '1' if write else '0', self.write_rate, self.write_burst, self.reserve_floor]
+        ))
+
+    async def observe(self, scope: str, remaining: Optional[int], reset_at: Optional[float],
+                      blocked_until: Optional[float]):
+        await self._observe(keys=[self._key(scope)], args=[
+            '' if remaining is None or reset_at is None else remaining,
+            '' if reset_at is None else reset_at,
+            '' if not blocked_until else blocked_until
+        ])
+
+class RateLimitScheduler:
+    """Hands out request slots per auth scope and learns budgets from responses"""
+
+    def __init__(self, backend=None):
+        self.max_wait = float(os.getenv('GITHUB_RATE_MAX_WAIT', '900'))
+        self.max_retries = int(os.getenv('GITHUB_RATE_MAX_RETRIES', '3'))
+        if backend is None:
+            write_rate = float(os.getenv('GITHUB_WRITES_PER_MINUTE', '60')) / 60
+            write_burst = float(os.getenv('GITHUB_WRITE_BURST', '3'))
+            reserve = int(os.getenv('GITHUB_RATE_RESERVE', '50'))
+            backend = LocalBudgetBackend(write_rate, write_burst, reserve)
+            if os.getenv('RATE_LIMIT_BACKEND', 'local').lower() == 'redis':
+                try:
+                    backend = RedisBudgetBackend(write_rate, write_burst, reserve)
+                except Exception as e:
+                    logger.error(f"Redis rate limit backend unavailable, using per-process budgets: {e}")
+        self.backend = backend
+
+    async def _reserve(self, scope: str, method: str) -> float:
+        try:
+            return await self.backend.reserve(scope, method.upper() in WRITE_METHODS)
+        except Exception as e:
+            # A broken shared backend must not stop API traffic
+            logger.error(f"Rate limit backend error for {scope}: {e}")
+            return 0.0
+
+    def _check_wait(self, scope: str, method: str, delay: float, waited: float):
+        if waited + delay > self.max_wait:
+            raise RateLimitExceeded(scope, delay)
+        if delay >= 1:
+            logger.info(f"Rate limit: {method} for {scope} queued for {delay:.1f}s")
+
+    async def acquire_async(self, scope: str, method: str):
+        """Wait (without blocking the event loop) until a request may be sent"""
+        waited = 0.0
+        while True:
+            delay = await self._reserve(scope, method)
+            if delay <= 0:
+                return
+            self._check_wait(scope, method, delay, waited)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    async def update(self, scope: str, status: int, headers: Dict[str, Any], body: str = '') -> Optional[float]:
+        """
+        Learn the budget from a response. Returns the seconds to wait before
+        retrying if the response was a rate-limit rejection, otherwise None.
+        """
+        now = time.time()
+        remaining = headers.get('X-RateLimit-Remaining') or headers.get('x-ratelimit-remaining')
+        reset = headers.get('X-RateLimit-Reset') or headers.get('x-ratelimit-reset')
+        retry_after = headers.get('Retry-After') or headers.get('retry-after')
+
+        remaining = int(remaining) if remaining is not None and str(remaining).isdigit() else None
+        reset_at = float(reset) if reset is not None and str(reset).isdigit() else None
+
+        blocked_until = None
+        limited = status == 429 or (status == 403 and (
+            remaining == 0 or retry_after is not None or 'secondary rate limit' in body.lower()
+        ))
+        if retry_after is not None and str(retry_after).isdigit():
+            blocked_until = now + int(retry_after)
+        elif limited and remaining == 0 and reset_at:
+            blocked_until = reset_at
+        elif limited:
+            blocked_until = now + SECONDARY_LIMIT_BACKOFF
+
+        try:
+            await self.backend.observe(scope, remaining, reset_at, blocked_until if limited else None)
+        except Exception as e:
+            logger.error(f"Rate limit backend error for {scope}: {e}")
+
+        if not limited:
+            return None
+        wait = max(0.0, (blocked_until or now) - now)
+        logger.warning(f"Rate limited on {scope} (status {status}), retrying in {wait:.0f}s")
+        return wait
+
+_scheduler: Optional[RateLimitScheduler] = None
+
+def get_rate_limiter() -> RateLimitScheduler:
+    """Get the process-wide scheduler shared by all jobs"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RateLimitScheduler()
+    return _scheduler
@@ -0,0 +1,265 @@
+"""
+Repository profiles: git cost history per repository
+
+After every job the worker records what the repository cost:
+- pack_bytes      size of the packed object store (taken from the mirror or a full clone)
+- file_count      tracked files at the base branch
+- clone_seconds / fetch_seconds / push_seconds   moving averages (EWMA)
+- timeouts        recent clone / fetch / push timeouts
+
+plan_job() turns a profile into the git plan of the next job on that
+repository:
+- clone strategy: full, then blobless, then sparse as the repo grows (or
+  one step further after a recent clone timeout)
+- clone / fetch / push timeouts sized from the pack size and the observed
+  durations instead of fixed values
+- queue: huge repositories go to REPO_LARGE_QUEUE, served by workers that
+  keep a warm mirror cache (`worker.main serve --queue large`)
+
+The gateway calls it at enqueue time to pick the queue; the worker calls it
+again at job start for the strategy and timeouts.
+
+Backends (REPO_PROFILE_BACKEND): memory (per process), file (one JSON file
+per host, REPO_PROFILE_PATH) or redis (shared by the gateway and all
+workers, one key per repository under QUEUE_PREFIX).
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.3
+MAX_TIMEOUTS = 10
+TIMEOUT_WINDOW = float(os.getenv('REPO_PROFILE_TIMEOUT_WINDOW', str(7 * 86400)))
+MAX_PROFILES = int(os.getenv('REPO_PROFILE_MAX_ENTRIES', '5000'))
+
+def profile_key(owner: str, repo: str) -> str:
+    return f"{owner}/{repo}".lower()
+
+def merge_observation(profile: Optional[Dict[str, Any]], observation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fold one job's observation into a profile
+
+    observation keys (all optional): pack_bytes, file_count, clone_seconds,
+    fetch_seconds, push_seconds, clone_strategy, timeouts (list of operation
+    names that timed out).
+    """
+    profile = dict(profile or {})
+    now = time.time()
+    for field in ('pack_bytes', 'file_count'):
+        if observation.get(field) is not None:
+            profile[field] = observation[field]
+    for field in ('clone_seconds', 'fetch_seconds', 'push_seconds'):
+        value = observation.get(field)
+        if value is None:
+            continue
+        previous = profile.get(field)
+        profile[field] = value if previous is None else round(EWMA_ALPHA * value + (1 - EWMA_ALPHA) * previous, 3)
+    if observation.get('clone_strategy'):
+        profile['clone_strategy'] = observation['clone_strategy']
+    timeouts = [t for t in profile.get('timeouts', []) if now - t['at'] < TIMEOUT_WINDOW]
+    timeouts.extend({'op': op, 'at': now} for op in observation.get('timeouts', []))
+    profile['timeouts'] = timeouts[-MAX_TIMEOUTS:]
+    profile['jobs'] = profile.get('jobs', 0) + 1
+    profile['updated_at'] = now
+    return profile
+
+def recent_timeouts(profile: Dict[str, Any], op: str) -> int:
+    now = time.time()
+    return sum(1 for t in profile.get('timeouts', []) if t['op'] == op and now - t['at'] < TIMEOUT_WINDOW)
+
+ESCALATION = ('full', 'blobless', 'sparse')
+
+def _sized_timeout(base: float, observed: Optional[float], size_bytes: Optional[int], timeouts: int) -> float:
+    """base, or 3x the observed duration, or the time to move size_bytes at GIT_MIN_THROUGHPUT - doubled per recent timeout"""
+    throughput = float(os.getenv('GIT_MIN_THROUGHPUT', str(2 * 1024 ** 2)))
+    timeout = float(max(base, (observed or 0) * 3, (size_bytes or 0) / throughput))
+    timeout *= 2 ** min(timeouts, 3)
+    return round(min(timeout, float(os.getenv('GIT_MAX_TIMEOUT', '3600'))), 1)
+
+def plan_job(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Scheduler hook: clone strategy, timeouts and queue for a repository's next job
+
+    clone_strategy is None when nothing is known about the repository, so the
+    configured default (CLONE_STRATEGY) applies.
+    """
+    profile = profile or {}
+    pack_bytes = profile.get('pack_bytes')
+    file_count = profile.get('file_count') or 0
+
+    strategy = None
+    if pack_bytes is not None or file_count:
+        if (pack_bytes or 0) >= int(os.getenv('REPO_SPARSE_BYTES', str(1024 ** 3))) \
+                or file_count >= int(os.getenv('REPO_SPARSE_FILES', '50000')):
+            strategy = 'sparse'
+        elif (pack_bytes or 0) >= int(os.getenv('REPO_BLOBLESS_BYTES', str(200 * 1024 ** 2))):
+            strategy = 'blobless'
+        else:
+            strategy = 'full'
+    clone_timeouts = recent_timeouts(profile, 'clone')
+    if clone_timeouts:
+        # The last strategy didn't make it in time - go one step lighter
+        previous = profile.get('clone_strategy') or strategy or 'full'
+        if previous in ESCALATION:
+            step = min(ESCALATION.index(previous) + 1, len(ESCALATION) - 1)
+            strategy = max(strategy or 'full', ESCALATION[step], key=ESCALATION.index)
+
+    large_queue = os.getenv('REPO_LARGE_QUEUE')
+    is_large = (pack_bytes or 0) >= int(os.getenv('REPO_LARGE_BYTES', str(2 * 1024 ** 3)))
+
+    return {
+        'clone_strategy': strategy,
+        'clone_timeout': _sized_timeout(float(os.getenv('GIT_CLONE_TIMEOUT', '120')),
+                                        profile.get('clone_seconds'), pack_bytes, clone_timeouts),
+        'fetch_timeout': _sized_timeout(float(os.getenv('MIRROR_FETCH_TIMEOUT', '1800')),
+                                        profile.get('fetch_seconds'), None, recent_timeouts(profile, 'fetch')),
+        'push_timeout': _sized_timeout(float(os.getenv('GIT_PUSH_TIMEOUT', '60')),
+                                       profile.get('push_seconds'), None, recent_timeouts(profile, 'push')),
+        'queue': large_queue if large_queue and is_large else None
+    }
+
+def _prune(profiles: Dict[str, Dict[str, Any]], max_entries: int) -> Dict[str, Dict[str, Any]]:
+    """Keep the max_entries most recently updated profiles"""
+    if len(profiles) <= max_entries:
+        return profiles
+    keep = sorted(profiles, key=lambda key: profiles[key].get('updated_at', 0), reverse=True)[:max_entries]
+    return {key: profiles[key] for key in keep}
+
+class MemoryRepoProfileStore:
+    """Profiles for the current process only"""
+
+    def __init__(self, max_entries: int = MAX_PROFILES):
+        self.max_entries = max_entries
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._profiles.get(key)
+
+    def record(self, key: str, observation: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            profile = self._profiles[key] = merge_observation(self._profiles.get(key), observation)
+            self._profiles = _prune(self._profiles, self.max_entries)
+            return profile
+
+class FileRepoProfileStore:
+    """Profiles shared by the processes of one host through a locked JSON file"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_PROFILES):
+        self.path = path or os.getenv('REPO_PROFILE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'agent-repo-profiles.json')
+        self.max_entries = max_entries
+        self._lock_path = f"{self.path}.lock"
+        self._local = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _flock(self, mode: int):
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable repo profiles {self.path}: {e}")
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._local, self._flock(fcntl.LOCK_SH):
+            return self._read().get(key)
+
+    def record(self, key: str, observation: Dict[str, Any]) -> Dict[str, Any]:
+        with self._local, self._flock(fcntl.LOCK_EX):
+            profiles = self._read()
+            profile = profiles[key] = merge_observation(profiles.get(key), observation)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(_prune(profiles, self.max_entries), f)
+            os.replace(tmp, self.path)
+            return profile
+
+class RedisRepoProfileStore:
+    """Profiles shared by the gateway and every worker through Redis"""
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: Optional[str] = None):
+        import redis
+
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self.ttl = int(os.getenv('REPO_PROFILE_TTL', str(30 * 86400)))
+        self._redis = redis.Redis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                                           decode_responses=True)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:repoprofile:{key}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.get(self._key(key))
+        return json.loads(raw) if raw else None
+
+    def record(self, key: str, observation: Dict[str, Any]) -> Dict[str, Any]:
+        # Jobs on one repository rarely finish at the same moment; the lock keeps the merge exact when they do
+        with self._redis.lock(f"{self._key(key)}:lock", timeout=10, blocking_timeout=10):
+            profile = merge_observation(self.get(key), observation)
+            # Cold repositories expire instead of being pruned
+            self._redis.set(self._key(key), json.dumps(profile), ex=self.ttl)
+            return profile
+
+def create_profile_store(backend: Optional[str] = None):
+    """Profile store for REPO_PROFILE_BACKEND (memory, file or redis)"""
+    backend = (backend or os.getenv('REPO_PROFILE_BACKEND', 'file')).lower()
+    try:
+        if backend == 'redis':
+            return RedisRepoProfileStore()
+        if backend == 'file':
+            return FileRepoProfileStore()
+    except Exception as e:
+        logger.error(f"Repo profile backend {backend} unavailable, keeping profiles per process: {e}")
+    return MemoryRepoProfileStore()
+
+_profile_store = None
+
+def get_profile_store():
+    """Process-wide profile store"""
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = create_profile_store()
+    return _profile_store
+
+def plan_for(owner: str, repo: str) -> Dict[str, Any]:
+    """plan_job() for a repository from the shared store; defaults if the store is unavailable"""
+    try:
+        profile = get_profile_store().get(profile_key(owner, repo))
+    except Exception as e:
+        logger.warning(f"Could not read profile of {owner}/{repo}: {e}")
+        profile = None
+    return plan_job(profile)
+
+def record_job(owner: str, repo: str, observation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fold a finished job's git observation into the repository's profile"""
+    try:
+        return get_profile_store().record(profile_key(owner, repo), observation)
+    except Exception as e:
+        logger.warning(f"Could not update profile of {owner}/{repo}: {e}")
+        return None
@@ -43,7 +43,7 @@ async def run_deploy_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
         # Commit deploy info
         await gitops.add_file(repo_path, 'agent/report.txt')
         await gitops.commit(repo_path, 'chore(agent): add deployment info (demo)')
-        await gitops.push(repo_path, job['branch'])
+        await gitops.request_push(repo_path, job['branch'])
         
         # Store deployment info in job
         job['deploy_url'] = deploy_url
@@ -33,6 +33,9 @@ async def run_fix_stage(job: Dict[str, Any], repo_path: str, api, gitops) -> Dic
         
         changes_applied = []
         
+        # Earlier stages only read from the object store; check out what fix writes in a sparse workspace
+        await gitops.ensure_paths(repo_path, target_files)
+        
         # Try to load the patch plan for context
         patch_plan = {}
         try:
@@ -93,15 +96,15 @@ repository analysis.
         # Stage all changes
         await gitops.add_all(repo_path)
         
+        # Get list of changed files for reporting (staged, before they're committed)
+        changed_files = await gitops.get_changed_files(repo_path)
+        
         # Commit changes
         commit_message = f"fix: AI-generated solution for issue #{job['issue_number']}"
         await gitops.commit(repo_path, commit_message)
         
         # Push changes
-        await gitops.push(repo_path, job['branch'])
-        
-        # Get list of changed files for reporting
-        changed_files = await gitops.get_changed_files(repo_path)
+        await gitops.request_push(repo_path, job['branch'])
         
         comment = f"""🛠️ **代码修复实施完成**
 
@@ -144,10 +147,12 @@ async def apply_llm_fix(repo_path: str, file_path: str, job: Dict[str, Any],
                        patch_plan: Dict[str, Any], llm_client, gitops) -> bool:
     """Apply LLM-generated fix to a specific file"""
     try:
-        full_path = os.path.join(repo_path, file_path)
+        # Contents at HEAD from the object store: fix never edits a file twice before committing
+        reader = gitops.blob_reader(repo_path)
+        exists = await reader.exists(file_path)
         
         # Skip if file doesn't exist and we shouldn't create it
-        if not os.path.exists(full_path):
+        if not exists:
             # Check if the fix plan suggests creating this file
             should_create = False
             for change in patch_plan.get('proposed_changes', []):
@@ -161,12 +166,10 @@ async def apply_llm_fix(repo_path: str, file_path: str, job: Dict[str, Any],
         
         # Read existing file content
         original_content = ""
-        if os.path.exists(full_path):
-            try:
-                with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    original_content = f.read()
-            except Exception as e:
-                logger.warning(f"Could not read {file_path}: {e}")
+        if exists:
+            original_content = await reader.read_text(file_path)
+            if original_content is None:
+                logger.warning(f"Could not read {file_path}")
                 return False
         
         # Prepare fix context from patch plan
@@ -227,11 +230,11 @@ async def apply_llm_fix(repo_path: str, file_path: str, job: Dict[str, Any],
 async def apply_demo_fix(repo_path: str, file_path: str, job: Dict[str, Any], gitops) -> bool:
     """Apply a safe demo fix to a file"""
     try:
-        full_path = os.path.join(repo_path, file_path)
+        reader = gitops.blob_reader(repo_path)
         
         # If it's a README or markdown file, append a demo section
         if 'README' in file_path.upper() or file_path.endswith('.md'):
-            if os.path.exists(full_path):
+            if await reader.exists(file_path):
                 demo_section = f"""
 
 ---
@@ -269,10 +272,8 @@ This README was created by Bug Fix Agent as a demonstration for issue #{job.get(
         
         # For other file types, we'll be more cautious and just add a comment
         elif file_path.endswith(('.py', '.js', '.ts', '.java', '.cpp', '.c')):
-            if os.path.exists(full_path):
-                # Read existing file
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+            content = await reader.read_text(file_path)
+            if content is not None:
                 
                 # Add a safe comment at the top
                 comment_styles = {
@@ -4,7 +4,7 @@ Locate Stage - Find problematic files using LLM analysis
 
 import os
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 try:
@@ -44,7 +44,8 @@ async def run_locate_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
             logger.info(f"🧠 Starting LLM-powered analysis for issue: {job.get('issue_title', 'Unknown Issue')}")
             
             # Get repository file list for LLM analysis
-            file_list = get_repository_files(repo_path)
+            # From the object store, so files outside a sparse checkout are listed too
+            file_list = get_repository_files(repo_path, await gitops.list_tracked_files(repo_path))
             logger.info(f"Found {len(file_list)} files in repository")
             
             # Use LLM to analyze the bug and suggest files
@@ -86,7 +87,7 @@ async def run_locate_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
         await gitops.write_file(repo_path, 'agent/analysis.md', analysis_content)
         await gitops.add_file(repo_path, 'agent/analysis.md')
         await gitops.commit(repo_path, 'chore(agent): add problem analysis')
-        await gitops.push(repo_path, job['branch'])
+        await gitops.request_push(repo_path, job['branch'])
         
         # Store results in job
         job['candidate_files'] = candidate_files
@@ -164,13 +165,32 @@ def find_candidate_files(job: Dict[str, Any], repo_path: str) -> List[str]:
     
     return candidates
 
-def get_repository_files(repo_path: str) -> List[str]:
-    """Get list of all relevant files in the repository for LLM analysis"""
+def get_repository_files(repo_path: str, tracked_files: Optional[List[str]] = None) -> List[str]:
+    """
+    Get list of all relevant files in the repository for LLM analysis
+    
+    tracked_files (git ls-tree listing) is filtered with the same rules;
+    without it the working tree is walked.
+    """
     
     files = []
     ignore_dirs = {'.git', '__pycache__', 'node_modules', '.pytest_cache', 'build', 'dist', 'target'}
     ignore_exts = {'.pyc', '.pyo', '.log', '.tmp', '.cache', '.DS_Store'}
     
+    if tracked_files:
+        for rel_path in tracked_files:
+            parts = rel_path.split('/')
+            if any(d in ignore_dirs or d.startswith('.') for d in parts[:-1]):
+                continue
+            filename = parts[-1]
+            if filename.startswith('.') or any(filename.endswith(ext) for ext in ignore_exts):
+                continue
+            files.append(rel_path)
+            # Limit total files to avoid token limits
+            if len(files) >= 200:
+                break
+        return files
+    
     try:
         for root, dirs, filenames in os.walk(repo_path):
             # Filter out ignored directories
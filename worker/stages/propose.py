@@ -33,14 +33,15 @@ async def run_propose_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
         logger.info(f"📁 Working with candidate files: {candidate_files}")
         
         # Try to read file contents for LLM context (limit to avoid token overflow)
+        # Read from the object store - candidates need not be checked out
+        reader = gitops.blob_reader(repo_path)
         file_contents = {}
         for file_path in candidate_files[:3]:  # Limit to first 3 files
             try:
-                full_path = os.path.join(repo_path, file_path)
-                if os.path.exists(full_path) and os.path.getsize(full_path) < 10000:  # Max 10KB per file
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        file_contents[file_path] = f.read()
-                        logger.info(f"📖 Read {len(file_contents[file_path])} chars from {file_path}")
+                content = await reader.read_text(file_path, max_size=10000)  # Max 10KB per file
+                if content is not None:
+                    file_contents[file_path] = content
+                    logger.info(f"📖 Read {len(content)} chars from {file_path}")
             except Exception as e:
                 logger.warning(f"Could not read {file_path}: {e}")
         
@@ -87,7 +88,7 @@ async def run_propose_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
         await gitops.write_file(repo_path, 'agent/patch_plan.json', patch_plan_content)
         await gitops.add_file(repo_path, 'agent/patch_plan.json')
         await gitops.commit(repo_path, 'chore(agent): add fix plan')
-        await gitops.push(repo_path, job['branch'])
+        await gitops.request_push(repo_path, job['branch'])
         
         # Store target files in job
         job['target_files'] = target_files
@@ -48,7 +48,7 @@ async def run_verify_stage(job: Dict[str, Any], repo_path: str, api, gitops) ->
         await gitops.write_file(repo_path, 'agent/report.txt', report_content)
         await gitops.add_file(repo_path, 'agent/report.txt')
         await gitops.commit(repo_path, 'test(agent): add verification report (demo)')
-        await gitops.push(repo_path, job['branch'])
+        await gitops.request_push(repo_path, job['branch'])
         
         # Store results in job
         job['test_results'] = test_results
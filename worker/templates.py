@@ -10,8 +10,17 @@ from typing import Dict, Any, Optional, List
 def render_progress_panel(issue_number: int, actor: str, job_id: str, 
                          initialized: bool = False, locate: bool = False, 
                          propose: bool = False, fix: bool = False, 
-                         verify: bool = False, ready: bool = False) -> str:
-    """Render PR progress panel"""
+                         verify: bool = False, ready: bool = False,
+                         created_at: Optional[str] = None) -> str:
+    """
+    Render PR progress panel
+    
+    Pass the job's created_at so re-rendering an unchanged state yields the
+    same body (the progress reporter skips PATCHes of identical bodies).
+    """
+    
+    if created_at is None:
+        created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
     
     def checkbox(checked: bool) -> str:
         return 'x' if checked else ' '
@@ -29,7 +38,7 @@ def render_progress_panel(issue_number: int, actor: str, job_id: str,
 - **Issue:** #{issue_number}
 - **Triggered by:** @{actor}
 - **Job ID:** `{job_id}`
-- **Created:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
+- **Created:** {created_at} UTC
 
 ### 📁 Generated Files
 - `agent/analysis.md` - Detailed problem analysis and diagnosis
@@ -0,0 +1,184 @@
+"""
+Shared store for GitHub App installation tokens
+
+Every gateway and worker process reads installation tokens from one store, so
+a token minted by one process is reused by all of them:
+
+- memory: per process (the old behaviour)
+- file: one JSON file per host (TOKEN_STORE_PATH, mode 0600) guarded by
+  fcntl locks; shared by the gateway's pre-forked processes and local workers
+- redis: one key per installation under QUEUE_PREFIX, expiring with the token
+
+Minting is serialized per installation across processes (mint_lock), so a
+token about to expire is renewed once rather than once per process. Expired
+entries are dropped on write and at most TOKEN_STORE_MAX_ENTRIES tokens are
+kept.
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.getenv('TOKEN_STORE_MAX_ENTRIES', '1000'))
+
+def _prune(tokens: Dict[str, Dict[str, Any]], max_entries: int) -> Dict[str, Dict[str, Any]]:
+    """Drop expired tokens, then the soonest-expiring ones beyond max_entries"""
+    now = time.time()
+    live = {key: data for key, data in tokens.items() if data.get('expires_at', 0) > now}
+    if len(live) > max_entries:
+        keep = sorted(live, key=lambda key: live[key]['expires_at'], reverse=True)[:max_entries]
+        live = {key: live[key] for key in keep}
+    return live
+
+class MemoryTokenStore:
+    """Tokens for the current process only"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._mint_locks: Dict[int, threading.Lock] = {}
+
+    def get(self, installation_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._tokens.get(str(installation_id))
+
+    def put(self, installation_id: int, token: str, expires_at: float):
+        with self._lock:
+            self._tokens[str(installation_id)] = {'token': token, 'expires_at': expires_at}
+            self._tokens = _prune(self._tokens, self.max_entries)
+
+    def delete(self, installation_id: int):
+        with self._lock:
+            self._tokens.pop(str(installation_id), None)
+
+    @contextmanager
+    def mint_lock(self, installation_id: int):
+        with self._lock:
+            lock = self._mint_locks.setdefault(installation_id, threading.Lock())
+        with lock:
+            yield
+
+class FileTokenStore:
+    """Tokens shared by the processes of one host through a locked JSON file"""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path or os.getenv('TOKEN_STORE_PATH') or os.path.join(
+            tempfile.gettempdir(), 'agent-installation-tokens.json')
+        self.max_entries = max_entries
+        self._lock_path = f"{self.path}.lock"
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache_mtime = None
+        self._local = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _flock(self, path: str, mode: int):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        """Current file contents; re-read only when the file changed"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        # Writers replace the file, so inode + mtime identify a version
+        mtime = (st.st_ino, st.st_mtime_ns)
+        if mtime == self._cache_mtime:
+            return self._cache
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                tokens = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token store {self.path}: {e}")
+            tokens = {}
+        self._cache, self._cache_mtime = tokens, mtime
+        return tokens
+
+    def _write(self, tokens: Dict[str, Dict[str, Any]]):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(tokens, f)
+        os.replace(tmp, self.path)
+
+    def _update(self, change):
+        with self._local, self._flock(self._lock_path, fcntl.LOCK_EX):
+            tokens = dict(self._read())
+            change(tokens)
+            self._write(_prune(tokens, self.max_entries))
+
+    def get(self, installation_id: int) -> Optional[Dict[str, Any]]:
+        with self._local, self._flock(self._lock_path, fcntl.LOCK_SH):
+            return self._read().get(str(installation_id))
+
+    def put(self, installation_id: int, token: str, expires_at: float):
+        self._update(lambda tokens: tokens.__setitem__(str(installation_id), {'token': token, 'expires_at': expires_at}))
+
+    def delete(self, installation_id: int):
+        self._update(lambda tokens: tokens.pop(str(installation_id), None))
+
+    @contextmanager
+    def mint_lock(self, installation_id: int):
+        # One lock for all installations: minting is rare and this keeps a single lock file
+        with self._flock(f"{self.path}.mint.lock", fcntl.LOCK_EX):
+            yield
+
+class RedisTokenStore:
+    """Tokens shared by every process through Redis, expiring with the token"""
+
+    def __init__(self, redis_url: Optional[str] = None, prefix: Optional[str] = None):
+        import redis
+
+        self.prefix = prefix or os.getenv('QUEUE_PREFIX', 'agent')
+        self._redis = redis.Redis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+                                           decode_responses=True)
+
+    def _key(self, installation_id: int) -> str:
+        return f"{self.prefix}:ghtoken:{installation_id}"
+
+    def get(self, installation_id: int) -> Optional[Dict[str, Any]]:
+        raw = self._redis.get(self._key(installation_id))
+        return json.loads(raw) if raw else None
+
+    def put(self, installation_id: int, token: str, expires_at: float):
+        # The key disappears with the token - Redis never holds expired tokens
+        self._redis.set(self._key(installation_id), json.dumps({'token': token, 'expires_at': expires_at}),
+                        exat=int(expires_at))
+
+    def delete(self, installation_id: int):
+        self._redis.delete(self._key(installation_id))
+
+    @contextmanager
+    def mint_lock(self, installation_id: int):
+        with self._redis.lock(f"{self._key(installation_id)}:mint", timeout=60, blocking_timeout=60):
+            yield
+
+def create_token_store(backend: Optional[str] = None):
+    """Token store for TOKEN_STORE_BACKEND (memory, file or redis)"""
+    backend = (backend or os.getenv('TOKEN_STORE_BACKEND', 'file')).lower()
+    try:
+        if backend == 'redis':
+            return RedisTokenStore()
+        if backend == 'file':
+            return FileTokenStore()
+    except Exception as e:
+        logger.error(f"Token store backend {backend} unavailable, keeping tokens per process: {e}")
+    return MemoryTokenStore()